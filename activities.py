@@ -1,12 +1,16 @@
 from __future__ import annotations
 import arcade
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional, Tuple
 import math
 from pyglet.math import Vec2
+from pools import projectile_pool
+from registry import entities
+from scheduler import HEALTH
+from resources import textures
 
 
 if TYPE_CHECKING:
-    from state_machines import StateMachine, FighterStateMachine
+    from state_machines import StateMachine, FighterStateMachine, BeeStateMachine
 
 
 class BaseActivity:
@@ -34,14 +38,15 @@ class BaseActivity:
 
 
 class Seek(BaseActivity):
-    def __init__(self, target: arcade.Sprite, arrive: bool = True, slow_radius: int = 400) -> None:
+    def __init__(self, target: Optional[arcade.Sprite] = None, arrive: bool = True, slow_radius: int = 400) -> None:
         """
         A steering behaviour where the vehicle attempts to 
         move towards the target at the fastest possible rate
 
         Args:
             target: a sprite to seek, we will continue seeting the 
-                target even as its center_x and center_y change
+                target even as its center_x and center_y change.
+                Defaults to the state machine's target
             
             arrive: A bool saying if we would like the sprite to slow down
                 as we get close to the target. This helps limit overshooting.
@@ -53,31 +58,58 @@ class Seek(BaseActivity):
         self.slow_radius = slow_radius
         # get desired velocity
 
+    def target_position(self, state_machine: StateMachine) -> Tuple[float, float]:
+        target = self.target if self.target is not None else state_machine.target
+        return target.center_x, target.center_y
+
     def execute(self, state_machine: StateMachine) -> None:
         """steer towards the target"""
-        pos = Vec2(state_machine.sprite.center_x, state_machine.sprite.center_y)
-        force = Vec2(self.target.center_x, self.target.center_y) - pos
+        x, y = self.target_position(state_machine)
+        seek_towards(state_machine, x, y, self.arrive, self.slow_radius)
 
-        # get current velocity
-        vel = Vec2(state_machine.sprite.physics_body.velocity.x, state_machine.sprite.physics_body.velocity.y)
 
-        # if the arrive setting is true and we are inside the radius, 
-        # Slow down proportionally to how close we are to the targer
-        if self.arrive and force.mag < self.slow_radius:
-            desired_speed = state_machine.sprite.max_speed * (self.slow_radius / force.mag)
-        else:
-            desired_speed = state_machine.sprite.max_speed
+class SeekDestination(Seek):
+    """Seek the destination in the state machine's blackboard"""
+    def __init__(self, arrive: bool = True, slow_radius: int = 400) -> None:
+        super().__init__(None, arrive, slow_radius)
 
-        # scale it to the maximum speed
-        force = force.from_magnitude(desired_speed)
+    def target_position(self, state_machine: StateMachine) -> Tuple[float, float]:
+        blackboard = state_machine.blackboard
+        return blackboard.destination_x, blackboard.destination_y
 
-        # take the difference between desired velocity and current velocity 
-        # to get a change in velocity 
-        force -= vel
-        force.limit(state_machine.sprite.max_force)
 
-        # add the force to forces to add later
-        state_machine.sprite.forces.append(force)
+def seek_towards(state_machine: StateMachine, x: float, y: float, arrive: bool = True, slow_radius: float = 400) -> None:
+    """Add a force to the state_machine's sprite steering it towards (x, y). See Seek"""
+    if state_machine.steering is not None:
+        state_machine.steering.seek(state_machine.sprite, x, y, arrive, slow_radius)
+        return
+
+    pos = Vec2(*state_machine.position())
+    force = Vec2(x, y) - pos
+    if not force.mag > 0:
+        # already on the target, e.g. the last bee in a swarm seeking its centre
+        return
+
+    # get current velocity
+    vel = Vec2(*state_machine.velocity())
+
+    # if the arrive setting is true and we are inside the radius, 
+    # Slow down proportionally to how close we are to the targer
+    if arrive and force.mag < slow_radius:
+        desired_speed = state_machine.sprite.max_speed * (slow_radius / force.mag)
+    else:
+        desired_speed = state_machine.sprite.max_speed
+
+    # scale it to the maximum speed
+    force = force.from_magnitude(desired_speed)
+
+    # take the difference between desired velocity and current velocity 
+    # to get a change in velocity 
+    force -= vel
+    force.limit(state_machine.sprite.max_force)
+
+    # add the force to forces to add later
+    state_machine.sprite.forces.append(force)
 
 class Flee(BaseActivity):
     def __init__(self, target: arcade.Sprite, _range: int = 200) -> None:
@@ -94,75 +126,134 @@ class Flee(BaseActivity):
         self._range = _range
 
     def execute(self, state_machine: StateMachine) -> None:
-        if math.dist((state_machine.sprite.center_x, state_machine.sprite.center_y), (self.target.center_x, self.target.center_y)) > self._range:
+        if state_machine.steering is not None:
+            # the batch does the range check too
+            state_machine.steering.flee(state_machine.sprite, self.target.center_x, self.target.center_y, self._range)
+            return
+        if math.dist(state_machine.position(), (self.target.center_x, self.target.center_y)) > self._range:
             return 
-            # get desired velocity
-        pos = Vec2(state_machine.sprite.center_x, state_machine.sprite.center_y)
-        force = Vec2(self.target.center_x, self.target.center_y) - pos
-        force = -force
+        flee_from(state_machine, self.target)
 
-        # get current velocity
-        vel = Vec2(state_machine.sprite.physics_body.velocity.x, state_machine.sprite.physics_body.velocity.y)
-        desired_speed = state_machine.sprite.max_speed
 
-        # scale it to the maximum speed
-        force = force.from_magnitude(desired_speed)
+class FleeNeighbours(BaseActivity):
+    def __init__(self, category: str, _range: int = 200) -> None:
+        """Flee from every sprite in a category of the spatial index that is in range.
 
-        # take the difference between desired velocity and current velocity 
-        # to get a change in velocity 
-        force -= vel
+        Does the same as one Flee per target, but only looks at the sprites
+        that are close enough, so it does not matter how many there are.
+        Without a spatial index it flees from state_machine.flee_targets instead,
+        the entity handles of the sprites to flee from.
 
-        force.limit(state_machine.sprite.max_force)
+        Args:
+            category: the spatial index category to flee from e.g. 'fighters'
 
-        # add the force to forces to add later
-        state_machine.sprite.forces.append(force)
+            _range: How close should a sprite be before we flee from it
+        """
+        self.category = category
+        self._range = _range
+
+    def execute(self, state_machine: StateMachine) -> None:
+        sprite = state_machine.sprite
+        x, y = state_machine.position()
+        if state_machine.spatial_index is None:
+            for handle in state_machine.flee_targets:
+                flee_target = entities.get(handle)
+                # despawned since
+                if flee_target is None:
+                    continue
+                if math.dist((x, y), (flee_target.center_x, flee_target.center_y)) <= self._range:
+                    flee_from(state_machine, flee_target)
+            return
+        for neighbour in state_machine.spatial_index.neighbours(self.category, x, y, self._range):
+            if neighbour is not sprite:
+                flee_from(state_machine, neighbour)
+
+
+def flee_from(state_machine: StateMachine, target: arcade.Sprite) -> None:
+    """Add a force to the state_machine's sprite pushing it directly away from target"""
+    if state_machine.steering is not None:
+        state_machine.steering.flee(state_machine.sprite, target.center_x, target.center_y)
+        return
+
+    # get desired velocity
+    pos = Vec2(*state_machine.position())
+    force = Vec2(target.center_x, target.center_y) - pos
+    force = -force
+
+    # get current velocity
+    vel = Vec2(*state_machine.velocity())
+    desired_speed = state_machine.sprite.max_speed
+
+    # scale it to the maximum speed
+    force = force.from_magnitude(desired_speed)
+
+    # take the difference between desired velocity and current velocity 
+    # to get a change in velocity 
+    force -= vel
+
+    force.limit(state_machine.sprite.max_force)
+
+    # add the force to forces to add later
+    state_machine.sprite.forces.append(force)
+
+class SwarmActivity(BaseActivity):
+    """Keep a bee with its swarm
+
+    Seeks the centre of the swarm and flees from any bee that gets too close.
+    The swarm works out its centre and who is near who once per AI tick
+    in Swarm.update(), so this is cheap however big the swarm is.
+    """
+    def execute(self, state_machine: BeeStateMachine) -> None:
+        bee = state_machine.sprite
+        swarm = bee.swarm
+        seek_towards(state_machine, swarm.centre[0], swarm.centre[1])
+        for neighbour in swarm.neighbours(bee):
+            flee_from(state_machine, neighbour)
 
 class PointTowardsTargetActivity(BaseActivity):
-    def __init__(self, target: arcade.Sprite) -> None:
+    def __init__(self, target: Optional[arcade.Sprite] = None) -> None:
         """
         A simple activity that sets the angle of the sprite to 
         point towards the target
 
         Args:
-            target: a sprite to steer towards
+            target: a sprite to steer towards, defaults to the state machine's target
         """
         self.target = target
 
     def execute(self, state_machine: StateMachine) -> None:
-        dx =  state_machine.sprite.center_x - self.target.center_x
-        dy = state_machine.sprite.center_y - self.target.center_y 
+        target = self.target if self.target is not None else state_machine.target
+        x, y = state_machine.position()
+        dx = x - target.center_x
+        dy = y - target.center_y 
 
         angle = math.atan2(dy, dx)
-        state_machine.sprite.physics_body.angle = angle + math.pi/2
+        state_machine.body().angle = angle + math.pi/2
 
 class PointInDirectionOfTravelActivity(BaseActivity):
     def execute(self, state_machine: StateMachine) -> None:
-        physics_body = state_machine.sprite.physics_body
-        vel = Vec2(physics_body.velocity.x, physics_body.velocity.y)
-        physics_body.angle = vel.heading - math.pi/2
+        vel = Vec2(*state_machine.velocity())
+        state_machine.body().angle = vel.heading - math.pi/2
 
 class FireActivity(BaseActivity):
     """An activity that runs the sprites fire() method and adds any 
     sprites returned into the state_machine
 
-    This activity should be pulled off the activity list immediately
-    after executing to avoid being executed every frame, then 
-    add a new instance of this activity to the state's activity list after some
-    perid of time or other trigger"""
+    Put this in a state's once_activities so it fires once each time the
+    state is entered, rather than every frame"""
 
     def execute(self, state_machine: FighterStateMachine) -> None:
         bullets = state_machine.sprite.fire()
         for bullet in bullets:
-            state_machine.bullet_list.append(bullet)
-            state_machine.physics_engine.add_sprite(bullet, collision_type=bullet.collision_type, max_velocity=bullet.max_velocity, moment_of_inertia=bullet.moment_of_inertia, mass=bullet.mass, damping=0.99)
-            state_machine.physics_engine.set_velocity(bullet, (bullet.change_x, bullet.change_y))
+            projectile_pool.launch(bullet, state_machine.bullet_list, state_machine.physics_engine)
 
 class HealActivity(BaseActivity):
     """Increase the sprite's health by one twelveth. 
 
-    Similar to FireActivity this activity should immediately be removed after executing"""
+    Like FireActivity this belongs in a state's once_activities"""
     def execute(self, state_machine: StateMachine) -> None:
         state_machine.sprite.health += max(state_machine.sprite.max_health // 12, 1)
+        state_machine.notify(HEALTH)
 
 class AvoidObstaclesActivity(BaseActivity):
     """An activity that gives a sprite three detectors and sets a sprite to flee from
@@ -177,33 +268,52 @@ class AvoidObstaclesActivity(BaseActivity):
     This class curretly accounts for the 90degree offset in the fighter sprite, correct before 
     using with correctly rotated sprites
     """
-    def __init__(self, obstacles: arcade.SpriteList) -> None:
+    def __init__(self, obstacles: Optional[arcade.SpriteList] = None, category: str = 'rocks') -> None:
         super().__init__()
-        self.front_detector = arcade.SpriteCircle(20, (0, 0, 255))
-        self.left_detector = arcade.SpriteCircle(20, (255, 0, 0))
-        self.right_detector = arcade.SpriteCircle(20, (0, 255, 0))
+        # The detectors are only moved and checked inside execute(), so one
+        # set can be shared by every enemy in a state. Shared textures too
+        self.front_detector = arcade.Sprite(texture=textures.circle(20, (0, 0, 255)))
+        self.left_detector = arcade.Sprite(texture=textures.circle(20, (255, 0, 0)))
+        self.right_detector = arcade.Sprite(texture=textures.circle(20, (0, 255, 0)))
         self.obstacles = obstacles
-
-    def execute(self, state_machine: StateMachine) -> None:
-        # Move detectors relative to the sprite 
-        vel = Vec2(state_machine.sprite.physics_body.velocity[0], state_machine.sprite.physics_body.velocity[1]).mag
+        # the spatial index category holding the obstacles, used when
+        # the state machine has a spatial index. Without an index obstacles
+        # are checked, or the state machine's rocks if obstacles is None
+        self.category = category
+
+    def detector_positions(self, state_machine: StateMachine) -> Tuple[Tuple[float, float], Tuple[float, float], Tuple[float, float]]:
+        """Where the front, left and right detectors go for state_machine's sprite"""
+        velocity = state_machine.velocity()
+        vel = Vec2(*velocity).mag
         speed_scale = (vel / state_machine.sprite.max_speed)
         d = 120 * speed_scale + 20
-        x = state_machine.sprite.center_x + d  * math.cos(state_machine.sprite.angle_radians - math.pi/2) 
-        y = state_machine.sprite.center_y + d  * math.sin(state_machine.sprite.angle_radians - math.pi/2) 
-        self.front_detector.position = (x, y)
+        center_x, center_y = state_machine.position()
+        angle_radians = state_machine.sprite.angle_radians
+        front = (center_x + d * math.cos(angle_radians - math.pi/2), center_y + d * math.sin(angle_radians - math.pi/2))
+        left = (center_x + d * math.cos(angle_radians), center_y + d * math.sin(angle_radians))
+        right = (center_x + d * math.cos(angle_radians + math.pi), center_y + d * math.sin(angle_radians + math.pi))
+        return front, left, right
 
-        x = state_machine.sprite.center_x +  d * math.cos(state_machine.sprite.angle_radians)
-        y = state_machine.sprite.center_y +  d * math.sin(state_machine.sprite.angle_radians) 
-        self.left_detector.position = (x, y)
-
-        x = state_machine.sprite.center_x + d * math.cos(state_machine.sprite.angle_radians + math.pi) 
-        y = state_machine.sprite.center_y + d * math.sin(state_machine.sprite.angle_radians + math.pi) 
-        self.right_detector.position = (x, y)
-
-        left_high = arcade.check_for_collision_with_list(self.left_detector, self.obstacles) 
-        right_high = arcade.check_for_collision_with_list(self.left_detector, self.obstacles) 
-        front_high = arcade.check_for_collision_with_list(self.front_detector, self.obstacles) 
+    def execute(self, state_machine: StateMachine) -> None:
+        # Move detectors relative to the sprite 
+        velocity = state_machine.velocity()
+        center_x, center_y = state_machine.position()
+        front, left, right = self.detector_positions(state_machine)
+        self.front_detector.position = front
+        self.left_detector.position = left
+        self.right_detector.position = right
+
+        if state_machine.spatial_index is not None:
+            # only check the rocks that are close to each detector
+            index = state_machine.spatial_index
+            left_high = index.overlapping(self.category, self.left_detector)
+            right_high = index.overlapping(self.category, self.right_detector)
+            front_high = index.overlapping(self.category, self.front_detector)
+        else:
+            obstacle_list = self.obstacles if self.obstacles is not None else state_machine.rocks
+            left_high = arcade.check_for_collision_with_list(self.left_detector, obstacle_list) 
+            right_high = arcade.check_for_collision_with_list(self.right_detector, obstacle_list) 
+            front_high = arcade.check_for_collision_with_list(self.front_detector, obstacle_list) 
         
         # create a flat list of all obstacles that are detected, regardless of detector
         obstacles = []
@@ -211,13 +321,18 @@ class AvoidObstaclesActivity(BaseActivity):
         obstacles.extend(right_high)
         obstacles.extend(front_high)
 
+        if state_machine.steering is not None:
+            for obstacle in obstacles:
+                state_machine.steering.flee(state_machine.sprite, obstacle.center_x, obstacle.center_y, speed=400)
+            return
+
+        pos = Vec2(center_x, center_y)
+        # get current velocity
+        vel = Vec2(*velocity)
         for obstacle in obstacles:
-            pos = Vec2(state_machine.sprite.center_x, state_machine.sprite.center_y)
             force = Vec2(obstacle.center_x, obstacle.center_y) - pos
             force = -force
 
-            # get current velocity
-            vel = Vec2(state_machine.sprite.physics_body.velocity.x, state_machine.sprite.physics_body.velocity.y)
             desired_speed = 400 
 
             # scale it to the maximum speed
@@ -0,0 +1,101 @@
+from __future__ import annotations
+from collections import deque
+from time import perf_counter
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Tuple
+
+from constants import AI_BUDGET_MS, AI_LOD_BANDS
+from registry import entities
+
+if TYPE_CHECKING:
+    from fighter import Enemy
+
+
+class AILevelOfDetail:
+    """Decides which enemies run their state machine each AI tick
+
+    Each enemy is due again a number of ticks after its last update, picked
+    from bands by how far it is along x from the middle of the view. Enemies
+    on screen update every tick, ones far off only every so often.
+    New enemies start spread over the slowest band so they don't all come
+    due together, and as each one's next update counts from its last the
+    spread stays.
+
+    Only the enemies due this tick are looked at, so enemies far away cost
+    next to nothing however many there are.
+
+    Once budget seconds have been spent in a tick the rest of the due enemies
+    are deferred. They run first next tick, before anything newly due.
+
+    Between updates an enemy keeps the steering force from its last update,
+    see Enemy.hold_forces and SteeringBatch.hold_forces.
+
+    Args:
+        bands: (distance, ticks between updates) pairs in order of distance
+
+        budget_ms: how long to spend running enemies each tick
+    """
+    def __init__(self, bands: List[Tuple[float, int]] = AI_LOD_BANDS, budget_ms: float = AI_BUDGET_MS) -> None:
+        self.bands = bands
+        self.budget = budget_ms / 1000
+        self.tick = 0
+        # tick -> enemies due then
+        self.buckets: Dict[int, List[Enemy]] = {}
+        self.deferred: Deque[Enemy] = deque()
+        self.registered = 0
+        self.updates = 0
+        self.deferrals = 0
+
+    def register(self, enemy: Enemy) -> None:
+        enemy.hold_forces = True
+        self.schedule(enemy, 1 + self.registered % self.bands[-1][1])
+        self.registered += 1
+
+    def schedule(self, enemy: Enemy, ticks: int) -> None:
+        due = self.tick + ticks
+        bucket = self.buckets.get(due)
+        if bucket is None:
+            bucket = self.buckets[due] = []
+        bucket.append(enemy)
+
+    def interval(self, distance: float) -> int:
+        for limit, ticks in self.bands:
+            if distance <= limit:
+                return ticks
+        return self.bands[-1][1]
+
+    def update(self, view_x: float, run: Callable[[Enemy], None]) -> None:
+        """Call run(enemy) for the deferred enemies and then the ones due this tick, within the budget"""
+        self.tick += 1
+        work = self.deferred
+        work.extend(self.buckets.pop(self.tick, ()))
+        self.deferred = deque()
+        start = perf_counter()
+        ran = 0
+        while work:
+            enemy = work.popleft()
+            # killed since it was scheduled, even if it hasn't left its lists yet
+            if entities.get(enemy.handle) is not enemy:
+                continue
+            # always run one so deferred enemies can't get stuck
+            if ran and perf_counter() - start > self.budget:
+                work.appendleft(enemy)
+                self.deferred = work
+                self.deferrals += len(work)
+                break
+            # a fresh update replaces the force held from the last one
+            enemy.held_force = None
+            steering = enemy.state_machine.steering
+            if steering is not None:
+                steering.forget(enemy)
+            run(enemy)
+            ran += 1
+            self.schedule(enemy, self.interval(abs(enemy.center_x - view_x)))
+        self.updates += ran
+
+    def stats(self):
+        return {
+            "scheduled": sum(len(bucket) for bucket in self.buckets.values()),
+            "deferred": len(self.deferred),
+            "updates": self.updates,
+            "deferrals": self.deferrals,
+        }
@@ -0,0 +1,220 @@
+from __future__ import annotations
+import math
+from typing import Dict, List, Tuple
+
+import arcade
+from constants import (
+    ASTEROID_CHUNK_WIDTH, ASTEROID_FIELD_AHEAD, ASTEROID_FIELD_BEHIND, HEIGHT,
+    ROCK_CHOICES, ROCK_COUNT, ROCK_FIELD_WIDTH, ROCK_SPEED,
+)
+from resources import textures
+from rng import streams
+from utils import remove_sprites
+
+
+class AsteroidField:
+    """Makes the rocks in chunks as the view moves along the level, and retires them behind it
+
+    The level is cut along x into chunks chunk_width wide. update() makes
+    sure every chunk from behind the view to ahead of it has its rocks and
+    retires the chunks outside that, so however long the level is the same
+    number of chunks, and about the same number of rocks, are alive.
+
+    Each chunk's rocks come from their own random stream, streams.chunk("rocks", n),
+    so a chunk is the same whenever it is made, in whatever order. Rocks are
+    picked the same way make_rocks() always has, with rock_count rocks to
+    every ROCK_FIELD_WIDTH of level, so the field looks as it did.
+
+    A retired rock keeps its sprite and body, and is handed out again for
+    the next rock with the same texture. Its shape, mass and moment are
+    scaled to the new size rather than made again.
+
+    Args:
+        physics_engine: the engine rocks are added to
+
+        rocks: the sprite list rocks are added to
+
+        rock_count: rocks per ROCK_FIELD_WIDTH of level
+
+        chunk_width: how wide each chunk is
+
+        ahead: make chunks up to this far ahead of the view
+
+        behind: keep chunks up to this far behind the view
+    """
+    def __init__(
+        self,
+        physics_engine: arcade.PymunkPhysicsEngine,
+        rocks: arcade.SpriteList,
+        rock_count: int = ROCK_COUNT,
+        chunk_width: float = ASTEROID_CHUNK_WIDTH,
+        ahead: float = ASTEROID_FIELD_AHEAD,
+        behind: float = ASTEROID_FIELD_BEHIND,
+    ) -> None:
+        self.physics_engine = physics_engine
+        self.rocks = rocks
+        self.chunk_width = chunk_width
+        self.ahead = ahead
+        self.behind = behind
+        # rocks per chunk, spread over the chunks so the total is exact
+        self.density = rock_count * chunk_width / ROCK_FIELD_WIDTH
+        # chunk -> its live rocks
+        self.chunks: Dict[int, List[arcade.Sprite]] = {}
+        # texture index -> retired rocks and their physics objects
+        self.free: Dict[int, List[Tuple[arcade.Sprite, object]]] = {}
+        # rock -> (hit box vertices, moment / mass) at a scale of 1, for refit()
+        self.unit_shapes: Dict[arcade.Sprite, Tuple[List[Tuple[float, float]], float]] = {}
+        self.made = 0
+        self.reused = 0
+        self.retired = 0
+
+    def chunk_at(self, x: float) -> int:
+        return math.floor(x / self.chunk_width)
+
+    def rocks_in(self, chunk: int) -> int:
+        return math.floor((chunk + 1) * self.density) - math.floor(chunk * self.density)
+
+    def update(self, view_x: float) -> None:
+        """Make the chunks around view_x that are missing and retire the ones too far away"""
+        first = self.chunk_at(view_x - self.behind)
+        last = self.chunk_at(view_x + self.ahead)
+        gone = [chunk for chunk in self.chunks if chunk < first or chunk > last]
+        if gone:
+            self.retire([rock for chunk in gone for rock in self.chunks.pop(chunk)])
+        for chunk in range(first, last + 1):
+            if chunk not in self.chunks:
+                self.generate(chunk)
+
+    def generate(self, chunk: int) -> None:
+        """Make chunk's rocks"""
+        self.chunks[chunk] = []
+        rng = streams.chunk("rocks", chunk)
+        left = int(chunk * self.chunk_width)
+        right = int((chunk + 1) * self.chunk_width) - 1
+        for _ in range(self.rocks_in(chunk)):
+            rock_choice = rng.choice(ROCK_CHOICES)
+            texture_index = ROCK_CHOICES.index(rock_choice)
+            size = 0.5 + rng.random() * (1 + texture_index // 2)
+            x = rng.randint(left, right)
+            y = rng.randint(-HEIGHT*2, HEIGHT*2)
+            change_x = rng.randint(-ROCK_SPEED, ROCK_SPEED)
+            change_y = rng.randint(-ROCK_SPEED, ROCK_SPEED)
+            self.add(texture_index, size, x, y, change_x, change_y)
+
+    def add(self, texture_index: int, size: float, x: float, y: float, change_x: float = 0, change_y: float = 0) -> arcade.Sprite:
+        """Add one rock using ROCK_CHOICES[texture_index] to the chunk at x, the rock list and the physics engine"""
+        free = self.free.get(texture_index)
+        if free:
+            rock, physics_object = free.pop()
+            self._reuse(rock, physics_object, size, x, y, change_x, change_y)
+            self.reused += 1
+        else:
+            rock = self._make(texture_index, size, x, y, change_x, change_y)
+            self.made += 1
+        self.rocks.append(rock)
+        chunk = self.chunks.get(self.chunk_at(x))
+        if chunk is None:
+            chunk = self.chunks[self.chunk_at(x)] = []
+        chunk.append(rock)
+        return rock
+
+    def _make(self, texture_index: int, size: float, x: float, y: float, change_x: float, change_y: float) -> arcade.Sprite:
+        rock = arcade.Sprite(
+            texture=textures.load(f":resources:images/space_shooter/{ROCK_CHOICES[texture_index]}"),
+            scale=size,
+            center_x=x,
+            center_y=y,
+        )
+        # which texture it is, so saved worlds can make it again
+        rock.texture_index = texture_index
+
+        # Add the rock to the physics engine.
+        # The mass is proportional to the size cubed
+        # To give the impression of correctly scaling the mass in 3D
+        # Collision type sets this as a rock with the physics_engine
+        # and makes the collisions correct
+        # Body_type dynamic ensures the rock has correct physics for movin bodies
+        # setting the velocity just below 1 means rocks wont incorectly bounce off
+        # each other with MORE speed than when they entered
+        self.physics_engine.add_sprite(
+            rock,
+            mass=5*size**3,
+            collision_type='rock',
+            body_type=arcade.PymunkPhysicsEngine.DYNAMIC,
+            elasticity=0.98,
+        )
+        # Set the initial speed of the rock
+        self.physics_engine.set_velocity(rock, (change_x, change_y))
+
+        physics_object = self.physics_engine.get_physics_object(rock)
+        body = physics_object.body
+        vertices = [(vertex.x / size, vertex.y / size) for vertex in physics_object.shape.get_vertices()]
+        self.unit_shapes[rock] = (vertices, body.moment / (body.mass * size * size))
+        return rock
+
+    def _reuse(self, rock: arcade.Sprite, physics_object, size: float, x: float, y: float, change_x: float, change_y: float) -> None:
+        """Put a retired rock back in the physics engine as a new one"""
+        rock.scale = size
+        rock.position = (x, y)
+        rock.angle = 0
+        self.refit(rock, physics_object, size)
+        body = physics_object.body
+        body.position = (x, y)
+        body.angle = 0
+        body.velocity = (change_x, change_y)
+        body.angular_velocity = 0
+        body.force = (0, 0)
+        body.torque = 0
+        engine = self.physics_engine
+        engine.space.add(body, physics_object.shape)
+        engine.sprites[rock] = physics_object
+        engine.non_static_sprite_list.append(rock)
+        rock.register_physics_engine(engine)
+
+    def refit(self, rock: arcade.Sprite, physics_object, size: float) -> None:
+        """Scale a rock's shape, mass and moment to size"""
+        vertices, unit_moment = self.unit_shapes[rock]
+        mass = 5*size**3
+        body = physics_object.body
+        body.mass = mass
+        body.moment = unit_moment * mass * size * size
+        physics_object.shape.unsafe_set_vertices([(vx * size, vy * size) for vx, vy in vertices])
+
+    def retire(self, rocks: List[arcade.Sprite]) -> None:
+        """Take rocks out of the list and physics engine together, keeping them to hand out again"""
+        engine = self.physics_engine
+        kept = [(rock, engine.get_physics_object(rock)) for rock in rocks if rock.physics_engines]
+        remove_sprites(rocks)
+        for rock, physics_object in kept:
+            self.free.setdefault(rock.texture_index, []).append((rock, physics_object))
+        self.retired += len(rocks)
+
+    def release(self, rock: arcade.Sprite) -> None:
+        """Retire one rock on its own, e.g. one a restored world doesn't need"""
+        for chunk in self.chunks.values():
+            if rock in chunk:
+                chunk.remove(rock)
+                break
+        self.retire([rock])
+
+    def resync(self, view_x: float) -> None:
+        """Put each rock in the chunk it is over now, after something else has moved them all, and fill in around view_x
+
+        The chunks around view_x count as made even if no rock ended up in
+        them, so a restored world isn't topped up with extra rocks.
+        """
+        self.chunks = {}
+        for rock in self.rocks:
+            self.chunks.setdefault(self.chunk_at(rock.center_x), []).append(rock)
+        for chunk in range(self.chunk_at(view_x - self.behind), self.chunk_at(view_x + self.ahead) + 1):
+            self.chunks.setdefault(chunk, [])
+
+    def stats(self):
+        return {
+            "live": len(self.rocks),
+            "chunks": len(self.chunks),
+            "free": sum(len(free) for free in self.free.values()),
+            "made": self.made,
+            "reused": self.reused,
+            "retired": self.retired,
+        }
@@ -0,0 +1,440 @@
+"""Headless benchmark runner
+
+Drives TestGame.setup() and TestGame.on_update() without opening a window,
+with a seeded random, scripted input and a fixed number of frames. Each
+scenario reports the ms/frame spent in each part of on_update so frame
+cost can be tracked between releases.
+
+Usage:
+    python benchmark.py                          # every scenario
+    python benchmark.py -s default -s x4 -f 1200
+    python benchmark.py --json results.json
+    python benchmark.py --memory                 # AI objects per enemy instead of timings
+    python benchmark.py --replay session.rpl     # a recorded session, see replay.py
+    python benchmark.py --reset                  # setup() against restoring the level's start
+    python benchmark.py --parallel --workers 4   # swarm AI in one process against worker processes
+    python benchmark.py --startup                # time to first frame and to a playable level
+"""
+import os
+
+# arcade checks this when it is first imported, so it has to be set
+# before game_view (and so arcade) is imported
+os.environ.setdefault("ARCADE_HEADLESS", "True")
+
+import argparse
+import gc
+import json
+import math
+import statistics
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import arcade
+from constants import AI_BUDGET_MS, AI_TICK_INTERVAL, ENEMY_COUNT, FIXED_TIMESTEP, PHYSICS_SUBSTEPS, ROCK_COUNT, STARTUP_WORKERS, SWARMS
+from game_view import TestGame
+from pools import projectile_pool
+from hit_handlers import hit_queue
+from damage_text import damage_numbers
+from registry import entities
+from replay import InputReplay, world_checksum
+from resources import textures
+
+# one fixed tick per frame, so every frame does the same amount of work
+FRAME_TIME = FIXED_TIMESTEP
+
+# swarm sizes tried by --parallel, to find where the worker processes start to win
+PARALLEL_SWARM_SIZES = [100, 250, 500, 1000, 2000, 4000]
+# the AI and the parts of the tick that change with it, compared by --parallel
+PARALLEL_SECTIONS = ("enemy AI", "parallel ai", "steering")
+
+# started fresh by --startup, from the folder it is in so its assets are found
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+# modules whose objects make up the enemy AI, counted by --memory
+AI_MODULES = {"state_machines", "states", "transitions", "activities", "decisions"}
+
+
+def default_script(frame: int, game: TestGame) -> None:
+    """Fly right through the level, firing and turning as we go
+
+    Uses the game's own input handlers so the same code paths run as
+    when someone is playing.
+    """
+    if frame == 0:
+        game.on_key_press(arcade.key.D, 0)
+    # bob up and down so the player meets rocks and bees on the way
+    if frame % 240 == 0:
+        game.on_key_release(arcade.key.S, 0)
+        game.on_key_press(arcade.key.W, 0)
+    if frame % 240 == 120:
+        game.on_key_release(arcade.key.W, 0)
+        game.on_key_press(arcade.key.S, 0)
+    if frame % 10 == 0:
+        game.on_mouse_press(0, 0, arcade.MOUSE_BUTTON_LEFT, 0)
+    if frame % 90 == 0:
+        game.on_key_press(arcade.key.E, 0)
+    if frame % 90 == 30:
+        game.on_key_release(arcade.key.E, 0)
+
+
+def idle_script(frame: int, game: TestGame) -> None:
+    """Don't touch anything. Useful to measure the world on its own"""
+    pass
+
+
+class Scenario:
+    """A named world to benchmark
+
+    Args:
+        name: used to pick the scenario on the command line and in reports
+
+        enemy_count: number of fighters made by setup()
+
+        rock_count: rocks per ROCK_FIELD_WIDTH of the asteroid field
+
+        swarms: list of (x, y, level, size) tuples, one per Swarm
+
+        script: called as script(frame, game) before every frame to press keys etc.
+
+        replay: play a recording instead. It decides the level and the input
+    """
+    def __init__(
+        self,
+        name: str,
+        enemy_count: int = ENEMY_COUNT,
+        rock_count: int = ROCK_COUNT,
+        swarms: Optional[List[Tuple[float, float, int, int]]] = None,
+        script: Callable[[int, TestGame], None] = default_script,
+        replay: Optional[InputReplay] = None,
+    ) -> None:
+        self.name = name
+        self.enemy_count = enemy_count
+        self.rock_count = rock_count
+        self.swarms = list(SWARMS) if swarms is None else swarms
+        self.script = script
+        self.replay = replay
+
+
+def replay_scenario(path: str) -> Scenario:
+    return Scenario(os.path.basename(path), script=idle_script, replay=InputReplay(path))
+
+
+def scaled_swarms(factor: int) -> List[Tuple[float, float, int, int]]:
+    """The default swarms with factor times as many bees in each"""
+    return [(x, y, level, size * factor) for x, y, level, size in SWARMS]
+
+
+SCENARIOS = {
+    scenario.name: scenario for scenario in [
+        Scenario("default"),
+        Scenario("idle", script=idle_script),
+        Scenario("x2", ENEMY_COUNT * 2, ROCK_COUNT * 2, scaled_swarms(2)),
+        Scenario("x4", ENEMY_COUNT * 4, ROCK_COUNT * 4, scaled_swarms(4)),
+        Scenario("rocks_2000", rock_count=2000),
+        # fighters spawn off screen, so this is mostly enemies the AI can skip
+        Scenario("fighters_x10", enemy_count=ENEMY_COUNT * 10),
+        Scenario("swarm_x10", swarms=scaled_swarms(10)),
+        # one big swarm inside WaitForPull's 500 range of the player's
+        # start at (500, 400), so it is pulled straight away
+        Scenario("swarm_500", swarms=[(800, 400, 1, 500)]),
+    ]
+}
+
+
+def reset_input(game: TestGame) -> None:
+    for key in (arcade.key.A, arcade.key.D, arcade.key.W, arcade.key.S, arcade.key.Q, arcade.key.E):
+        game.on_key_release(key, 0)
+
+
+def build_scenario(game: TestGame, scenario: Scenario, seed: int) -> None:
+    reset_input(game)
+    if scenario.replay is not None:
+        game.start_replay(scenario.replay)
+        return
+    game.replay = None
+    game.seed = seed
+    game.enemy_count = scenario.enemy_count
+    game.rock_count = scenario.rock_count
+    game.swarm_layout = scenario.swarms
+    # a replay earlier in the run leaves its own settings behind
+    game.physics_substeps = PHYSICS_SUBSTEPS
+    game.ai_tick_interval = AI_TICK_INTERVAL
+    game.setup()
+    game.ai_lod.budget = AI_BUDGET_MS / 1000
+
+
+def run_scenario(game: TestGame, scenario: Scenario, frames: int, seed: int, warmup: int = 30, csv_path: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """Build the scenario's world in game and run it for frames frames
+
+    The first warmup frames are run but not reported.
+
+    Returns:
+        a dict of profiler section to its mean/p50/p95/p99/max ms per frame.
+        "update" is the whole of on_update
+    """
+    build_scenario(game, scenario, seed)
+
+    profiler = game.profiler
+    # keep every sample rather than a rolling window
+    profiler.window = None
+    profiler.enabled = True
+    for frame in range(warmup):
+        scenario.script(frame, game)
+        game.on_update(FRAME_TIME)
+        game.update_visibility()
+    profiler.reset()
+    hit_queue.counts.clear()
+
+    if csv_path:
+        profiler.start_csv(csv_path)
+    for frame in range(warmup, warmup + frames):
+        scenario.script(frame, game)
+        game.on_update(FRAME_TIME)
+        # what draw_frame() would do, there is nothing to draw to headless
+        game.update_visibility()
+    profiler.end_frame()
+    profiler.stop_csv()
+    return profiler.summary()
+
+
+def ai_objects(game: TestGame) -> int:
+    """How many distinct objects make up every enemy's state machine
+
+    Follows references from each state machine through the states,
+    transitions, activities, decisions and the lists and dicts holding them,
+    but not into sprites, sprite lists or the physics engine. Objects shared
+    between enemies are only counted once.
+    """
+    seen = set()
+    stack = [enemy.state_machine for enemy in game.scene['enemies']]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        for referent in gc.get_referents(obj):
+            if isinstance(referent, (list, tuple, dict)) or type(referent).__module__ in AI_MODULES:
+                stack.append(referent)
+    return len(seen)
+
+
+def measure_memory(game: TestGame, scenario: Scenario, frames: int, seed: int) -> Dict[str, float]:
+    """AI objects per enemy just after setup and again after frames frames
+
+    The second number growing means states are piling up objects as enemies
+    move between them.
+    """
+    build_scenario(game, scenario, seed)
+    enemies = len(game.scene['enemies'])
+    at_setup = ai_objects(game) / enemies
+    for frame in range(frames):
+        scenario.script(frame, game)
+        game.on_update(FRAME_TIME)
+    enemies = len(game.scene['enemies'])
+    return {"enemies": enemies, "per_enemy_at_setup": at_setup, "per_enemy_at_end": ai_objects(game) / enemies}
+
+
+def measure_reset(game: TestGame, scenario: Scenario, frames: int, seed: int) -> Dict[str, float]:
+    """How long setup() takes against going back to the level's start after frames frames
+
+    Also times saving a checkpoint and gives its size.
+    """
+    start = perf_counter()
+    build_scenario(game, scenario, seed)
+    setup_ms = (perf_counter() - start) * 1000
+    for frame in range(frames):
+        scenario.script(frame, game)
+        game.on_update(FRAME_TIME)
+    start = perf_counter()
+    checkpoint = game.checkpoint()
+    checkpoint_ms = (perf_counter() - start) * 1000
+    start = perf_counter()
+    game.reset_level()
+    restore_ms = (perf_counter() - start) * 1000
+    return {
+        "setup_ms": setup_ms,
+        "checkpoint_ms": checkpoint_ms,
+        "restore_ms": restore_ms,
+        "checkpoint_bytes": len(checkpoint.to_bytes()),
+    }
+
+
+def measure_parallel(game: TestGame, sizes: List[int], workers: int, frames: int, seed: int) -> Dict[str, Dict[str, float]]:
+    """ms per frame of swarm AI in one process against workers worker processes
+
+    One pulled swarm of each size is run both ways from the same seed, with
+    no AI budget so both run every bee they should. The world has to end up
+    exactly the same both ways.
+    """
+    results = {}
+    for size in sizes:
+        scenario = Scenario(f"swarm_{size}", swarms=[(800, 400, 1, size)])
+        result = {}
+        checksums = []
+        for mode, count in (("single", 0), ("parallel", workers)):
+            game.set_ai_workers(count)
+            # always use the workers, to see where they stop paying
+            game.parallel_ai.min_batch = 0
+            build_scenario(game, scenario, seed)
+            game.ai_lod.budget = math.inf
+            profiler = game.profiler
+            profiler.window = None
+            profiler.enabled = True
+            profiler.reset()
+            for frame in range(frames):
+                scenario.script(frame, game)
+                game.on_update(FRAME_TIME)
+            profiler.end_frame()
+            summary = profiler.summary()
+            result[f"{mode}_ms"] = sum(summary[section]["mean"] for section in PARALLEL_SECTIONS if section in summary)
+            checksums.append(world_checksum(game))
+        result["speedup"] = result["single_ms"] / result["parallel_ms"] if result["parallel_ms"] else 0.0
+        result["matched"] = checksums[0] == checksums[1]
+        results[scenario.name] = result
+    game.set_ai_workers(0)
+    return results
+
+
+def measure_startup(runs: int) -> Dict[str, Dict[str, float]]:
+    """ms from starting main.py to its first frame and to a playable level, over runs runs
+
+    Each run is a new python process so it pays for every import, as a
+    player starting the game does. The window is headless like the rest of
+    the benchmark.
+    """
+    samples: Dict[str, List[float]] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "startup.json")
+        for _ in range(runs):
+            subprocess.run([sys.executable, MAIN_SCRIPT, "--startup-report", path], cwd=os.path.dirname(MAIN_SCRIPT), check=True)
+            with open(path) as f:
+                for name, value in json.load(f).items():
+                    samples.setdefault(name, []).append(value)
+    return {
+        name: {"min": min(values), "median": statistics.median(values), "max": max(values)}
+        for name, values in samples.items()
+    }
+
+
+def make_game() -> TestGame:
+    """A window with every texture loaded, and no level until a scenario is built"""
+    game = TestGame(use_joystick=False, build=False)
+    textures.preload(workers=STARTUP_WORKERS)
+    return game
+
+
+def print_report(name: str, report: Dict[str, Dict[str, float]]) -> None:
+    print(f"\n{name}")
+    print(f"{'section':<28}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for section, stats in sorted(report.items()):
+        print(f"{section:<28}{stats['mean']:>9.3f}{stats['p50']:>9.3f}{stats['p95']:>9.3f}{stats['p99']:>9.3f}{stats['max']:>9.3f}")
+
+
+def print_pool_stats(report: Dict[str, Dict[str, int]]) -> None:
+    print(f"{'pool':<16}{'hits':>9}{'misses':>9}{'live':>9}{'high':>9}")
+    for name, stats in report.items():
+        print(f"{name:<16}{stats['hits']:>9}{stats['misses']:>9}{stats['live']:>9}{stats['high_water']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="scenario to run, can be repeated. Defaults to all")
+    parser.add_argument("-f", "--frames", type=int, default=600, help="frames to measure per scenario")
+    parser.add_argument("--warmup", type=int, default=30, help="frames to run before measuring")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--csv", help="stream every sample to this file, suffixed with the scenario name")
+    parser.add_argument("--memory", action="store_true", help="count AI objects per enemy rather than timing frames")
+    parser.add_argument("--reset", action="store_true", help="time setup() against restoring the level's start, after the scenario has run")
+    parser.add_argument("--replay", action="append", default=[], help="play this recording as a scenario, can be repeated. Runs its whole length")
+    parser.add_argument("--parallel", action="store_true", help="time swarm AI in one process against worker processes for growing swarms, instead of the scenarios")
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 2) - 1, 1), help="worker processes for --parallel")
+    parser.add_argument("--startup", action="store_true", help="time starting the game from scratch, instead of the scenarios")
+    parser.add_argument("--runs", type=int, default=5, help="times to start the game for --startup")
+    args = parser.parse_args()
+
+    if args.startup:
+        results = measure_startup(args.runs)
+        print(f"{'startup':<16}{'min':>9}{'median':>9}{'max':>9}  (ms, {args.runs} runs)")
+        for name, result in results.items():
+            print(f"{name:<16}{result['min']:>9.1f}{result['median']:>9.1f}{result['max']:>9.1f}")
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+        return
+
+    if args.parallel:
+        game = make_game()
+        results = measure_parallel(game, PARALLEL_SWARM_SIZES, args.workers, args.frames, args.seed)
+        game.close()
+        print(f"{'swarm':<16}{'single':>9}{'parallel':>10}{'speedup':>9}  (ms/frame, {args.workers} workers)")
+        for name, result in results.items():
+            print(f"{name:<16}{result['single_ms']:>9.3f}{result['parallel_ms']:>10.3f}{result['speedup']:>8.2f}x"
+                  + ("" if result["matched"] else "  DIFFERS from single process"))
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+        return
+
+    scenarios = [SCENARIOS[name] for name in args.scenario or ([] if args.replay else SCENARIOS)]
+    scenarios.extend(replay_scenario(path) for path in args.replay)
+
+    game = make_game()
+    results = {}
+    for scenario in scenarios:
+        name = scenario.name
+        if args.memory:
+            frames = len(scenario.replay) if scenario.replay is not None else args.frames
+            results[name] = measure_memory(game, scenario, frames, args.seed)
+            print(f"{name:<16}enemies={results[name]['enemies']} ai objects per enemy: "
+                  f"setup={results[name]['per_enemy_at_setup']:.1f} end={results[name]['per_enemy_at_end']:.1f}")
+            continue
+        if args.reset:
+            results[name] = measure_reset(game, scenario, args.frames, args.seed)
+            print(f"{name:<16}setup={results[name]['setup_ms']:.1f}ms restore={results[name]['restore_ms']:.2f}ms "
+                  f"checkpoint={results[name]['checkpoint_ms']:.2f}ms ({results[name]['checkpoint_bytes']} bytes)")
+            continue
+        csv_path = f"{args.csv}.{name}.csv" if args.csv else None
+        frames = args.frames
+        if scenario.replay is not None:
+            frames = max(len(scenario.replay) - args.warmup, 0)
+        results[name] = run_scenario(game, scenario, frames, args.seed, args.warmup, csv_path)
+        print_report(name, results[name])
+        if scenario.replay is not None:
+            matched = scenario.replay.verify(game)
+            results[name]["replay_matched"] = matched
+            print("replay", "matched the recording" if matched else "DIFFERS from the recording")
+        print_pool_stats(projectile_pool.report())
+        results[name]["pools"] = projectile_pool.report()
+        results[name]["textures"] = textures.stats()
+        results[name]["culling"] = game.culler.stats()
+        print("drawn", ", ".join(f"{category}={drawn}/{total}" for category, (drawn, total) in game.culler.stats().items()))
+        results[name]["asteroid_field"] = game.asteroid_field.stats()
+        print("asteroid field", ", ".join(f"{key}={value}" for key, value in game.asteroid_field.stats().items()))
+        results[name]["regions"] = game.regions.stats()
+        print("regions", ", ".join(f"{key}={value}" for key, value in game.regions.stats().items()))
+        print("textures", ", ".join(f"{key}={value:g}" for key, value in textures.stats().items()))
+        results[name]["wrapping"] = game.wrapping.stats()
+        print("wrapping", ", ".join(f"{key}={value}" for key, value in game.wrapping.stats().items()))
+        results[name]["scheduler"] = game.scheduler.stats()
+        print("scheduler", ", ".join(f"{key}={value}" for key, value in game.scheduler.stats().items()))
+        results[name]["ai_lod"] = game.ai_lod.stats()
+        print("ai lod", ", ".join(f"{key}={value}" for key, value in game.ai_lod.stats().items()))
+        results[name]["entities"] = entities.stats()
+        print("entities", ", ".join(f"{key}={value}" for key, value in entities.stats().items()))
+        results[name]["damage_numbers"] = damage_numbers.stats()
+        print("damage numbers", ", ".join(f"{key}={value}" for key, value in damage_numbers.stats().items()))
+        results[name]["hits"] = hit_queue.report()
+        print("hits", ", ".join(f"{key}={value}" for key, value in hit_queue.report().items()))
+    game.close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
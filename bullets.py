@@ -1,6 +1,7 @@
 import arcade
 import math
-import random
+from resources import textures
+from rng import streams
 
 class Bullet(arcade.Sprite):
     """Base class of a bullet. Return this sprite from another sprite's .fire() method
@@ -32,23 +33,44 @@ class Bullet(arcade.Sprite):
         level: int = 1,
         scale: float = 1
     ):
-        super().__init__(filename, scale=scale, center_x=center_x, center_y=center_y)
-        self.angle = angle
-        self.lifespan = 200
-        self.damage = damage
-        self.level = level
+        super().__init__(texture=textures.load(filename) if filename else None, scale=scale, center_x=center_x, center_y=center_y)
         self.max_velocity = 1500
         self.movement_behaviour = None
         self.moment_of_inertia = 50
         self.collision_type = 'bullet'
+        self.mass = 1
+        # set by the ProjectilePool that handed this bullet out, if any
+        self.pool = None
+        self.in_pool = False
+        Bullet.reset(self, center_x, center_y, angle, damage, level)
+
+    def reset(self, center_x: float, center_y: float, angle: float, damage: float = 1, level: int = 1) -> None:
+        """Set the bullet up to be fired again. Takes the same arguments as the
+        class does, so the ProjectilePool can reuse bullets instead of making new ones"""
+        self.center_x = center_x
+        self.center_y = center_y
+        self.angle = angle
+        self.lifespan = 200
+        self.damage = damage
+        self.level = level
+        self.aim()
+
+    def aim(self) -> None:
+        """Set change_x and change_y to travel in the direction of angle"""
         self.change_x = self.max_velocity * math.cos(self.angle_radians)
         self.change_y = self.max_velocity * math.sin(self.angle_radians)
-        self.mass = 1
 
     @property
     def angle_radians(self):
         return math.radians(self.angle)
 
+    def kill(self):
+        """Hand pooled bullets back to their pool rather than throwing them away"""
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().kill()
+
     def update(self):
         """This is run every frame, note - don't call super().update() as Sprite logic
         is handled by the physics engine."""
@@ -59,15 +81,17 @@ class Bullet(arcade.Sprite):
 
 class RedLaser(Bullet):
     """Standard enemy laser. Fast but weak"""
-    def __init__(self, center_x: float, center_y: float, angle: float, damage: float, level: int) -> None:
+    def __init__(self, center_x: float, center_y: float, angle: float, damage: float = 1, level: int = 1) -> None:
         super().__init__(':resources:images/space_shooter/laserRed01.png', center_x, center_y, angle, scale=0.5, damage=damage, level=level)
+        self.mass = 0.2
+
+    def aim(self) -> None:
         self.change_x = self.max_velocity * math.cos(self.angle_radians + math.pi / 2)
         self.change_y = self.max_velocity * math.sin(self.angle_radians + math.pi / 2)
-        self.mass = 0.2
 
 class BlueLaser(Bullet):
     """Standard laser for the player. The initial weapon"""
-    def __init__(self, center_x: float, center_y: float, angle: float, damage: float, level: int) -> None:
+    def __init__(self, center_x: float, center_y: float, angle: float, damage: float = 1, level: int = 1) -> None:
         super().__init__(
             ':resources:images/space_shooter/laserBlue01.png',
             center_x,
@@ -82,7 +106,7 @@ class BlueLaser(Bullet):
 
 class Saw(Bullet):
     """A slow moving heavy bullet, great for knocing asteroids"""
-    def __init__(self, center_x: float, center_y: float, angle: float, damage: float, level: int) -> None:
+    def __init__(self, center_x: float, center_y: float, angle: float, damage: float = 1, level: int = 1) -> None:
         super().__init__(
             ':resources:images/enemies/saw.png',
              center_x,
@@ -94,9 +118,13 @@ class Saw(Bullet):
         )
         self.max_velocity = 500
         self.mass = 5
+        # aim again now max_velocity is set
+        self.aim()
+
+    def aim(self) -> None:
         self.change_x = self.max_velocity * math.cos(self.angle_radians + math.pi / 2)
         self.change_y = self.max_velocity * math.sin(self.angle_radians + math.pi / 2)
-        
+
 
 class Bouncy(Bullet):
     def __init__(self, center_x: float, center_y: float, angle: float, damage: float, level: int) -> None:
@@ -123,12 +151,18 @@ class Orb(Bullet):
         exp: how much experience it is worth. Set by the dropping enemy. An orb drop should
         provide the same total exp regardless of the number dropped.
     """
-    def __init__(self, center_x: float, center_y: float, angle: float, exp: float) -> None:
+    def __init__(self, center_x: float, center_y: float, angle: float, exp: float = 0) -> None:
         super().__init__(':resources:images/items/star.png', center_x, center_y, angle, scale=0.2)
+        self.max_velocity = 100
+        self.collision_type = 'orb'
+        self.reset(center_x, center_y, angle, exp)
+
+    def reset(self, center_x: float, center_y: float, angle: float, exp: float = 0) -> None:
+        super().reset(center_x, center_y, angle)
         self.exp = exp
+        self.lifespan = 400 + streams.loot.randint(-50, 50) # stop all apearing and disapearing as one
+
+    def aim(self) -> None:
         self.change_x = self.max_velocity * math.cos(self.angle_radians + math.pi / 2)
         self.change_y = self.max_velocity * math.sin(self.angle_radians + math.pi / 2)
-        self.max_velocity = 100
-        self.collision_type = 'orb'
-        self.lifespan = 400 + random.randint(-50, 50) # stop all apearing and disapearing as one
-        
+
@@ -23,3 +23,81 @@ ROCK_CHOICES = [
     "meteorGrey_big3.png",
 ]
 
+
+# World population used by TestGame.setup(). The benchmark scenarios
+# in benchmark.py override these to build scaled up worlds
+ENEMY_COUNT = 5
+ROCK_COUNT = 500
+SWARMS = [
+    # (x, y, level, size)
+    (3000, 200, 1, 8),
+    (25000, 200, 1, 25),
+    (5000, 200, 1, 5),
+    (8000, 200, 1, 5),
+    (12000, 200, 1, 10),
+]
+
+# The rocks are made in chunks this wide as the view moves, from
+# ASTEROID_FIELD_BEHIND behind the middle of the view to ASTEROID_FIELD_AHEAD
+# ahead of it, see AsteroidField
+ASTEROID_CHUNK_WIDTH = WIDTH
+ASTEROID_FIELD_AHEAD = WIDTH * 3
+ASTEROID_FIELD_BEHIND = WIDTH * 2
+# ROCK_COUNT rocks to every this much of x, which sets how thick the field is
+ROCK_FIELD_WIDTH = WIDTH * 52
+
+# Floating damage numbers, see DamageNumbers. At most DAMAGE_NUMBER_LIMIT
+# are shown at once, the oldest making way for new ones
+DAMAGE_NUMBER_LIMIT = 64
+DAMAGE_NUMBER_DIGITS = 4
+DAMAGE_NUMBER_FONT_SIZE = 18
+# seconds each number is shown for, and how fast it floats up in pixels a second
+DAMAGE_NUMBER_LIFETIME = 0.8
+DAMAGE_NUMBER_RISE = 60
+
+# Width and height in pixels of a cell in the spatial index
+SPATIAL_CELL_SIZE = 256
+
+# Bees only push away from other bees in their swarm this close
+BEE_SEPARATION_RANGE = 60
+
+# Bodies further than REGION_PARK_DISTANCE from the middle of the view are
+# taken out of the physics engine, and put back inside REGION_WAKE_DISTANCE
+REGION_PARK_DISTANCE = WIDTH * 3
+REGION_WAKE_DISTANCE = WIDTH * 2
+REGION_CHECKS_PER_FRAME = 128
+
+# The simulation runs in fixed ticks of FIXED_TIMESTEP seconds, however
+# fast frames are drawn. Each tick steps the physics PHYSICS_SUBSTEPS times
+FIXED_TIMESTEP = 1 / 60
+PHYSICS_SUBSTEPS = 1
+# after a slow frame, run at most this many ticks to catch up
+MAX_CATCH_UP_STEPS = 5
+# run the enemy AI every this many ticks
+AI_TICK_INTERVAL = 1
+# draw sprites part way between the last two ticks
+INTERPOLATE_RENDERING = True
+# only draw the sprites in view, see VisibilityCuller
+CULL_DRAWING = True
+# how far off screen a sprite's center can be, past its own height, and still be drawn
+CULL_MARGIN = 64
+
+# Enemies further along x from the middle of the view run their AI less
+# often. (distance, ticks between updates), checked in order
+AI_LOD_BANDS = [
+    (WIDTH, 1),
+    (WIDTH * 2, 3),
+    (WIDTH * 4, 10),
+    (float("inf"), 30),
+]
+# stop running enemy AI for the tick after this many ms, the rest wait for the next tick
+AI_BUDGET_MS = 4
+
+# Worker processes that work out swarming bees' steering, 0 keeps it all in
+# this process. See parallel_ai.py and benchmark.py --parallel
+AI_WORKERS = 0
+# with fewer swarming bees due than this, don't wake the workers
+AI_PARALLEL_MIN_BATCH = 256
+
+# threads decoding textures while the game starts, see startup.py
+STARTUP_WORKERS = 4
@@ -0,0 +1,98 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+import arcade
+from constants import CULL_MARGIN
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy is optional, update() falls back to a plain loop over the snapshot
+    np = None
+
+if TYPE_CHECKING:
+    from snapshot import KinematicSnapshot
+
+
+class VisibilityCuller:
+    """Draws only the sprites the camera can see
+
+    Each scene list registered with register() gets a second, visible list
+    holding just its sprites that are on screen, and draw() draws those
+    instead of the whole scene. update() finds what is on screen from the
+    tick's kinematic snapshot in one pass, with numpy when it is installed,
+    then only adds and removes the sprites that came into or went out of view.
+    Sprites off screen are never uploaded or drawn.
+
+    A sprite is on screen if it is within its own height, plus margin, of the
+    view. The margin covers sprites wider than they are tall and how far they
+    have been interpolated since the snapshot. A sprite added to the physics
+    engine after the tick's snapshot is drawn from the next tick on.
+
+    update() doesn't need a window, so the counts from stats() can be checked
+    headless.
+
+    Args:
+        margin: how far outside the view a sprite's center can be and still be drawn
+    """
+    def __init__(self, margin: float = CULL_MARGIN) -> None:
+        self.margin = margin
+        # category -> (scene list, visible list), in draw order
+        self.categories: Dict[str, Tuple[arcade.SpriteList, arcade.SpriteList]] = {}
+        # id(scene list) -> its visible list, to find a sprite's from its sprite lists
+        self.visible_lists: Dict[int, arcade.SpriteList] = {}
+
+    def register(self, category: str, sprites: arcade.SpriteList) -> None:
+        """Draw the sprites in sprites that are on screen. Categories are drawn in the order they are registered"""
+        visible = arcade.SpriteList()
+        self.categories[category] = (sprites, visible)
+        self.visible_lists[id(sprites)] = visible
+
+    def update(self, snapshot: KinematicSnapshot, left: float, bottom: float, right: float, top: float) -> None:
+        """Bring the visible lists in line with what is inside the view (left, bottom, right, top)"""
+        on_screen: Dict[int, List[arcade.Sprite]] = {id(visible): [] for visible in self.visible_lists.values()}
+        if len(snapshot):
+            for entity_id in self.candidates(snapshot, left - self.margin, bottom - self.margin, right + self.margin, top + self.margin):
+                sprite = snapshot.sprites[entity_id]
+                for sprite_list in sprite.sprite_lists:
+                    visible = self.visible_lists.get(id(sprite_list))
+                    if visible is not None:
+                        on_screen[id(visible)].append(sprite)
+                        break
+
+        for _, visible in self.categories.values():
+            shown = on_screen[id(visible)]
+            showing = set(visible)
+            keep = set(shown)
+            for sprite in showing - keep:
+                visible.remove(sprite)
+            for sprite in shown:
+                if sprite not in showing:
+                    visible.append(sprite)
+
+    @staticmethod
+    def candidates(snapshot: KinematicSnapshot, left: float, bottom: float, right: float, top: float) -> List[int]:
+        """The entity ids of the bodies within their height of the rectangle"""
+        if np is not None:
+            x = np.frombuffer(snapshot.x)
+            y = np.frombuffer(snapshot.y)
+            margin = np.frombuffer(snapshot.height)
+            inside = (x > left - margin) & (x < right + margin) & (y > bottom - margin) & (y < top + margin)
+            return np.flatnonzero(inside).tolist()
+        return [
+            entity_id
+            for entity_id, (x, y, margin) in enumerate(zip(snapshot.x, snapshot.y, snapshot.height))
+            if left - margin < x < right + margin and bottom - margin < y < top + margin
+        ]
+
+    def visible(self, category: str) -> arcade.SpriteList:
+        """The sprites in category that were on screen at the last update()"""
+        return self.categories[category][1]
+
+    def draw(self) -> None:
+        for _, visible in self.categories.values():
+            visible.draw()
+
+    def stats(self) -> Dict[str, Tuple[int, int]]:
+        """(drawn, total) sprites for each category"""
+        return {category: (len(visible), len(sprites)) for category, (sprites, visible) in self.categories.items()}
@@ -0,0 +1,159 @@
+from __future__ import annotations
+from typing import List, Optional, Tuple
+
+import arcade
+from constants import (
+    DAMAGE_NUMBER_DIGITS, DAMAGE_NUMBER_FONT_SIZE, DAMAGE_NUMBER_LIFETIME,
+    DAMAGE_NUMBER_LIMIT, DAMAGE_NUMBER_RISE,
+)
+from resources import textures
+
+# how far above the sprite that was hit a number starts
+DAMAGE_NUMBER_OFFSET_Y = 30
+ENEMY_DAMAGE_COLOUR = (255, 220, 80)
+PLAYER_DAMAGE_COLOUR = (255, 70, 70)
+
+
+class _Label:
+    """One number's digit sprites and how long it has been shown"""
+    __slots__ = ('sprites', 'length', 'age', 'active')
+
+    def __init__(self, sprites: List[arcade.Sprite]) -> None:
+        self.sprites = sprites
+        # how many of the sprites the number uses
+        self.length = 0
+        self.age = 0.0
+        self.active = False
+
+
+class DamageNumbers:
+    """Numbers that float up from whatever was just hurt and fade out
+
+    Laying out an arcade.Text for every hit is far too slow in a swarm
+    fight, so each number is made of digit sprites instead. The digits are
+    glyph textures made once by textures.glyph(), and every digit sprite of
+    every number lives in one sprite list, drawn in one go.
+
+    preallocate() makes limit numbers of digits sprites each, which are
+    reused from then on. Numbers not being shown are left in the list with
+    an alpha of 0, so showing one never changes the list. Once limit numbers
+    are showing the oldest one makes way for the next.
+
+    add() is called from Enemy.lose_health() and Player.take_damage(), so
+    hits show whatever hurt them. update() moves and fades every number
+    once a frame.
+
+    Args:
+        limit: most numbers shown at once
+
+        digits: most digits in a number, bigger numbers show as all 9s
+
+        lifetime: seconds each number is shown for
+
+        rise: pixels a second numbers float up
+    """
+    def __init__(
+        self,
+        limit: int = DAMAGE_NUMBER_LIMIT,
+        digits: int = DAMAGE_NUMBER_DIGITS,
+        lifetime: float = DAMAGE_NUMBER_LIFETIME,
+        rise: float = DAMAGE_NUMBER_RISE,
+    ) -> None:
+        self.limit = limit
+        self.digits = digits
+        self.lifetime = lifetime
+        self.rise = rise
+        # made by preallocate(), once there is a window
+        self.sprite_list: Optional[arcade.SpriteList] = None
+        self.labels: List[_Label] = []
+        self.active: List[_Label] = []
+        # the label add() uses next, always the oldest
+        self.next = 0
+        self.shown = 0
+        self.replaced = 0
+
+    def preallocate(self) -> None:
+        """Make every digit sprite up front. Only does anything the first time"""
+        if self.sprite_list is not None:
+            return
+        self.sprite_list = arcade.SpriteList()
+        zero = textures.glyph("0", DAMAGE_NUMBER_FONT_SIZE)
+        for _ in range(self.limit):
+            sprites = []
+            for _ in range(self.digits):
+                sprite = arcade.Sprite(texture=zero)
+                sprite.alpha = 0
+                sprites.append(sprite)
+                self.sprite_list.append(sprite)
+            self.labels.append(_Label(sprites))
+
+    def add(self, x: float, y: float, amount: float, colour: Tuple[int, int, int] = ENEMY_DAMAGE_COLOUR) -> None:
+        """Show amount, rounded, floating up from (x, y)"""
+        if self.sprite_list is None:
+            return
+        text = str(min(max(round(amount), 0), 10 ** self.digits - 1))
+        label = self.labels[self.next]
+        self.next = (self.next + 1) % self.limit
+        if label.active:
+            self.replaced += 1
+        else:
+            label.active = True
+            self.active.append(label)
+        self.shown += 1
+
+        width = textures.glyph("0", DAMAGE_NUMBER_FONT_SIZE).width
+        left = x - width * (len(text) - 1) / 2
+        for index, sprite in enumerate(label.sprites):
+            if index < len(text):
+                sprite.texture = textures.glyph(text[index], DAMAGE_NUMBER_FONT_SIZE)
+                sprite.position = (left + index * width, y)
+                sprite.color = colour
+                sprite.alpha = 255
+            elif index < label.length:
+                sprite.alpha = 0
+        label.length = len(text)
+        label.age = 0.0
+
+    def update(self, delta_time: float) -> None:
+        """Float every number up and fade it, hiding the ones that have been shown for long enough"""
+        if not self.active:
+            return
+        dy = self.rise * delta_time
+        still_active = []
+        for label in self.active:
+            if not label.active:
+                continue
+            label.age += delta_time
+            sprites = label.sprites[:label.length]
+            if label.age >= self.lifetime:
+                label.active = False
+                for sprite in sprites:
+                    sprite.alpha = 0
+                continue
+            alpha = int(255 * (1 - label.age / self.lifetime))
+            for sprite in sprites:
+                sprite.center_y += dy
+                sprite.alpha = alpha
+            still_active.append(label)
+        self.active = still_active
+
+    def draw(self) -> None:
+        if self.active:
+            self.sprite_list.draw()
+
+    def clear(self) -> None:
+        """Hide every number and start counting again, e.g. when the level is set up"""
+        for label in self.active:
+            label.active = False
+            for sprite in label.sprites[:label.length]:
+                sprite.alpha = 0
+        self.active = []
+        self.shown = 0
+        self.replaced = 0
+
+    def stats(self):
+        return {"live": len(self.active), "shown": self.shown, "replaced": self.replaced}
+
+
+# The game's damage numbers. Anything that takes damage should add() to these
+damage_numbers = DamageNumbers()
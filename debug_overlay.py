@@ -0,0 +1,98 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple
+
+import arcade
+from activities import AvoidObstaclesActivity
+from resources import textures
+
+if TYPE_CHECKING:
+    from fighter import Enemy
+    from states import State
+
+# front, left and right, the same colours as AvoidObstaclesActivity's detectors
+DETECTOR_COLOURS = [(0, 0, 255), (255, 0, 0), (0, 255, 0)]
+DETECTOR_RADIUS = 20
+# from the enemy's center to the left of its state label
+LABEL_OFFSET_X = -30
+LABEL_OFFSET_Y = -60
+
+
+class DebugOverlay:
+    """Shows what each enemy's AI is doing: its state and its obstacle detectors
+
+    F2 switches it on and off. While it is off the game doesn't call draw(),
+    so it costs nothing.
+
+    AvoidObstaclesActivity shares one set of detectors between every enemy
+    in a state, so draw() puts a sprite where each enemy's detectors go and
+    draws them all as one sprite list. The sprites are kept between frames
+    and only added or removed as the number of detectors changes.
+
+    Each enemy's label is an arcade.Text kept between frames. Its text is
+    only set, and so only laid out again, when the enemy's state changes.
+    """
+    def __init__(self) -> None:
+        self.visible = False
+        self.detectors = arcade.SpriteList()
+        # enemy -> (the state its label shows, the label)
+        self.labels: Dict[Enemy, Tuple[State, arcade.Text]] = {}
+
+    def toggle(self) -> None:
+        self.visible = not self.visible
+        if not self.visible:
+            self.clear()
+
+    def clear(self) -> None:
+        self.detectors.clear()
+        self.labels.clear()
+
+    def draw(self, enemies: Iterable[Enemy]) -> None:
+        """Draw the overlay for enemies, e.g. the ones on screen"""
+        used = 0
+        labels: List[arcade.Text] = []
+        for enemy in enemies:
+            state_machine = enemy.state_machine
+            state = state_machine.state
+            for activity in state.activities:
+                if isinstance(activity, AvoidObstaclesActivity):
+                    for position in activity.detector_positions(state_machine):
+                        self._detector(used).position = position
+                        used += 1
+            labels.append(self._label(enemy, state))
+        while len(self.detectors) > used:
+            self.detectors.pop()
+
+        self.detectors.draw()
+        for label in labels:
+            label.draw()
+
+        if len(self.labels) > len(labels):
+            # killed enemies are no longer in any sprite list
+            for enemy in [enemy for enemy in self.labels if not enemy.sprite_lists]:
+                del self.labels[enemy]
+
+    def _detector(self, index: int) -> arcade.Sprite:
+        if index < len(self.detectors):
+            return self.detectors[index]
+        sprite = arcade.Sprite(texture=textures.circle(DETECTOR_RADIUS, DETECTOR_COLOURS[index % 3]))
+        self.detectors.append(sprite)
+        return sprite
+
+    def _label(self, enemy: Enemy, state: State) -> arcade.Text:
+        x = int(enemy.center_x + LABEL_OFFSET_X)
+        y = int(enemy.center_y + LABEL_OFFSET_Y)
+        shown = self.labels.get(enemy)
+        if shown is None:
+            label = arcade.Text(str(state), x, y, arcade.color.WHITE, font_size=12)
+            self.labels[enemy] = (state, label)
+            return label
+        shown_state, label = shown
+        if shown_state is not state:
+            label.text = str(state)
+            self.labels[enemy] = (state, label)
+        # moving a label is cheap, as long as it is only done when it has moved
+        if label.x != x:
+            label.x = x
+        if label.y != y:
+            label.y = y
+        return label
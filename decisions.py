@@ -6,15 +6,25 @@ if TYPE_CHECKING:
     from state_machines import StateMachine 
 import arcade
 import math
-from time import time
+from typing import Optional, Tuple
+from scheduler import HEALTH, POLLED, PROXIMITY, SWARM, TIMER
 
 class Decision:
     """A class to hold a conditional. This represents an 'if' statement 
-    that can be swapped out in a transition"""
+    that can be swapped out in a transition
+
+    events is a mask of the scheduler events that can change the answer.
+    Decisions left as POLLED are checked every tick."""
+    events = POLLED
+
     def decide(self, state_machine: StateMachine) -> bool: # pyright: ignore
         """Evaluate the decision"""
         return False
 
+    def enter(self, state_machine: StateMachine) -> None: # pyright: ignore
+        """Run when the state this decision's transition belongs to is entered"""
+        pass
+
 
 class LowHealthDecision(Decision):
     """Trigger when health drops below a threshold
@@ -22,6 +32,8 @@ class LowHealthDecision(Decision):
     Args:
         health_threshold: The value at which to trigget the decision
     """
+    events = HEALTH
+
     def __init__(self, health_threshold) -> None:
         self.lower_health_threshold = health_threshold
 
@@ -31,6 +43,8 @@ class LowHealthDecision(Decision):
 
 class FullHealthDecision(Decision):
     """Trigger when an enemies health reacher their max_health"""
+    events = HEALTH
+
     def decide(self, state_machine: StateMachine) -> bool:
         return state_machine.sprite.health >= state_machine.sprite.max_health
 
@@ -39,7 +53,7 @@ class WithinRangeDecision(Decision):
     """Triggers when sprite is outside of some allowed band or range of the target
     
     Args:
-        target: The sprite to check distance against
+        target: The sprite to check distance against, defaults to the state machine's target
 
         outer_limit: The furthest point of the allowed range before trigering
         leave at math.inf if no outer limit is required i.e. only inner distance matters
@@ -58,7 +72,7 @@ class WithinRangeDecision(Decision):
         If there is only a small band of distances an enemy should be in before changing state, 
         use both with WithinRangeDecision(target, inner_limit=200, outer_limit=600) etc.
     """
-    def __init__(self, target: arcade.Sprite, outer_limit: float = math.inf, inner_limit: float = 0)-> None:
+    def __init__(self, target: Optional[arcade.Sprite] = None, outer_limit: float = math.inf, inner_limit: float = 0)-> None:
         self.target = target
         self.outer_limit = outer_limit
         self.inner_limit = inner_limit
@@ -66,39 +80,86 @@ class WithinRangeDecision(Decision):
         if self.inner_limit >= self.outer_limit:
             raise ValueError('inner_limit must be smaller than outer_limit')
 
+        # compare squared distances so deciding doesn't need a square root
+        self.inner_squared = inner_limit * inner_limit
+        self.outer_squared = outer_limit * outer_limit
+        # an outer limit can be watched with a spatial query around the target
+        self.events = PROXIMITY if math.isfinite(outer_limit) else POLLED
+
+    def enter(self, state_machine: StateMachine) -> None:
+        if self.events and state_machine.scheduler is not None:
+            target = self.target if self.target is not None else state_machine.target
+            state_machine.scheduler.watch(target, self.outer_limit, self.inner_limit)
+
+    def target_position(self, state_machine: StateMachine) -> Tuple[float, float]:
+        target = self.target if self.target is not None else state_machine.target
+        return target.center_x, target.center_y
+
     def decide(self, state_machine: StateMachine):
-        dist = math.dist(state_machine.sprite.position, self.target.position) 
-        return self.inner_limit < dist < self.outer_limit
+        x, y = state_machine.position()
+        target_x, target_y = self.target_position(state_machine)
+        dx = x - target_x
+        dy = y - target_y
+        return self.inner_squared < dx * dx + dy * dy < self.outer_squared
+
+
+class WithinRangeOfDestinationDecision(WithinRangeDecision):
+    """A WithinRangeDecision for the destination in the state machine's blackboard"""
+    def __init__(self, outer_limit: float = math.inf, inner_limit: float = 0) -> None:
+        super().__init__(None, outer_limit, inner_limit)
+        # every enemy has its own destination, so there is nothing to share a query around
+        self.events = POLLED
+
+    def target_position(self, state_machine: StateMachine) -> Tuple[float, float]:
+        blackboard = state_machine.blackboard
+        return blackboard.destination_x, blackboard.destination_y
 
 
 class TimeElapsedDecision(Decision):
-    """Trigger after some elapsed time. Note this is independent of frame rate
+    """Trigger some time after the current state was entered. Uses simulation
+    time when there is a scheduler, so this is independent of frame rate
 
     Args:
         duration: The time in seconds to wait before triggering
     """
+    events = TIMER
+
     def __init__(self, duration: float) -> None:
-        self.start_time = time()
         self.duration = duration
 
+    def enter(self, state_machine: StateMachine) -> None:
+        if state_machine.scheduler is not None:
+            state_machine.scheduler.after(self.duration, state_machine)
+
     def decide(self, state_machine: StateMachine):
-        return time() - self.start_time >= self.duration
+        # a little slack so a timer that went off on time isn't a rounding error short
+        return state_machine.now() - state_machine.blackboard.entered_at >= self.duration - 1e-9
 
 class TakenDamageDecision(Decision):
     """Trigger when damage is taken for any reason
 
     Args:
-        initial_health: The health of the sprite when the transition is first made
+        initial_health: The health to compare against, defaults to
+            the sprite's health when the current state was entered
     """
-    def __init__(self, initial_health: float) -> None:
+    events = HEALTH
+
+    def __init__(self, initial_health: Optional[float] = None) -> None:
         self.initial_health = initial_health
 
     def decide(self, state_machine: StateMachine) -> bool:
-        return state_machine.sprite.health < self.initial_health
+        initial_health = self.initial_health
+        if initial_health is None:
+            initial_health = state_machine.blackboard.entry_health
+        return state_machine.sprite.health < initial_health
 
 class SwarmPulledDecision(Decision):
-    def __init__(self, swarm: Swarm) -> None:
+    """Trigger when the swarm is pulled, by default the bee's own swarm"""
+    events = SWARM
+
+    def __init__(self, swarm: Optional[Swarm] = None) -> None:
         self.swarm = swarm
 
     def decide(self, state_machine: StateMachine) -> bool:
-        return self.swarm.pulled 
+        swarm = self.swarm if self.swarm is not None else state_machine.sprite.swarm
+        return swarm.pulled 
@@ -1,9 +1,13 @@
 import arcade
-import random
 from pyglet.math import Vec2
-from typing import List
+from typing import List, Optional
 import math
 from bullets import RedLaser, Saw, Orb
+from damage_text import DAMAGE_NUMBER_OFFSET_Y, damage_numbers
+from pools import projectile_pool
+from scheduler import HEALTH
+from resources import textures
+from rng import streams
 from pymunk import Body
 from utils import get_physics_body
 from state_machines import FighterStateMachine, StateMachine
@@ -11,25 +15,33 @@ from state_machines import FighterStateMachine, StateMachine
 class Enemy(arcade.Sprite):
     """Base sprite for enemies"""
     def __init__(self, filename: str = "", scale: float = 1, x: float = 0, y: float = 0, level: int = 1):
-        super().__init__(filename, scale)
+        super().__init__(texture=textures.load(filename) if filename else None, scale=scale)
         self.center_x = x
         self.center_y = y
         self.level = level
         self.max_speed = 500
         self.max_force = 50
         self.forces: List[Vec2] = []
-        self.health = math.floor((random.randint(40, 65) * 2 * level) / 30) + level + 10
+        self.health = math.floor((streams.enemies.randint(40, 65) * 2 * level) / 30) + level + 10
         self.max_health = self.health
-        self.attack = math.floor((random.randint(20, 35) * 2 * level) / 30) + 5
-        self.defence = math.floor((random.randint(20, 35) * 2 * level) / 30) + 5
+        self.attack = math.floor((streams.enemies.randint(20, 35) * 2 * level) / 30) + 5
+        self.defence = math.floor((streams.enemies.randint(20, 35) * 2 * level) / 30) + 5
         self.base_experience = 20
         self.weapon_type = Saw
         # physics engine not available during init
         self.state_machine = StateMachine(self)
+        self._physics_body: Optional[Body] = None
+        # keep pushing with the last steering force while the AI isn't
+        # running, set by AILevelOfDetail
+        self.hold_forces = False
+        self.held_force: Optional[Vec2] = None
 
     @property
     def physics_body(self) -> Body:
-        return get_physics_body(self.physics_engines[0], self)
+        # the body never changes once the sprite is in the engine, so only look it up once
+        if self._physics_body is None:
+            self._physics_body = get_physics_body(self.physics_engines[0], self)
+        return self._physics_body
 
     @property
     def experience(self):
@@ -40,28 +52,41 @@ class Enemy(arcade.Sprite):
         return math.radians(self.angle)
 
     def drop_experience(self) -> List[Orb]:
-        drops = random.randint(5, 10)
+        drops = streams.loot.randint(5, 10)
         exp = self.experience / drops
         orbs = []
         for i in range(drops):
-            angle = 360 * random.random()
-            orb = Orb(self.center_x, self.center_y, angle, exp)
+            angle = 360 * streams.loot.random()
+            orb = projectile_pool.acquire(Orb, self.center_x, self.center_y, angle, exp)
             orbs.append(orb)
         return orbs
 
+    def damage_from(self, damage, player_level) -> float:
+        """How much health a hit of damage from something of player_level takes off"""
+        return (((2 * player_level+2)*(damage/self.defence))/100) * streams.combat.randint(75, 100)
+
     def take_damage(self, damage, player_level):
-        res = (((2 * player_level+2)*(damage/self.defence))/100) * random.randint(75, 100)
-        self.health -= res
+        self.lose_health(self.damage_from(damage, player_level))
+
+    def lose_health(self, amount: float) -> None:
+        self.health -= amount
+        damage_numbers.add(self.center_x, self.center_y + DAMAGE_NUMBER_OFFSET_Y, amount)
+        self.state_machine.notify(HEALTH)
             
     def pymunk_moved(self, physics_engine: arcade.PymunkPhysicsEngine, dx, dy, d_angle) -> None:
-        self.physics_body.angular_velocity *= 0.7
+        physics_body = self.physics_body
+        physics_body.angular_velocity *= 0.7
         net = Vec2()
         for force in self.forces:
             net += force
+        if self.forces:
+            if self.hold_forces:
+                self.held_force = net
+        elif self.held_force is not None:
+            net = self.held_force
 
         net.limit(self.max_force)
-        self.physics_body.apply_force_at_world_point((net.x, net.y), (self.center_x, self.center_y))
-        vel = Vec2(self.physics_body.velocity.x, self.physics_body.velocity.y)
+        physics_body.apply_force_at_world_point((net.x, net.y), (self.center_x, self.center_y))
         self.forces.clear()
         # self.physics_body.angle = vel.heading - math.pi/2
 
@@ -88,7 +113,7 @@ class Fighter(Enemy):
         bullets = []
         #x = self.center_x + 80 * math.cos(math.radians(self.angle))
         #y = self.center_y + 80 * math.sin(math.radians(self.angle))
-        bullet = self.weapon_type(self.center_x, self.center_y, -self.angle, self.attack, self.level)
+        bullet = projectile_pool.acquire(self.weapon_type, self.center_x, self.center_y, -self.angle, self.attack, self.level)
         bullets.append(bullet)
         return bullets
 
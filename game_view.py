@@ -3,21 +3,78 @@ from __future__ import annotations
 import random
 import arcade
 import math
+from time import perf_counter
+from typing import TYPE_CHECKING, Optional
 from arcade.pymunk_physics_engine import PymunkPhysicsEngine
 from pyglet.math import Vec2
 from constants import *
 from fighter import Fighter
 from player import Player
-from hit_handlers import bee_hit_handler, enemy_hit_handler, kill_bullet, no_collision, pick_up_exp
+from hit_handlers import bee_hit_handler, enemy_hit_handler, hit_queue, kill_bullet, no_collision, pick_up_exp
 from state_machines import FighterStateMachine
-from swarm_of_bees import Swarm
+from swarm_of_bees import Bee, Swarm
+from spatial import SpatialIndex
+from snapshot import KinematicSnapshot
+from scheduler import Scheduler
+from ai_lod import AILevelOfDetail
+from parallel_ai import ParallelSwarmAI
+from bullets import BlueLaser, Orb, RedLaser, Saw
+from pools import projectile_pool
+from registry import entities
+from replay import InputFrame, InputRecorder, InputReplay, KEY_A, KEY_D, KEY_S, KEY_W, NO_AIM, TORQUE_LEFT, TORQUE_RIGHT, world_checksum
+from rng import streams
+from utils import get_physics_body
+from resources import textures
+from regions import RegionManager
+from debug_overlay import DebugOverlay
+from asteroid_field import AsteroidField
+from hud import ExperienceBar, HealthBars
+from damage_text import damage_numbers
+from profiler import FrameProfiler, ProfilerOverlay
+
+if TYPE_CHECKING:
+    from world_state import WorldState
+
+# bodies that move further than this in one tick are drawn without interpolating
+INTERPOLATION_SNAP = 200
+
+# how many of each projectile to make when the level is set up
+PROJECTILE_POOL_SIZES = {BlueLaser: 32, RedLaser: 32, Saw: 32, Orb: 64}
 
 class TestGame(arcade.Window):
-    """The main game window"""
-    def __init__(self) -> None:
+    """The main game window
+
+    Args:
+        use_joystick: move the player with the first joystick plugged in, if there is one
+
+        build: load the textures and set up the level now. With False the
+            caller does both before the first update, see startup.py
+    """
+    def __init__(self, use_joystick: bool = True, build: bool = True) -> None:
         super().__init__(WIDTH, HEIGHT, TITLE) # pyright: ignore
 
-        self.player_sprite = Player(1, 'blue', 400, 400)
+        # how many things setup() makes. benchmark.py changes these
+        # before calling setup() to build bigger worlds
+        self.enemy_count = ENEMY_COUNT
+        self.rock_count = ROCK_COUNT
+        self.swarm_layout = list(SWARMS)
+        # everything random comes from rng.streams seeded with this in setup()
+        self.seed = random.getrandbits(32)
+        # see start_recording() and start_replay()
+        self.recorder: Optional[InputRecorder] = None
+        self.replay: Optional[InputReplay] = None
+
+        # fixed timestep settings, see on_update()
+        self.physics_substeps = PHYSICS_SUBSTEPS
+        self.ai_tick_interval = AI_TICK_INTERVAL
+        self.interpolate_rendering = INTERPOLATE_RENDERING
+        self.cull_drawing = CULL_DRAWING
+        # swarming bees' steering in worker processes, off unless AI_WORKERS is set.
+        # The pool lasts between levels, see set_ai_workers()
+        self.parallel_ai = ParallelSwarmAI()
+
+        # made in setup(), making one here would load its textures before the loading view
+        self.player_sprite: Optional[Player] = None
         self.scene = arcade.Scene()
         self.torque_left = False
         self.torque_right = False
@@ -25,24 +82,51 @@ class TestGame(arcade.Window):
         self.d_pressed = False
         self.s_pressed = False
         self.w_pressed = False
+        # fire presses and where the mouse points since the last tick, see read_input()
+        self.fire_requests = 0
+        self.aim_angle: Optional[float] = None
+        self.input = InputFrame()
         self.camera = arcade.Camera()
         self.physics_engine = PymunkPhysicsEngine()
         self.gui_camera = arcade.Camera()
+        # F3 shows timings on screen, F4 starts/stops writing them to a csv file
+        self.profiler = FrameProfiler()
+        self.profiler_overlay = ProfilerOverlay(self.profiler)
+        # F2 shows each enemy's state and obstacle detectors
+        self.debug_overlay = DebugOverlay()
         self.level_text = arcade.Text("", 50, HEIGHT - 80, font_size=20)
 
         # load in the joystick. This could be in a try except
         # in case a joystick is not avalible
-        try:
-            self.joystick = arcade.get_joysticks()[0]
-            self.joystick.open()
-            self.joystick.push_handlers(self)
-        except IndexError:
-            self.joystick = None
+        # use_joystick=False ignores any plugged in joystick so scripted
+        # input (see benchmark.py) is the only thing moving the player
+        self.joystick = None
+        if use_joystick:
+            try:
+                self.joystick = arcade.get_joysticks()[0]
+                self.joystick.open()
+                self.joystick.push_handlers(self)
+            except IndexError:
+                self.joystick = None
 
         arcade.set_background_color(arcade.color.BLACK)
-        self.setup()
+        if build:
+            # load every texture now so none are loaded during play
+            textures.preload(workers=STARTUP_WORKERS)
+            self.setup()
 
     def setup(self) -> None:
+        # only imported once there is a level to build, they bring in numpy
+        # and don't need to hold up the first frame, see startup.py
+        from culling import VisibilityCuller
+        from steering import SteeringBatch, steering_available
+        from world_state import WorldState
+        from wrapping import WrapSystem
+
+        streams.seed(self.seed)
+        self.fire_requests = 0
+        self.aim_angle = None
+        self.input = InputFrame()
         self.scene = arcade.Scene()
         # add lists. This would normally be handles by your tilemap
         self.scene.add_sprite_list("player")
@@ -52,11 +136,60 @@ class TestGame(arcade.Window):
         self.scene.add_sprite_list("player_bullets")
         self.scene.add_sprite_list("orbs")
         self.physics_engine = arcade.PymunkPhysicsEngine(damping=1.0)
+        # unsimulated time left over from the last frame, and ticks so far
+        self.accumulator = 0.0
+        self.tick = 0
+        self.previous_positions = []
+        # rebuilt every frame in update_spatial_index() for the AI to query
+        self.spatial_index = SpatialIndex()
+        # takes far away enemies out of the physics engine
+        self.regions = RegionManager(self.physics_engine)
+        # makes rocks ahead of the view and retires them behind it
+        self.asteroid_field = AsteroidField(self.physics_engine, self.scene["rocks"], self.rock_count)
+        # solved once per frame after the enemies have run, if numpy is available
+        self.steering = SteeringBatch(hold_forces=True) if steering_available() else None
+        # which enemies run their AI each tick, by distance from the view
+        self.ai_lod = AILevelOfDetail()
+        if self.recorder is not None or self.replay is not None:
+            # the budget depends on how fast the machine is, which a replay can't repeat
+            self.ai_lod.budget = math.inf
+        # every body's position and velocity, captured once per tick before the AI runs
+        self.snapshot = KinematicSnapshot()
+        if self.steering is not None:
+            self.steering.snapshot = self.snapshot
+        # simulation time, timers and the events that run enemy transitions
+        self.scheduler = Scheduler(FIXED_TIMESTEP, self.spatial_index)
+        # the level wraps top to bottom for everything that moves
+        self.wrapping = WrapSystem()
+        for category in ("player", "rocks", "enemies", "enemy_bullets", "player_bullets", "orbs"):
+            self.wrapping.register(category, self.scene[category])
+        # labels and detectors belong to the old level's enemies
+        self.debug_overlay.clear()
+        # draws what the camera can see, in the scene's order
+        self.culler = VisibilityCuller()
+        for category in ("player", "rocks", "enemies", "enemy_bullets", "player_bullets", "orbs"):
+            self.culler.register(category, self.scene[category])
+
+        # pooled bodies belong to the old physics engine, so start again
+        projectile_pool.clear()
+        # hits from the last physics engine
+        hit_queue.clear()
+        # the lists sprites come and go from during play
+        entities.clear()
+        for category in ("enemies", "enemy_bullets", "player_bullets", "orbs"):
+            entities.track(self.scene[category])
+        for projectile_type, count in PROJECTILE_POOL_SIZES.items():
+            projectile_pool.preallocate(projectile_type, count)
+        damage_numbers.preallocate()
+        damage_numbers.clear()
         
         # The player accepts a joystick number and
         # color planning to add multiple players
         self.player_sprite = Player(0, "blue", 500, 400)
-        self.level_text.text = self.player_sprite.level
+        self.level_text.text = str(self.player_sprite.level)
+        self.shown_level = self.player_sprite.level
+        self.health_bars = HealthBars()
+        self.experience_bar = ExperienceBar()
         self.scene.add_sprite("player", self.player_sprite)
         self.physics_engine.add_sprite(
                 self.player_sprite,
@@ -66,21 +199,28 @@ class TestGame(arcade.Window):
                 damping=0.5
         )
 
-        for i in range(5):
+        for i in range(self.enemy_count):
             # helper function to reduce code duplication
             self.spawn_enemy()
+        entities.flush()
         for enemy in self.scene['enemies']:
-            enemy.state_machine = FighterStateMachine(enemy, self.physics_engine, self.scene['enemy_bullets'], self.player_sprite, self.scene['rocks'])
+            self.give_fighter_ai(enemy)
             for other in self.scene['enemies']:
                 if enemy is not other:
-                    enemy.state_machine.flee_targets.append(other)
+                    enemy.state_machine.flee_targets.append(other.handle)
             enemy.state_machine.awake()
 
-        Swarm(3000, 200, 1, 8, self.physics_engine, self.player_sprite, self.scene)
-        Swarm(25000, 200, 1, 25, self.physics_engine, self.player_sprite, self.scene)
-        Swarm(5000, 200, 1, 5, self.physics_engine, self.player_sprite, self.scene)
-        Swarm(8000, 200, 1, 5, self.physics_engine, self.player_sprite, self.scene)
-        Swarm(12000, 200, 1, 10, self.physics_engine, self.player_sprite, self.scene)
+        self.swarms = [
+            Swarm(x, y, level, size, self.physics_engine, self.player_sprite, self.scene)
+            for x, y, level, size in self.swarm_layout
+        ]
+        entities.flush()
+        for enemy in self.scene['enemies']:
+            self.share_ai_services(enemy.state_machine)
+            if isinstance(enemy, Bee):
+                self.regions.register(enemy)
+                self.ai_lod.register(enemy)
+                enemy.state_machine.awake()
 
         self.accelerating_up = False
         self.accelerating_down = False
@@ -106,17 +246,37 @@ class TestGame(arcade.Window):
         self.physics_engine.add_collision_handler('enemy', 'orb', begin_handler=no_collision)
         self.physics_engine.add_collision_handler('orb', 'bee', begin_handler=no_collision)
 
+        # the culler works from the snapshot, so the first frame has one to draw from
+        self.snapshot.capture(self.physics_engine)
+        # R goes back to here without setting everything up again, see reset_level()
+        self.level_start = WorldState.capture(self)
+
+    def share_ai_services(self, state_machine):
+        """Give a state machine the per tick spatial index, steering batch, snapshot and scheduler"""
+        state_machine.spatial_index = self.spatial_index
+        state_machine.steering = self.steering
+        state_machine.snapshot = self.snapshot
+        state_machine.scheduler = self.scheduler
+
+    def give_fighter_ai(self, enemy):
+        """Give a fighter its state machine. It starts thinking once awake() is called"""
+        enemy.state_machine = FighterStateMachine(enemy, self.physics_engine, self.scene['enemy_bullets'], self.player_sprite, self.scene['rocks'])
+        self.share_ai_services(enemy.state_machine)
+
     def spawn_enemy(self):
         """Create an enemy and add it to the enemy list AND the physics engine"""
-
-        enemy = Fighter(
-            random.randint(
+        self.add_fighter(
+            streams.world.randint(
                 int(self.player_sprite.center_x + WIDTH), 
                 int(self.player_sprite.center_x + 4 * WIDTH)
             ), 
-            random.randint(0, HEIGHT),
-            level=random.randint(3, 10)
+            streams.world.randint(0, HEIGHT),
+            level=streams.world.randint(3, 10)
         )
+
+    def add_fighter(self, x, y, level):
+        """Add a fighter at x, y. It joins the enemy list at the next entities.flush()"""
+        enemy = Fighter(x, y, level=level)
         # Add the sprite to the physics engine including specifying the collision type
         self.physics_engine.add_sprite(
                 enemy, 
@@ -125,90 +285,141 @@ class TestGame(arcade.Window):
                 moment_of_inertia=100, 
                 damping=0.9
         )
-        self.scene['enemies'].append(enemy)
+        entities.spawn(enemy, self.scene['enemies'])
+        self.regions.register(enemy)
+        self.ai_lod.register(enemy)
+        return enemy
+
+    def add_bee(self, swarm, x, y, level):
+        """Add a bee to swarm at x, y. It joins the enemy list at the next entities.flush()"""
+        bee = swarm.add_bee(x, y, level, self.physics_engine, self.player_sprite, self.scene)
+        self.share_ai_services(bee.state_machine)
+        self.regions.register(bee)
+        self.ai_lod.register(bee)
+        return bee
 
     def make_rocks(self):
-        """make 500 random rocks, add them to the sprite lists and the physics_engine"""
-        for _ in range(500): # This literal too, should be a constant
-            rock_choice = random.choice(ROCK_CHOICES)
-            size = 0.5 + random.random() * (1 + ROCK_CHOICES.index(rock_choice)//2)
-            rock = arcade.Sprite(
-                f":resources:images/space_shooter/{rock_choice}",
-                size,
-                center_x=random.randint(-WIDTH*2, WIDTH*50),
-                center_y=random.randint(-HEIGHT*2, HEIGHT*2),
-            )
-            change_x = random.randint(-ROCK_SPEED, ROCK_SPEED)
-            change_y = random.randint(-ROCK_SPEED, ROCK_SPEED)
-            self.scene["rocks"].append(rock)
-
-            # Add the rock to the physics engine. 
-            # The mass is proportional to the size cubed
-            # To give the impression of correctly scaling the mass in 3D
-            # Collision type sets this as a rock with the physics_engine
-            # and makes the collisions correct
-            # Body_type dynamic ensures the rock has correct physics for movin bodies
-            # setting the velocity just below 1 means rocks wont incorectly bounce off
-            # each other with MORE speed than when they entered
-            self.physics_engine.add_sprite(
-                rock, 
-                mass=5*size**3, 
-                collision_type='rock', 
-                body_type=arcade.PymunkPhysicsEngine.DYNAMIC, 
-                elasticity=0.98
-            )
-            # Set the initial speed of the rock
-            self.physics_engine.set_velocity(rock, (change_x, change_y))
-
-    def wrap_y_axis_for_rocks(self, rock):
-        """If the rock if above or below the screen, wrap it to the top/bottom"""
-
-        # get the physics_body of the rock from the engine.
-        # This is to allow easy access to things like its position and other physical properties
-        rock_physics_body = self.physics_engine.get_physics_object(rock).body
-        if not rock_physics_body: # Type guard
-            return
-        if rock_physics_body.position.y < -rock.height:
-            rock_physics_body.position = (rock_physics_body.position.x, HEIGHT + rock.height)
-        if rock_physics_body.position.y > HEIGHT + rock.height:
-            rock_physics_body.position = (rock_physics_body.position.x, -rock.height)
+        """Make the asteroid field around where the view starts. More is made as the view moves, see AsteroidField"""
+        self.asteroid_field.update(self.player_sprite.center_x + WIDTH / 4)
+
+    def add_rock(self, texture_index, size, x, y, change_x=0, change_y=0):
+        """Add one rock using ROCK_CHOICES[texture_index] to the rock list and the physics engine"""
+        return self.asteroid_field.add(texture_index, size, x, y, change_x, change_y)
 
     def on_draw(self):
+        with self.profiler.section("draw"):
+            self.draw_frame()
+        # drawn outside the "draw" section so it doesn't time itself
+        self.gui_camera.use()
+        self.profiler_overlay.draw()
+
+    def draw_frame(self):
+        profiler = self.profiler
         self.clear()
         self.camera.use()
-        self.scene.draw()
-        # Draw health bars
-        for enemy in self.scene['enemies']:
-            arcade.draw_xywh_rectangle_filled(enemy.center_x-10, enemy.center_y + 60, 80, 8, arcade.color.RED)
-            arcade.draw_xywh_rectangle_filled(
-                    enemy.center_x-10, 
-                    enemy.center_y + 60, 
-                    80 * enemy.health / enemy.max_health, 
-                    8, 
-                    arcade.color.GREEN
-            )
-            # arcade.draw_text(enemy.state_machine.state, enemy.center_x - 30, enemy.center_y - 60, font_size=20)
-
-            for activity in enemy.state_machine.state.activities:
-                try:
-                    activity.front_detector.draw()
-                    activity.right_detector.draw()
-                    activity.left_detector.draw()
-                except:
-                    continue
+        if self.cull_drawing:
+            self.update_visibility()
+            with profiler.section("scene draw"):
+                self.culler.draw()
+        else:
+            with profiler.section("scene draw"):
+                self.scene.draw()
+        with profiler.section("health bars draw"):
+            self.health_bars.draw()
+        with profiler.section("damage numbers draw"):
+            damage_numbers.draw()
+        if self.debug_overlay.visible:
+            with profiler.section("debug draw"):
+                self.debug_overlay.draw(self.culler.visible('enemies') if self.cull_drawing else self.scene['enemies'])
         self.gui_camera.use()
-        self.level_text.draw()
-        arcade.draw_xywh_rectangle_outline(100, HEIGHT - 50, 200, 30, (51, 51, 51), 2)
-        exp_bar_width = (self.player_sprite.experience / self.player_sprite.next_level_at) * 200
-        arcade.draw_xywh_rectangle_filled(100, HEIGHT - 50, exp_bar_width, 30, (151, 151, 251))
+        with profiler.section("hud draw"):
+            self.level_text.draw()
+            self.experience_bar.draw()
+
+    def view_rect(self):
+        """(left, bottom, right, top) of what the camera shows. It is a quarter of a screen ahead of the player"""
+        left = self.player_sprite.center_x - WIDTH / 4
+        return left, 0, left + WIDTH, HEIGHT
+
+    def update_visibility(self):
+        """Work out which sprites are on screen for the next draw"""
+        with self.profiler.section("culling"):
+            self.culler.update(self.snapshot, *self.view_rect())
+
+    def start_recording(self, path: str) -> None:
+        """Start the level again, writing every tick's input to path. See replay.py"""
+        self.replay = None
+        self.recorder = InputRecorder(path, self)
+        self.setup()
+
+    def stop_recording(self) -> None:
+        if self.recorder is not None:
+            self.recorder.close(world_checksum(self))
+            self.recorder = None
+
+    def start_replay(self, replay: InputReplay) -> None:
+        """Build the recorded level and play its input from the next tick on"""
+        self.stop_recording()
+        self.replay = replay
+        replay.configure(self)
+        self.setup()
+
+    def checkpoint(self) -> WorldState:
+        """Save the whole world as it is now. Put it back with restore()"""
+        from world_state import WorldState
+        return WorldState.capture(self)
+
+    def restore(self, state: WorldState) -> None:
+        """Put the world back to a checkpoint, reusing the sprites and bodies there are now"""
+        from world_state import restore
+        # what happens after this isn't what a replay of the recording would do
+        self.stop_recording()
+        restore(self, state)
+        # rocks were moved to wherever they were, not where their chunks are
+        self.asteroid_field.resync(self.player_sprite.center_x + WIDTH / 4)
+        self.snapshot.capture(self.physics_engine)
+        self.fire_requests = 0
+        self.aim_angle = None
+        self.input = InputFrame()
+
+    def reset_level(self) -> None:
+        """Go back to how the level was just after setup()"""
+        self.restore(self.level_start)
+
+    def read_input(self):
+        """Take this tick's input from the replay, or from the input handlers and record it
+
+        Input handlers only note what happened. It all happens here, at the
+        same point in every tick, so that a replay runs the same simulation.
+        """
+        if self.replay is not None:
+            frame = self.replay.next_frame()
+            self.w_pressed = frame.pressed(KEY_W)
+            self.a_pressed = frame.pressed(KEY_A)
+            self.s_pressed = frame.pressed(KEY_S)
+            self.d_pressed = frame.pressed(KEY_D)
+            self.torque_left = frame.pressed(TORQUE_LEFT)
+            self.torque_right = frame.pressed(TORQUE_RIGHT)
+        else:
+            frame = InputFrame.sample(self)
+            self.fire_requests = 0
+            self.aim_angle = None
+            if self.recorder is not None:
+                self.recorder.write(frame)
+        self.input = frame
+
+        for _ in range(frame.fires):
+            self.handle_sprite_fire(self.player_sprite)
+        if frame.aim != NO_AIM:
+            get_physics_body(self.physics_engine, self.player_sprite).angle = frame.aim_angle
 
     def handle_player_movement(self):
         # .apply_force_at_world_point() applies a force irrespective of a 
         # sprites rotation. If rotation is import (think applying a thruster)
         # use .apply_force_at_local_point()
         self.player_sprite.physics_body.apply_force_at_world_point((
-                self.acc_x * PLAYER_ACCELERATION, 
-                self.acc_y * PLAYER_ACCELERATION 
+                self.input.acc_x * PLAYER_ACCELERATION, 
+                self.input.acc_y * PLAYER_ACCELERATION 
             ), 
             self.player_sprite.physics_body.position
         )
@@ -219,34 +430,200 @@ class TestGame(arcade.Window):
         if self.torque_right:
             self.player_sprite.rotate_right()
 
+    def update_spatial_index(self):
+        """Put this frame's rocks, fighters and bees into the spatial index"""
+        index = self.spatial_index
+        index.clear()
+        index.insert_all('rocks', self.scene['rocks'])
+        for enemy in self.scene['enemies']:
+            index.insert('bees' if isinstance(enemy, Bee) else 'fighters', enemy)
+
+    def update_enemies(self):
+        """Run the state machines of the enemies due an update"""
+        # swarms work out their centre and neighbours once for all their bees
+        for swarm in self.swarms:
+            swarm.update()
+        # the view is centred a quarter of a screen ahead of the player
+        self.ai_lod.update(self.player_sprite.center_x + WIDTH / 4, self.update_enemy)
+
+    def remove_killed_enemies(self):
+        """Drop experience for and replace every enemy the last hits killed
+
+        Only the enemies hit_queue.resolve() saw die are looked at, so this
+        costs nothing however many enemies there are when nothing died.
+        """
+        for enemy in hit_queue.killed:
+            with self.profiler.section("orb spawning"):
+                orbs = enemy.drop_experience()
+                for orb in orbs:
+                    projectile_pool.launch(orb, self.scene['orbs'], self.physics_engine)
+            self.regions.forget(enemy)
+            entities.despawn(enemy)
+            self.spawn_enemy()
+        hit_queue.killed.clear()
+
+    def set_ai_workers(self, workers):
+        """Work out swarming bees' steering in this many worker processes, 0 for none"""
+        self.parallel_ai.set_workers(workers)
+
+    def update_enemy(self, enemy):
+        # swarming bees are steered together in parallel_ai.run()
+        if self.parallel_ai.claim(enemy):
+            return
+        profiler = self.profiler
+        if profiler.enabled:
+            # time each enemy against the state it started the update in
+            state_name = type(enemy.state_machine.state).__name__
+            start = perf_counter()
+            enemy.state_machine.update()
+            profiler.add(f"state: {state_name}", perf_counter() - start)
+        else:
+            enemy.state_machine.update()
+
     def on_update(self, delta_time):
-        self.physics_engine.step()
-        self.physics_engine.resync_sprites()
-        self.handle_player_movement()
-        self.scene.update()
+        """Run as many fixed ticks as delta_time covers, then update what is drawn"""
+        # on_update starts a new frame, so the last one (and its draw) is done
+        self.profiler.end_frame()
+        with self.profiler.section("update"):
+            self.update_frame(delta_time)
+
+    def update_frame(self, delta_time):
+        self.accumulator += delta_time
+        steps = 0
+        while self.accumulator >= FIXED_TIMESTEP:
+            if steps == MAX_CATCH_UP_STEPS:
+                # We can't keep up. Drop the time rather than running ever
+                # more ticks each frame and falling further behind
+                self.accumulator %= FIXED_TIMESTEP
+                break
+            self.fixed_update(FIXED_TIMESTEP)
+            self.accumulator -= FIXED_TIMESTEP
+            steps += 1
+
+        profiler = self.profiler
+        if self.interpolate_rendering:
+            with profiler.section("interpolation"):
+                self.interpolate(self.accumulator / FIXED_TIMESTEP)
+        left, bottom, _, _ = self.view_rect()
+        self.camera.move_to((left, bottom))
+        with profiler.section("hud"):
+            self.update_hud()
+        with profiler.section("damage numbers"):
+            damage_numbers.update(delta_time)
+
+    def fixed_update(self, delta_time):
+        """Advance the game by one tick of delta_time seconds"""
+        profiler = self.profiler
+        if self.interpolate_rendering:
+            with profiler.section("interpolation"):
+                self.store_previous_positions()
+        # step() resyncs by default, so turn that off and do it once here
+        with profiler.section("physics step"):
+            self.step_physics(delta_time)
+        # the collision handlers only queue up hits, deal with them all now
+        with profiler.section("hits"):
+            hit_queue.resolve()
+            self.remove_killed_enemies()
+        with profiler.section("resync"):
+            self.physics_engine.resync_sprites()
+        with profiler.section("player movement"):
+            # after the resync, so firing starts from where the player really is
+            self.read_input()
+            self.handle_player_movement()
+        with profiler.section("scene.update"):
+            self.scene.update()
         if any([self.a_pressed, self.s_pressed, self.d_pressed, self.w_pressed]):
             self.player_sprite.texture = self.player_sprite.move_texture
         else:
             self.player_sprite.texture = self.player_sprite.idle_texture
 
-        # Fighters to seek the player
-        for enemy in self.scene['enemies']:
-            enemy.state_machine.update()
-            if enemy.health <= 0:
-                orbs = enemy.drop_experience()
-                for orb in orbs:
-                    self.scene['orbs'].append(orb)
-                    self.physics_engine.add_sprite(orb, collision_type=orb.collision_type, max_velocity=orb.max_velocity, moment_of_inertia=orb.moment_of_inertia, mass=orb.mass, damping=0.99)
-                    self.physics_engine.set_velocity(orb, (orb.change_x, orb.change_y))
-                enemy.kill()
-                self.spawn_enemy()
-
-        # reposition rocks if they drift outside of the y axis
-        for rock in self.scene['rocks']:
-            self.wrap_y_axis_for_rocks(rock)
+        self.scheduler.advance()
+        with profiler.section("snapshot"):
+            self.snapshot.capture(self.physics_engine)
+        with profiler.section("wrapping"):
+            self.wrapping.update(self.snapshot)
 
-        self.camera.move_to((self.player_sprite.center_x - WIDTH/4, 0))
-        self.level_text.text = self.player_sprite.level
+        # Fighters to seek the player
+        if self.tick % self.ai_tick_interval == 0:
+            with profiler.section("spatial index"):
+                self.update_spatial_index()
+            with profiler.section("enemy AI"):
+                self.update_enemies()
+            if self.parallel_ai.enabled:
+                with profiler.section("parallel ai"):
+                    self.parallel_ai.run(self.player_sprite)
+            with profiler.section("transitions"):
+                self.scheduler.dispatch()
+            if self.steering is not None:
+                with profiler.section("steering"):
+                    self.steering.solve()
+        elif self.steering is not None:
+            # between AI ticks keep pushing with the last forces, as
+            # Enemy.pymunk_moved does with held_force on the Vec2 path
+            with profiler.section("steering"):
+                self.steering.apply_held()
+        # everything spawned and despawned this tick joins or leaves its lists together
+        with profiler.section("entities"):
+            entities.flush()
+        # the view is centred a quarter of a screen ahead of the player
+        with profiler.section("regions"):
+            self.regions.update(self.player_sprite.center_x + WIDTH / 4)
+        with profiler.section("asteroid field"):
+            self.asteroid_field.update(self.player_sprite.center_x + WIDTH / 4)
+        self.tick += 1
+
+    def step_physics(self, delta_time):
+        """Step the physics physics_substeps times, pushing every body with this tick's forces all the way
+
+        pymunk zeroes each body's force and torque after a step, so without
+        putting them back only the first substep would get any thrust or steering.
+        """
+        substeps = self.physics_substeps
+        held = []
+        if substeps > 1:
+            held = [
+                (body, body.force, body.torque)
+                for body in self.physics_engine.space.bodies
+                if body.force != (0, 0) or body.torque
+            ]
+        for substep in range(substeps):
+            if substep:
+                for body, force, torque in held:
+                    body.force = force
+                    body.torque = torque
+            self.physics_engine.step(delta_time / substeps, resync_sprites=False)
+
+    def store_previous_positions(self):
+        """Remember where every body is before a tick, for interpolate()"""
+        self.previous_positions = [
+            (sprite, physics_object.body, physics_object.body.position)
+            for sprite, physics_object in self.physics_engine.sprites.items()
+        ]
+
+    def interpolate(self, alpha):
+        """Draw sprites alpha of the way from their previous to their current tick
+
+        This is only for drawing. The next tick resyncs every sprite to its body.
+        """
+        if alpha <= 0:
+            return
+        for sprite, body, (previous_x, previous_y) in self.previous_positions:
+            x, y = body.position
+            dx = x - previous_x
+            dy = y - previous_y
+            # wrapped round or just fired, jump straight there
+            if abs(dx) > INTERPOLATION_SNAP or abs(dy) > INTERPOLATION_SNAP:
+                continue
+            sprite.position = (previous_x + dx * alpha, previous_y + dy * alpha)
+
+    def update_hud(self):
+        """Bring the health bars, experience bar and level text up to date"""
+        self.health_bars.update(self.scene['enemies'])
+        self.experience_bar.update(self.player_sprite)
+        # laying out text is slow, only do it when the level changes
+        if self.player_sprite.level != self.shown_level:
+            self.shown_level = self.player_sprite.level
+            self.level_text.text = str(self.shown_level)
 
 
     def handle_sprite_fire(self, sprite):
@@ -254,9 +631,7 @@ class TestGame(arcade.Window):
         bullets = sprite.fire()
         # TODO: Add bullet type on bullet. Distinguish player bullets with enemies??
         for bullet in bullets:
-            self.scene['player_bullets'].append(bullet)
-            self.physics_engine.add_sprite(bullet, collision_type=bullet.collision_type, max_velocity=bullet.max_velocity, moment_of_inertia=bullet.moment_of_inertia, mass=bullet.mass, damping=0.99)
-            self.physics_engine.set_velocity(bullet, (bullet.change_x, bullet.change_y))
+            projectile_pool.launch(bullet, self.scene['player_bullets'], self.physics_engine)
 
     def on_joybutton_press(self, _joystick, button):
         """
@@ -265,7 +640,7 @@ class TestGame(arcade.Window):
         and don't require event handlers here
         """
         if button == 2: 
-            self.handle_sprite_fire(self.player)
+            self.fire_requests += 1
         if button == 5:
             self.torque_left = True
         if button == 4:
@@ -288,11 +663,29 @@ class TestGame(arcade.Window):
         if symbol== arcade.key.S:
             self.s_pressed = True
         if symbol == arcade.key.SPACE:
-            self.handle_sprite_fire(self.player_sprite)
+            self.fire_requests += 1
         if symbol == arcade.key.E:
             self.torque_left = True
         if symbol == arcade.key.Q:
             self.torque_right = True
+        if symbol == arcade.key.R:
+            self.reset_level()
+        if symbol == arcade.key.F2:
+            self.debug_overlay.toggle()
+        if symbol == arcade.key.F3:
+            self.profiler_overlay.toggle()
+            self.update_profiler_enabled()
+        if symbol == arcade.key.F4:
+            if self.profiler.csv_file is None:
+                from datetime import datetime
+                self.profiler.start_csv(f"profile-{datetime.now():%Y%m%d-%H%M%S}.csv")
+            else:
+                self.profiler.stop_csv()
+            self.update_profiler_enabled()
+
+    def update_profiler_enabled(self):
+        """Only profile while something is looking at the results"""
+        self.profiler.enabled = self.profiler_overlay.visible or self.profiler.csv_file is not None
 
     def on_key_release(self, symbol: int, modifiers: int):
         if symbol== arcade.key.A:
@@ -323,7 +716,7 @@ class TestGame(arcade.Window):
             return self.w_pressed - self.s_pressed
 
     def on_mouse_press(self, x, y, button, modifiers):
-        self.handle_sprite_fire(self.player_sprite)
+        self.fire_requests += 1
 
     def on_mouse_motion(self, x, y, dx, dy):
         # point player at mouse
@@ -332,12 +725,12 @@ class TestGame(arcade.Window):
         delta_x = px - x
         delta_y = py - y
         angle = math.atan2(delta_y, delta_x)
-        self.player_sprite.physics_body.angle = angle + math.pi / 2 
+        # turned at the next tick, see read_input()
+        self.aim_angle = angle + math.pi / 2
 
 
 def main():
-    window = TestGame()
-    window.setup()
+    TestGame()
     arcade.run()
 
 if __name__ == "__main__":
@@ -1,34 +1,123 @@
 import arcade
+from typing import Dict, List, Set, Tuple
 from player import Player
-from fighter import Fighter
+from fighter import Enemy, Fighter
 from bullets import Bullet, Orb
+from pools import projectile_pool
 from swarm_of_bees import Bee
+from registry import entities
 
 """Note: All collision handlers should return True or False to signify if 
-Further processing is required"""
+Further processing is required
+
+The handlers run inside physics_engine.step(), so they only push a hit onto
+hit_queue. TestGame resolves the queue once the step is done."""
+
+# what happened in a hit, see HitQueue.resolve
+ENEMY_HIT = 0
+BULLET_BLOCKED = 1
+ORB_PICKED_UP = 2
+BEE_HIT_PLAYER = 3
+
+
+class HitQueue:
+    """Hits from one physics step, resolved together after it
+
+    Each hit is a kind and the two sprites involved, kept in three parallel lists.
+    resolve() adds up the damage for every enemy, and the experience from every
+    orb, before applying any of it. Everything that was used up is then despawned
+    through the entity registry, bullets and orbs by way of their pool, and
+    leaves its lists and the physics engine with the rest at entities.flush().
+
+    Enemies whose health the hits took to 0 or below are kept in killed,
+    so TestGame can deal with just those rather than checking every enemy.
+
+    counts keeps how many hits there have been between each pair of
+    sprite classes, e.g. ('Fighter', 'BlueLaser'), for profiling.
+    """
+    def __init__(self) -> None:
+        self.kinds: List[int] = []
+        self.firsts: List[arcade.Sprite] = []
+        self.seconds: List[arcade.Sprite] = []
+        self.killed: List[Enemy] = []
+        self.counts: Dict[Tuple[str, str], int] = {}
+
+    def push(self, kind: int, first: arcade.Sprite, second: arcade.Sprite) -> None:
+        self.kinds.append(kind)
+        self.firsts.append(first)
+        self.seconds.append(second)
+        pair = (type(first).__name__, type(second).__name__)
+        self.counts[pair] = self.counts.get(pair, 0) + 1
+
+    def clear(self) -> None:
+        self.kinds.clear()
+        self.firsts.clear()
+        self.seconds.clear()
+        self.killed.clear()
+
+    def resolve(self) -> None:
+        """Apply every queued hit. Call after the physics step, never during it"""
+        if not self.kinds:
+            return
+        damage: Dict[Enemy, float] = {}
+        experience: Dict[Player, float] = {}
+        # a bullet, orb or bee can only be used up once, even if it hit two things.
+        # Kept in order as well so sprites go back to the pool in the same order every run
+        used: Set[arcade.Sprite] = set()
+        used_in_order: List[arcade.Sprite] = []
+        for kind, first, second in zip(self.kinds, self.firsts, self.seconds):
+            if second in used:
+                continue
+            used.add(second)
+            used_in_order.append(second)
+            if kind == ENEMY_HIT:
+                damage[first] = damage.get(first, 0.0) + first.damage_from(second.damage, second.level)
+            elif kind == ORB_PICKED_UP:
+                experience[first] = experience.get(first, 0.0) + second.exp
+        self.clear()
+
+        for enemy, amount in damage.items():
+            alive = enemy.health > 0
+            enemy.lose_health(amount)
+            if alive and enemy.health <= 0:
+                self.killed.append(enemy)
+        for player, exp in experience.items():
+            player.gain_exp(exp)
+
+        for sprite in used_in_order:
+            if getattr(sprite, 'pool', None) is not None:
+                projectile_pool.release(sprite)
+            else:
+                entities.despawn(sprite)
+
+    def report(self) -> Dict[str, int]:
+        return {f"{first}/{second}": count for (first, second), count in sorted(self.counts.items())}
+
+
+# The game's hit queue, filled by the handlers below
+hit_queue = HitQueue()
+
 
 def enemy_hit_handler(enemy: Fighter, bullet: Bullet, arbiter, space, data):
     """When the enemy is hit by a bullet, take off that bullet's damage
 
-    Kill the enemy if its health falls below 0
+    The enemy is killed in TestGame.remove_killed_enemies once its health falls below 0
     """
-    enemy.take_damage(bullet.damage, bullet.level)
-    bullet.kill()
+    hit_queue.push(ENEMY_HIT, enemy, bullet)
 
 def kill_bullet(rock: arcade.Sprite, bullet: Bullet, arbiter, space, data):
-    bullet.kill()
+    hit_queue.push(BULLET_BLOCKED, rock, bullet)
 
 def no_collision(a, b, arbiter, space, data):
     """use as a begin handler to turn off interactions between layers"""
     return False
 
 def pick_up_exp(player: Player, orb: Orb, arbiter, space, data):
-    player.gain_exp(orb.exp)
-    orb.kill()
+    hit_queue.push(ORB_PICKED_UP, player, orb)
 
     # Stop processing physics on this collision
     return False
 
 def bee_hit_handler(player: Player, bee: Bee, arbiter, space, data):
     # TODO damage player, explosion
-    bee.kill()
+    hit_queue.push(BEE_HIT_PLAYER, player, bee)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, List
+
+import arcade
+from constants import HEIGHT
+from resources import textures
+
+if TYPE_CHECKING:
+    from fighter import Enemy
+    from player import Player
+
+HEALTH_BAR_WIDTH = 80
+HEALTH_BAR_HEIGHT = 8
+# from the enemy's center to the bottom left of its bar
+HEALTH_BAR_OFFSET_X = -10
+HEALTH_BAR_OFFSET_Y = 60
+
+
+class HealthBar:
+    """The two sprites making up one enemy's bar, and what they last showed"""
+    def __init__(self, background: arcade.Sprite, foreground: arcade.Sprite) -> None:
+        self.background = background
+        self.foreground = foreground
+        self.shown = None
+
+
+class HealthBars:
+    """Every enemy's health bar, drawn from one sprite list
+
+    Each bar is a red background sprite and a green sprite on top whose width
+    is the fraction of health left. update() only moves or resizes a bar when
+    its enemy has moved or its health has changed, and adds or removes bars
+    as enemies come and go. draw() is then a single draw call for all of them.
+    """
+    def __init__(self) -> None:
+        self.sprite_list = arcade.SpriteList()
+        self.bars: Dict[Enemy, HealthBar] = {}
+
+    def update(self, enemies: List[Enemy]) -> None:
+        for enemy in enemies:
+            bar = self.bars.get(enemy)
+            if bar is None:
+                bar = self.add(enemy)
+            shown = (enemy.center_x, enemy.center_y, enemy.health)
+            if bar.shown != shown:
+                bar.shown = shown
+                left = enemy.center_x + HEALTH_BAR_OFFSET_X
+                y = enemy.center_y + HEALTH_BAR_OFFSET_Y + HEALTH_BAR_HEIGHT / 2
+                width = max(0, HEALTH_BAR_WIDTH * enemy.health / enemy.max_health)
+                bar.background.position = (left + HEALTH_BAR_WIDTH / 2, y)
+                bar.foreground.width = width
+                bar.foreground.position = (left + width / 2, y)
+
+        if len(self.bars) > len(enemies):
+            # killed enemies are no longer in any sprite list
+            for enemy in [enemy for enemy in self.bars if not enemy.sprite_lists]:
+                self.remove(enemy)
+
+    def add(self, enemy: Enemy) -> HealthBar:
+        bar = HealthBar(
+            arcade.Sprite(texture=textures.solid(HEALTH_BAR_WIDTH, HEALTH_BAR_HEIGHT, arcade.color.RED)),
+            arcade.Sprite(texture=textures.solid(HEALTH_BAR_WIDTH, HEALTH_BAR_HEIGHT, arcade.color.GREEN)),
+        )
+        self.sprite_list.append(bar.background)
+        self.sprite_list.append(bar.foreground)
+        self.bars[enemy] = bar
+        return bar
+
+    def remove(self, enemy: Enemy) -> None:
+        bar = self.bars.pop(enemy)
+        bar.background.remove_from_sprite_lists()
+        bar.foreground.remove_from_sprite_lists()
+
+    def draw(self) -> None:
+        self.sprite_list.draw()
+
+
+class ExperienceBar:
+    """The player's experience bar. The outline never changes so it is
+    built once, and the fill is a sprite that is only resized when the
+    player's experience changes"""
+    def __init__(self, left: float = 100, bottom: float = HEIGHT - 50, width: int = 200, height: int = 30) -> None:
+        self.left = left
+        self.width = width
+        self.outline = arcade.ShapeElementList()
+        self.outline.append(arcade.create_rectangle_outline(left + width / 2, bottom + height / 2, width, height, (51, 51, 51), 2))
+        self.fill = arcade.Sprite(texture=textures.solid(width, height, (151, 151, 251)), center_y=bottom + height / 2)
+        self.sprite_list = arcade.SpriteList()
+        self.sprite_list.append(self.fill)
+        self.fill.width = 0
+        self.shown = None
+
+    def update(self, player: Player) -> None:
+        shown = (player.experience, player.next_level_at)
+        if shown == self.shown:
+            return
+        self.shown = shown
+        width = min(self.width, max(0, player.experience / player.next_level_at * self.width))
+        self.fill.width = width
+        self.fill.center_x = self.left + width / 2
+
+    def draw(self) -> None:
+        self.outline.draw()
+        self.sprite_list.draw()
@@ -1,9 +1,40 @@
-import arcade
-from game_view import TestGame
+from time import perf_counter
+
+# before anything else is imported, so startup times include importing the game
+STARTED = perf_counter()
+
+import argparse
 
 def main():
-    window = TestGame()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--record", help="record the session's input to this file, play it back with benchmark.py --replay")
+    parser.add_argument("--ai-workers", type=int, default=0, help="work out swarming bees' steering in this many worker processes")
+    parser.add_argument("--startup-report", help="write how long startup took to this file as json and quit once the level is playable, see benchmark.py --startup")
+    args = parser.parse_args()
+
+    # the game is only imported once the arguments are known to be good
+    import arcade
+    from functools import partial
+    from game_view import TestGame
+    from startup import LoadingView, StartupPipeline
+
+    window = TestGame(build=False)
+    if args.ai_workers:
+        window.set_ai_workers(args.ai_workers)
+    # recording sets the level up itself, so it is only built the once either way
+    build = partial(window.start_recording, args.record) if args.record else window.setup
+    pipeline = StartupPipeline(build, STARTED)
+
+    def on_ready():
+        if args.startup_report:
+            pipeline.write_report(args.startup_report)
+            arcade.exit()
+
+    window.show_view(LoadingView(pipeline, on_ready))
     arcade.run()
+    # fills in the checksum the replay is checked against
+    window.stop_recording()
+    window.parallel_ai.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,174 @@
+"""Running swarming bees' steering in worker processes
+
+A bee in its swarm state only reads where it, the player and the other bees
+in its swarm are, and only writes a steering force, so its update can run
+anywhere given a copy of those positions. ParallelSwarmAI takes those bees
+out of the normal update, writes what they read into shared memory and has
+a pool of processes work out their forces, see swarm_worker.py. The main
+process keeps the physics engine to itself and applies the forces through
+the SteeringBatch.
+
+Everything else, fighters, bees waiting to be pulled and every transition,
+still runs in the main process as before.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from activities import PointInDirectionOfTravelActivity
+from constants import AI_PARALLEL_MIN_BATCH, AI_WORKERS
+from registry import entities
+
+if TYPE_CHECKING:
+    from multiprocessing import shared_memory
+    from player import Player
+    from steering import SteeringBatch
+    from swarm_of_bees import Bee, Swarm
+
+
+class ParallelSwarmAI:
+    """Works out the steering of swarming bees in a pool of worker processes
+
+    TestGame.update_enemy() offers every enemy to claim() first. Bees in
+    their swarm state are claimed: they point the way they are going there
+    and then, and their steering waits for run(), which the game calls
+    after the enemy AI. run() splits the claimed bees between the main
+    process and the workers, and hands each bee's force to the SteeringBatch
+    with add_solved().
+
+    The forces match the single process ones exactly, so switching it on
+    doesn't change a replay. It only pays once there are enough bees to
+    outweigh passing them between processes, see benchmark.py --parallel.
+
+    Args:
+        workers: how many worker processes, 0 turns it off
+
+        min_batch: with fewer claimed bees than this, run() works them out
+            in the main process rather than waking the workers
+    """
+    def __init__(self, workers: int = AI_WORKERS, min_batch: int = AI_PARALLEL_MIN_BATCH) -> None:
+        self.workers = 0
+        self.min_batch = min_batch
+        self.pool = None
+        self.block: Optional[shared_memory.SharedMemory] = None
+        self.steering: Optional[SteeringBatch] = None
+        self.due: List[Bee] = []
+        self.point = PointInDirectionOfTravelActivity()
+        self.set_workers(workers)
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def set_workers(self, workers: int) -> None:
+        """Start a pool of workers worker processes, replacing any there were. 0 stops them"""
+        self.close()
+        if workers > 0:
+            # numpy only comes in once there are workers to use it
+            from steering import steering_available
+            if not steering_available():
+                # the workers use the same numpy maths as the SteeringBatch
+                workers = 0
+        self.workers = workers
+        if workers > 0:
+            # only imported when there are workers, it is slow to import and
+            # the game doesn't need it to start
+            import multiprocessing
+            self.pool = multiprocessing.Pool(workers)
+
+    def claim(self, enemy) -> bool:
+        """Take over enemy's update for this tick if it is a swarming bee"""
+        if not self.enabled:
+            return False
+        state_machine = enemy.state_machine
+        if state_machine.steering is None:
+            return False
+        graph = state_machine.state_graph()
+        if graph is None or getattr(graph, 'swarm', None) is not state_machine.state:
+            return False
+        # not in the grid Swarm.update() made, e.g. killed this tick
+        if entities.get(enemy.handle) is not enemy:
+            return False
+        self.steering = state_machine.steering
+        self.point.execute(state_machine)
+        self.due.append(enemy)
+        return True
+
+    def run(self, player: Player) -> None:
+        """Work out the steering of every bee claimed since the last run()"""
+        due = self.due
+        if not due:
+            return
+        from swarm_worker import block_size, solve_in_worker, solve_rows, tables
+        steering = self.steering
+        swarm_index: Dict[Swarm, int] = {}
+        swarms: List[Swarm] = []
+        for bee in due:
+            if bee.swarm not in swarm_index:
+                swarm_index[bee.swarm] = len(swarms)
+                swarms.append(bee.swarm)
+        grid_count = sum(len(swarm.bees) for swarm in swarms)
+        buffer = self._buffer(block_size(len(swarms), grid_count, len(due)))
+        header, swarm_table, grid, due_table, forces = tables(buffer, len(swarms), grid_count, len(due))
+        header[:] = (len(swarms), grid_count, len(due), player.center_x, player.center_y, steering.limit_forces)
+
+        # each bee's row in the grid table
+        grid_rows: Dict[Bee, int] = {}
+        swarm_values = []
+        grid_values = []
+        for swarm in swarms:
+            swarm_values.append((swarm.centre[0], swarm.centre[1], swarm.separation_range, len(grid_values), len(swarm.bees)))
+            for bee in swarm.bees:
+                grid_rows[bee] = len(grid_values)
+                grid_values.append((bee.center_x, bee.center_y))
+        swarm_table[:] = swarm_values
+        grid[:] = grid_values
+
+        bodies = []
+        due_values = []
+        for bee in due:
+            body, x, y, vx, vy = steering.kinematics(bee)
+            bodies.append(body)
+            due_values.append((x, y, vx, vy, bee.max_speed, bee.max_force, grid_rows[bee], swarm_index[bee.swarm]))
+        due_table[:] = due_values
+
+        count = len(due)
+        if count < self.min_batch:
+            solve_rows(buffer, 0, count)
+        else:
+            # the main process takes the first share rather than waiting
+            shares = self.workers + 1
+            bounds = [count * share // shares for share in range(shares + 1)]
+            jobs = [(self.block.name, bounds[share], bounds[share + 1]) for share in range(1, shares)]
+            waiting = self.pool.map_async(solve_in_worker, jobs)
+            solve_rows(buffer, bounds[0], bounds[1])
+            waiting.get()
+
+        for bee, body, (fx, fy) in zip(due, bodies, forces.tolist()):
+            steering.add_solved(bee, body, fx, fy)
+        del header, swarm_table, grid, due_table, forces
+        due.clear()
+
+    def _buffer(self, size: int):
+        """The shared block, made bigger when it is too small for size bytes"""
+        if self.block is None or self.block.size < size:
+            from multiprocessing import shared_memory
+            self._free_block()
+            # leave room to grow so it isn't remade every tick
+            self.block = shared_memory.SharedMemory(create=True, size=max(size * 2, 4096))
+        return self.block.buf
+
+    def _free_block(self) -> None:
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+    def close(self) -> None:
+        """Stop the workers and free the shared memory"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        self._free_block()
+        self.due.clear()
+        self.workers = 0
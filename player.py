@@ -1,14 +1,17 @@
-import random
 import arcade
 from pymunk import Body
 from bullets import BlueLaser
+from damage_text import DAMAGE_NUMBER_OFFSET_Y, PLAYER_DAMAGE_COLOUR, damage_numbers
+from pools import projectile_pool
+from resources import textures
+from rng import streams
 from constants import * 
 from utils import get_physics_body
 from typing import List
 
 class Player(arcade.Sprite):
     def __init__(self, player_num:int, colour:str, x: int, y: int):
-        super().__init__(f":resources:images/space_shooter/playerShip1_{colour}.png", CHARACTER_SCAILING)
+        super().__init__(texture=textures.load(f":resources:images/space_shooter/playerShip1_{colour}.png"), scale=CHARACTER_SCAILING)
 
         # the physics body is not accessable when the sprite is first created as 
         # it needs to be registered with the physics engine after this step
@@ -19,12 +22,12 @@ class Player(arcade.Sprite):
         self.experience = 0
         self.next_level_at = 100
         self.level = 1
-        self.attack = random.randint(10, 15)
-        self.defence = random.randint(10, 35)
-        self.max_health = random.randint(15, 55)
+        self.attack = streams.player.randint(10, 15)
+        self.defence = streams.player.randint(10, 35)
+        self.max_health = streams.player.randint(15, 55)
         self.health = self.max_health
-        self.idle_texture = arcade.load_texture('assets/images/player/player-off.png')
-        self.move_texture = arcade.load_texture('assets/images/player/player-on.png')
+        self.idle_texture = textures.load('assets/images/player/player-off.png')
+        self.move_texture = textures.load('assets/images/player/player-on.png')
 
         try:# This is a holder for implementing multiple players in the future
             self.joystick = arcade.get_joysticks()[player_num]
@@ -40,12 +43,9 @@ class Player(arcade.Sprite):
         This function automatically runs when the physics engine moves the sprite
         The arguments need to be as they are here and dx represents delta_x i.e the change in x
         """
-        self.physics_body = get_physics_body(physics_engine, self)
+        if self.physics_body is None:
+            self.physics_body = get_physics_body(physics_engine, self)
         self.physics_body.angular_velocity *= 0.95
-        if self.physics_body.position.y < -self.height:
-            self.physics_body.position = (self.physics_body.position.x, HEIGHT + self.height)
-        if self.physics_body.position.y > HEIGHT + self.height:
-            self.physics_body.position = (self.physics_body.position.x, -self.height)
 
     def rotate_right(self):
         self.physics_body.angular_velocity += 0.6
@@ -55,11 +55,10 @@ class Player(arcade.Sprite):
 
     def fire(self) -> List[arcade.Sprite]:
         """Makes a bullet and returns it to be added to a spritelist elsewhere"""
-        bullet = self.weapon_type(center_x=self.center_x, center_y=self.center_y, angle=-self.angle + 90, damage=self.attack, level=self.level)
+        bullet = projectile_pool.acquire(self.weapon_type, center_x=self.center_x, center_y=self.center_y, angle=-self.angle + 90, damage=self.attack, level=self.level)
         return [bullet]
 
     def gain_exp(self, exp):
-        print(self.experience)
         self.experience += exp
         if self.experience >= self.next_level_at:
             self.level_up()
@@ -68,18 +67,18 @@ class Player(arcade.Sprite):
         self.level += 1
         self.experience = self.experience - self.next_level_at
         self.next_level_at = (self.level + 1) ** 3
-        self.attack += random.randint(0, 3)
-        self.defence += random.randint(0, 3)
-        self.max_health += random.randint(0, 5)
-        self.health = max_health
-        self.stat_points = random.randint(3, 7)
-        print(self.level, self.attack)
+        self.attack += streams.player.randint(0, 3)
+        self.defence += streams.player.randint(0, 3)
+        self.max_health += streams.player.randint(0, 5)
+        self.health = self.max_health
+        self.stat_points = streams.player.randint(3, 7)
         if self.experience >= self.next_level_at:
             self.level_up()
 
 
     def take_damage(self, damage):
         """Loosely based on the Pokemon damage calculation"""
-        res = (((2 * self.level+2)*(damage/self.defence))/100) * random.randint(75, 100)
+        res = (((2 * self.level+2)*(damage/self.defence))/100) * streams.combat.randint(75, 100)
         self.health -= res
+        damage_numbers.add(self.center_x, self.center_y + DAMAGE_NUMBER_OFFSET_Y, res, PLAYER_DAMAGE_COLOUR)
 
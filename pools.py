@@ -0,0 +1,150 @@
+from __future__ import annotations
+import math
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple, Type
+
+import arcade
+from registry import entities
+
+if TYPE_CHECKING:
+    from bullets import Bullet
+
+
+class PoolStats:
+    """Counters for one class of projectile
+
+    hits: acquires that reused a pooled sprite
+    misses: acquires that had to make a new sprite
+    live: sprites handed out and not yet killed
+    high_water: the most sprites that have been live at once
+    """
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.live = 0
+        self.high_water = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "live": self.live, "high_water": self.high_water}
+
+
+class ProjectilePool:
+    """Recycles bullets and orbs, along with their pymunk bodies
+
+    Making a Bullet loads its texture and hit box, and adding it to the physics
+    engine makes a new body and shape. Rapid fire does that many times a
+    second, so instead sprites are handed out by acquire() and come back here
+    when they are killed, either by a hit or by running out of lifespan.
+
+    A sprite killed while in a physics engine keeps its body and shape, and
+    launch() puts them straight back in the space next time it is fired.
+
+    Sprites come and go through the entity registry. A killed sprite only
+    goes back on the free list once the registry has taken it out of its
+    list, so it can't be handed out again while it is still there.
+
+    Useage:
+        bullet = projectile_pool.acquire(RedLaser, x, y, angle, damage, level)
+        projectile_pool.launch(bullet, bullet_list, physics_engine)
+    """
+    def __init__(self) -> None:
+        self.free: Dict[Type[Bullet], List[Bullet]] = {}
+        self.stats: Dict[Type[Bullet], PoolStats] = {}
+        # physics objects kept from when a sprite was last killed
+        self.physics_objects: Dict[Bullet, Tuple[arcade.PymunkPhysicsEngine, object]] = {}
+
+    def clear(self) -> None:
+        """Forget every pooled sprite. Use when the physics engine is replaced"""
+        self.free.clear()
+        self.stats.clear()
+        self.physics_objects.clear()
+
+    def _stats(self, cls: Type[Bullet]) -> PoolStats:
+        stats = self.stats.get(cls)
+        if stats is None:
+            stats = self.stats[cls] = PoolStats()
+        return stats
+
+    def preallocate(self, cls: Type[Bullet], count: int) -> None:
+        """Make count sprites of cls up front so firing never has to"""
+        free = self.free.setdefault(cls, [])
+        self._stats(cls)
+        for _ in range(count):
+            bullet = cls(0, 0, 0)
+            bullet.pool = self
+            bullet.in_pool = True
+            free.append(bullet)
+
+    def acquire(self, cls: Type[Bullet], *args, **kwargs) -> Bullet:
+        """Get a cls made with these arguments, reusing a pooled one if there is one"""
+        stats = self._stats(cls)
+        free = self.free.get(cls)
+        if free:
+            bullet = free.pop()
+            bullet.reset(*args, **kwargs)
+            stats.hits += 1
+        else:
+            bullet = cls(*args, **kwargs)
+            bullet.pool = self
+            stats.misses += 1
+        bullet.in_pool = False
+        stats.live += 1
+        stats.high_water = max(stats.high_water, stats.live)
+        return bullet
+
+    def launch(self, bullet: Bullet, sprite_list: arcade.SpriteList, physics_engine: arcade.PymunkPhysicsEngine) -> None:
+        """Add an acquired bullet to a sprite list and the physics engine, and set it moving
+
+        The bullet joins sprite_list at the next entities.flush()
+        """
+        entities.spawn(bullet, sprite_list)
+        engine, physics_object = self.physics_objects.pop(bullet, (None, None))
+        if engine is not physics_engine:
+            physics_engine.add_sprite(
+                bullet,
+                collision_type=bullet.collision_type,
+                max_velocity=bullet.max_velocity,
+                moment_of_inertia=bullet.moment_of_inertia,
+                mass=bullet.mass,
+                damping=0.99
+            )
+            physics_engine.set_velocity(bullet, (bullet.change_x, bullet.change_y))
+            return
+
+        # put the old body and shape back rather than making new ones
+        body = physics_object.body
+        body.position = (bullet.center_x, bullet.center_y)
+        body.angle = math.radians(bullet.angle)
+        body.velocity = (bullet.change_x, bullet.change_y)
+        body.angular_velocity = 0
+        body.force = (0, 0)
+        physics_engine.space.add(body, physics_object.shape)
+        physics_engine.sprites[bullet] = physics_object
+        physics_engine.non_static_sprite_list.append(bullet)
+        bullet.register_physics_engine(physics_engine)
+
+    def release(self, bullet: Bullet) -> None:
+        """Take a killed bullet back. Called by Bullet.kill()"""
+        if bullet.in_pool:
+            # killed twice in one frame, e.g. a hit and lifespan running out
+            return
+        bullet.in_pool = True
+        for engine in bullet.physics_engines:
+            self.physics_objects[bullet] = (engine, engine.get_physics_object(bullet))
+        self._stats(type(bullet)).live -= 1
+        entities.despawn(bullet, self._returned)
+
+    def release_all(self, bullets: Iterable[Bullet]) -> None:
+        """Take back a batch of bullets. They leave their lists and engines together at the next entities.flush()"""
+        for bullet in bullets:
+            self.release(bullet)
+
+    def _returned(self, bullet: Bullet) -> None:
+        """The registry has removed bullet, it can be handed out again"""
+        self.free.setdefault(type(bullet), []).append(bullet)
+
+    def report(self) -> Dict[str, Dict[str, int]]:
+        return {cls.__name__: stats.as_dict() for cls, stats in self.stats.items()}
+
+
+# The game's pool. Anything that fires should get its bullets from here
+projectile_pool = ProjectilePool()
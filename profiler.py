@@ -0,0 +1,154 @@
+from __future__ import annotations
+import csv
+from collections import deque
+from time import perf_counter
+from typing import Deque, Dict, List, Optional
+
+import arcade
+from constants import HEIGHT
+
+
+class _NullSection:
+    """What section() hands out when profiling is off. Does nothing"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+NULL_SECTION = _NullSection()
+
+
+class _Section:
+    def __init__(self, profiler: FrameProfiler, name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.profiler.add(self.name, perf_counter() - self.start)
+
+
+class FrameProfiler:
+    """Times each part of a frame and keeps recent timings for percentiles
+
+    Wrap the code to time in `with profiler.section("name"):`. Time is summed
+    per name until end_frame(), which stores one sample per name and writes
+    them to the csv file if one is open.
+
+    While disabled section() returns a shared object that does nothing, and
+    code with its own loops should check profiler.enabled first, so leaving
+    the profiler in costs (next to) nothing.
+
+    Args:
+        window: how many frames of samples to keep per section, None keeps everything
+    """
+    def __init__(self, window: Optional[int] = 300) -> None:
+        self.enabled = False
+        self.window = window
+        self.samples: Dict[str, Deque[float]] = {}
+        self.current: Dict[str, float] = {}
+        self.frame = 0
+        self.csv_file = None
+        self.csv_writer = None
+
+    def section(self, name: str):
+        if not self.enabled:
+            return NULL_SECTION
+        return _Section(self, name)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.current[name] = self.current.get(name, 0.0) + seconds
+
+    def end_frame(self) -> None:
+        if not self.current:
+            return
+        for name, seconds in self.current.items():
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+            samples.append(seconds * 1000)
+            if self.csv_writer is not None:
+                self.csv_writer.writerow((self.frame, name, f"{seconds * 1000:.4f}"))
+        self.current.clear()
+        self.frame += 1
+
+    def percentile(self, name: str, pct: float) -> float:
+        ordered = sorted(self.samples[name])
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """mean, p50, p95, p99 and max ms per frame for each section"""
+        return {
+            name: {
+                "mean": sum(samples) / len(samples),
+                "p50": self.percentile(name, 50),
+                "p95": self.percentile(name, 95),
+                "p99": self.percentile(name, 99),
+                "max": max(samples),
+            }
+            for name, samples in self.samples.items()
+        }
+
+    def reset(self) -> None:
+        self.samples.clear()
+        self.current.clear()
+
+    def start_csv(self, path: str) -> None:
+        """Stream every sample to path as frame,section,ms rows"""
+        self.stop_csv()
+        self.csv_file = open(path, "w", newline="")
+        self.csv_writer = csv.writer(self.csv_file)
+        self.csv_writer.writerow(("frame", "section", "ms"))
+
+    def stop_csv(self) -> None:
+        if self.csv_file is not None:
+            self.csv_file.close()
+        self.csv_file = None
+        self.csv_writer = None
+
+
+class ProfilerOverlay:
+    """Draws the profiler's p50/p95/p99 timings in the corner of the screen
+
+    The text is only laid out again every refresh_frames frames because that
+    is slow, and would show up in the timings.
+    """
+    def __init__(self, profiler: FrameProfiler, x: float = 20, top: float = HEIGHT - 120, refresh_frames: int = 30) -> None:
+        self.profiler = profiler
+        self.x = x
+        self.top = top
+        self.refresh_frames = refresh_frames
+        self.visible = False
+        self.lines: List[arcade.Text] = []
+        self.frames_until_refresh = 0
+
+    def toggle(self) -> None:
+        self.visible = not self.visible
+
+    def refresh(self) -> None:
+        rows = [f"{'section':<24}{'p50':>8}{'p95':>8}{'p99':>8}"]
+        for name, stats in sorted(self.profiler.summary().items()):
+            rows.append(f"{name:<24}{stats['p50']:>8.2f}{stats['p95']:>8.2f}{stats['p99']:>8.2f}")
+        while len(self.lines) < len(rows):
+            y = self.top - len(self.lines) * 16
+            self.lines.append(arcade.Text("", self.x, y, arcade.color.WHITE, font_size=10, font_name="Courier New"))
+        for line, row in zip(self.lines, rows):
+            line.text = row
+        for line in self.lines[len(rows):]:
+            line.text = ""
+
+    def draw(self) -> None:
+        if not self.visible:
+            return
+        if self.frames_until_refresh <= 0:
+            self.refresh()
+            self.frames_until_refresh = self.refresh_frames
+        self.frames_until_refresh -= 1
+        for line in self.lines:
+            line.draw()
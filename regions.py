@@ -0,0 +1,105 @@
+from __future__ import annotations
+from typing import Dict, List, Tuple
+
+import arcade
+from constants import REGION_CHECKS_PER_FRAME, REGION_PARK_DISTANCE, REGION_WAKE_DISTANCE
+
+
+class RegionManager:
+    """Takes bodies far from the camera out of the physics simulation
+
+    The level is far wider than the screen, but the physics engine steps every
+    body in it every frame. A sprite more than park_distance from the middle of
+    the view has its body and shape taken out of the pymunk space (and out of
+    the engine's list of moving sprites) so it costs nothing. When the view
+    comes back within wake_distance the body is put back with the velocity
+    it had when it was parked.
+
+    Only distance along x is used as the level is a long horizontal strip.
+    A few sprites are checked each frame rather than all of them, so wake_distance
+    should leave enough room for the player to not catch a sprite before it wakes.
+
+    Args:
+        physics_engine: the engine the sprites were added to
+
+        park_distance: park sprites further than this from the view
+
+        wake_distance: wake parked sprites closer than this to the view
+
+        checks_per_frame: how many sprites to check each update()
+    """
+    def __init__(
+        self,
+        physics_engine: arcade.PymunkPhysicsEngine,
+        park_distance: float = REGION_PARK_DISTANCE,
+        wake_distance: float = REGION_WAKE_DISTANCE,
+        checks_per_frame: int = REGION_CHECKS_PER_FRAME
+    ) -> None:
+        if wake_distance >= park_distance:
+            raise ValueError('wake_distance must be smaller than park_distance')
+        self.physics_engine = physics_engine
+        self.park_distance = park_distance
+        self.wake_distance = wake_distance
+        self.checks_per_frame = checks_per_frame
+        self.sprites: List[arcade.Sprite] = []
+        # parked sprite -> (velocity, angular_velocity) when it was parked
+        self.parked: Dict[arcade.Sprite, Tuple[Tuple[float, float], float]] = {}
+        self.next_check = 0
+
+    def register(self, sprite: arcade.Sprite) -> None:
+        self.sprites.append(sprite)
+
+    def register_all(self, sprites) -> None:
+        self.sprites.extend(sprites)
+
+    def forget(self, sprite: arcade.Sprite) -> None:
+        """Stop managing sprite, waking it first. Call before killing a registered sprite"""
+        if sprite in self.parked:
+            self.wake(sprite)
+        self.sprites.remove(sprite)
+
+    def update(self, view_x: float) -> None:
+        """Park or wake the next few sprites based on their distance from view_x"""
+        count = len(self.sprites)
+        if count == 0:
+            return
+        start = self.next_check % count
+        end = min(start + self.checks_per_frame, count)
+        self.next_check = end
+        dead = []
+        for sprite in self.sprites[start:end]:
+            if not sprite.physics_engines:
+                # killed, e.g. a bee that flew into the player
+                dead.append(sprite)
+                continue
+            distance = abs(sprite.center_x - view_x)
+            if sprite in self.parked:
+                if distance < self.wake_distance:
+                    self.wake(sprite)
+            elif distance > self.park_distance:
+                self.park(sprite)
+        for sprite in dead:
+            self.sprites.remove(sprite)
+
+    def park(self, sprite: arcade.Sprite) -> None:
+        engine = self.physics_engine
+        physics_object = engine.get_physics_object(sprite)
+        body = physics_object.body
+        self.parked[sprite] = ((body.velocity.x, body.velocity.y), body.angular_velocity)
+        engine.space.remove(body, physics_object.shape)
+        engine.non_static_sprite_list.remove(sprite)
+
+    def wake(self, sprite: arcade.Sprite) -> None:
+        engine = self.physics_engine
+        physics_object = engine.get_physics_object(sprite)
+        body = physics_object.body
+        velocity, angular_velocity = self.parked.pop(sprite)
+        body.velocity = velocity
+        body.angular_velocity = angular_velocity
+        # the AI may have been pushing the body while it was parked
+        body.force = (0, 0)
+        engine.space.add(body, physics_object.shape)
+        engine.non_static_sprite_list.append(sprite)
+
+    def stats(self):
+        return {"sprites": len(self.sprites), "parked": len(self.parked)}
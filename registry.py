@@ -0,0 +1,203 @@
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Tuple
+
+import arcade
+from utils import remove_sprites
+
+# A handle is the slot index in the low bits and the slot's generation above them
+SLOT_BITS = 24
+SLOT_MASK = (1 << SLOT_BITS) - 1
+
+
+def make_handle(slot: int, generation: int) -> int:
+    return (generation << SLOT_BITS) | slot
+
+
+class _Tracked:
+    """The live members of one tracked sprite list, packed together"""
+    __slots__ = ('sprite_list', 'members', 'member_slots', 'added')
+
+    def __init__(self, sprite_list: arcade.SpriteList) -> None:
+        self.sprite_list = sprite_list
+        self.members: List[arcade.Sprite] = []
+        # the slot of each member, so a swap can fix up the moved member
+        self.member_slots: List[int] = []
+        self.added: List[arcade.Sprite] = []
+
+
+class EntityRegistry:
+    """Keeps track of the sprites in the scene lists that sprites come and go from
+
+    spawn() and despawn() only queue up the change. flush() makes every change
+    at once, at the end of a tick, so lists can be looped over safely in
+    the meantime. In flush():
+    - despawned sprites are swapped with the last member and popped, so
+      taking one out of members costs the same however many there are
+    - they leave their physics engines and sprite lists in one batch,
+      see remove_sprites(). A list is only rebuilt when a good part of it
+      died, otherwise just the dead are removed. That part is still
+      linear in the size of the list, as SpriteList.remove() is
+    - each sprite list with new members is extended once
+
+    spawn() returns a handle. get(handle) gives back the sprite while it is
+    alive and None after it has been despawned, even if its slot has since
+    been reused. Hold handles rather than sprites where a sprite can die
+    while something still refers to it.
+    """
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self) -> None:
+        self.tracked: Dict[int, _Tracked] = {}
+        # per slot
+        self.generations: List[int] = []
+        self.sprites: List[Optional[arcade.Sprite]] = []
+        self.owners: List[Optional[_Tracked]] = []
+        # index into the owner's members, -1 until the spawn is flushed
+        self.places: List[int] = []
+        self.on_removed: List[Optional[Callable[[arcade.Sprite], None]]] = []
+        self.dying: List[bool] = []
+        self.free_slots: List[int] = []
+
+        self.spawns: List[int] = []
+        self.despawns: List[int] = []
+        self.spawned = 0
+        self.despawned = 0
+
+    def track(self, sprite_list: arcade.SpriteList) -> None:
+        """Manage sprite_list. Anything added to or removed from it should go through the registry from now on"""
+        tracked = self.tracked[id(sprite_list)] = _Tracked(sprite_list)
+        for sprite in sprite_list:
+            slot = self._allocate(sprite, tracked)
+            self._place(slot)
+
+    def _allocate(self, sprite: arcade.Sprite, tracked: _Tracked) -> int:
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.sprites[slot] = sprite
+            self.owners[slot] = tracked
+            self.places[slot] = -1
+            self.on_removed[slot] = None
+            self.dying[slot] = False
+        else:
+            slot = len(self.sprites)
+            self.generations.append(0)
+            self.sprites.append(sprite)
+            self.owners.append(tracked)
+            self.places.append(-1)
+            self.on_removed.append(None)
+            self.dying.append(False)
+        sprite.handle = make_handle(slot, self.generations[slot])
+        return slot
+
+    def _place(self, slot: int) -> None:
+        tracked = self.owners[slot]
+        self.places[slot] = len(tracked.members)
+        tracked.members.append(self.sprites[slot])
+        tracked.member_slots.append(slot)
+
+    def _slot(self, handle: int) -> int:
+        """The slot for handle, or -1 if what it pointed at has gone"""
+        slot = handle & SLOT_MASK
+        if slot < len(self.generations) and self.generations[slot] == handle >> SLOT_BITS:
+            return slot
+        return -1
+
+    def spawn(self, sprite: arcade.Sprite, sprite_list: arcade.SpriteList) -> int:
+        """Add sprite to sprite_list at the next flush() and return its handle"""
+        slot = self._allocate(sprite, self.tracked[id(sprite_list)])
+        self.spawns.append(slot)
+        return sprite.handle
+
+    def despawn(self, sprite: arcade.Sprite, on_removed: Optional[Callable[[arcade.Sprite], None]] = None) -> None:
+        """Take sprite out of its list and physics engine at the next flush()
+
+        on_removed(sprite) is called once it has gone. Sprites the
+        registry isn't tracking are killed straight away.
+        """
+        handle = getattr(sprite, 'handle', None)
+        slot = self._slot(handle) if handle is not None else -1
+        if slot == -1 or self.sprites[slot] is not sprite:
+            # the plain kill, Bullet.kill would come back here through the pool
+            arcade.Sprite.kill(sprite)
+            if on_removed is not None:
+                on_removed(sprite)
+            return
+        if self.dying[slot]:
+            return
+        self.dying[slot] = True
+        self.on_removed[slot] = on_removed
+        self.despawns.append(slot)
+
+    def get(self, handle: int) -> Optional[arcade.Sprite]:
+        """The sprite handle points at, or None if it has been despawned"""
+        slot = self._slot(handle)
+        if slot == -1 or self.dying[slot]:
+            return None
+        return self.sprites[slot]
+
+    def alive(self, sprite_list: arcade.SpriteList) -> List[arcade.Sprite]:
+        """The members of sprite_list as of the last flush(). Safe to loop over while spawning and despawning"""
+        return self.tracked[id(sprite_list)].members
+
+    def flush(self) -> None:
+        """Make every queued spawn and despawn"""
+        if not self.spawns and not self.despawns:
+            return
+        touched: Dict[int, _Tracked] = {}
+        dead: List[Tuple[arcade.Sprite, Optional[Callable[[arcade.Sprite], None]]]] = []
+        for slot in self.despawns:
+            tracked = self.owners[slot]
+            sprite = self.sprites[slot]
+            place = self.places[slot]
+            if place >= 0:
+                # swap the last member into the gap
+                last = tracked.members.pop()
+                last_slot = tracked.member_slots.pop()
+                if last_slot != slot:
+                    tracked.members[place] = last
+                    tracked.member_slots[place] = last_slot
+                    self.places[last_slot] = place
+            dead.append((sprite, self.on_removed[slot]))
+            self.generations[slot] += 1
+            self.sprites[slot] = None
+            self.owners[slot] = None
+            self.on_removed[slot] = None
+            self.dying[slot] = False
+            self.free_slots.append(slot)
+
+        for slot in self.spawns:
+            # spawned and despawned before a flush, nothing to add
+            if self.sprites[slot] is None:
+                continue
+            tracked = self.owners[slot]
+            self._place(slot)
+            tracked.added.append(self.sprites[slot])
+            touched[id(tracked)] = tracked
+
+        # out of every list they are in, tracked or not
+        remove_sprites([sprite for sprite, _ in dead])
+        for tracked in touched.values():
+            tracked.sprite_list.extend(tracked.added)
+            tracked.added.clear()
+
+        for sprite, on_removed in dead:
+            if on_removed is not None:
+                on_removed(sprite)
+
+        self.spawned += len(self.spawns)
+        self.despawned += len(self.despawns)
+        self.spawns.clear()
+        self.despawns.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "live": sum(len(tracked.members) for tracked in self.tracked.values()),
+            "slots": len(self.sprites),
+            "spawned": self.spawned,
+            "despawned": self.despawned,
+        }
+
+
+# The game's registry of enemies, bullets and orbs
+entities = EntityRegistry()
@@ -0,0 +1,209 @@
+"""Recording a session's input and playing it back
+
+A recording is the seed and set up of the level, then one small frame of
+input per fixed tick. Everything random in the game comes from
+rng.streams, seeded from the recorded seed, and input is only read at one
+point in each tick (see TestGame.read_input), so playing the frames back
+runs exactly the same simulation.
+
+Record with:
+    python main.py --record session.rpl
+
+Play back headless, timing it like any other benchmark scenario, with:
+    python benchmark.py --replay session.rpl
+
+File layout, little endian:
+    header  magic, version, seed, ticks, checksum (HEADER)
+    level   enemy count, rock count, physics substeps, ai tick interval, swarm count (LEVEL)
+    swarms  x, y, level, size for each swarm (SWARM)
+    frames  one FRAME per tick until the end of the file
+
+ticks and checksum are filled in when the recording is closed. A
+recording that was never closed has 0 for both and is played to the end
+of its frames without being checked.
+"""
+from __future__ import annotations
+import hashlib
+import math
+import struct
+from array import array
+from typing import TYPE_CHECKING, BinaryIO, List, Tuple
+
+if TYPE_CHECKING:
+    from game_view import TestGame
+
+MAGIC = b"SPRP"
+VERSION = 1
+HEADER = struct.Struct("<4sHQIQ")
+# where ticks and checksum are in the header, to fill them in on close
+RESULT = struct.Struct("<IQ")
+RESULT_OFFSET = 14
+LEVEL = struct.Struct("<IIHHH")
+SWARM = struct.Struct("<ddII")
+# keys, fires, aim, axis_x, axis_y
+FRAME = struct.Struct("<BBhbb")
+
+# bits of InputFrame.keys
+KEY_W = 1
+KEY_A = 2
+KEY_S = 4
+KEY_D = 8
+TORQUE_LEFT = 16
+TORQUE_RIGHT = 32
+
+# InputFrame.aim when the mouse didn't move
+NO_AIM = -32768
+
+
+def quantise_angle(angle: float) -> int:
+    # wrap into -pi..pi first so every angle fits
+    angle = (angle + math.pi) % math.tau - math.pi
+    return round(angle / math.pi * 32767)
+
+
+def quantise_axis(value: float) -> int:
+    return max(-127, min(127, round(value * 127)))
+
+
+class InputFrame:
+    """Everything the player did in one tick, quantised to what is recorded
+
+    The game always plays from a frame, live or replayed, so a live session
+    runs on exactly the values that end up in the recording.
+
+    keys: KEY_ and TORQUE_ bits held down
+    fires: how many times fire was pressed
+    aim: the angle to point the player, from quantise_angle(), or NO_AIM
+    axis_x, axis_y: TestGame.acc_x and acc_y, from quantise_axis()
+    """
+    __slots__ = ('keys', 'fires', 'aim', 'axis_x', 'axis_y')
+
+    def __init__(self, keys: int = 0, fires: int = 0, aim: int = NO_AIM, axis_x: int = 0, axis_y: int = 0) -> None:
+        self.keys = keys
+        self.fires = fires
+        self.aim = aim
+        self.axis_x = axis_x
+        self.axis_y = axis_y
+
+    @classmethod
+    def sample(cls, game: TestGame) -> InputFrame:
+        """The input game has had since the last tick"""
+        keys = (
+            KEY_W * game.w_pressed
+            | KEY_A * game.a_pressed
+            | KEY_S * game.s_pressed
+            | KEY_D * game.d_pressed
+            | TORQUE_LEFT * game.torque_left
+            | TORQUE_RIGHT * game.torque_right
+        )
+        aim = NO_AIM if game.aim_angle is None else quantise_angle(game.aim_angle)
+        return cls(keys, min(game.fire_requests, 255), aim, quantise_axis(game.acc_x), quantise_axis(game.acc_y))
+
+    def pressed(self, key: int) -> bool:
+        return bool(self.keys & key)
+
+    @property
+    def aim_angle(self) -> float:
+        return self.aim * math.pi / 32767
+
+    @property
+    def acc_x(self) -> float:
+        return self.axis_x / 127
+
+    @property
+    def acc_y(self) -> float:
+        return self.axis_y / 127
+
+    def pack(self) -> bytes:
+        return FRAME.pack(self.keys, self.fires, self.aim, self.axis_x, self.axis_y)
+
+
+def world_checksum(game: TestGame) -> int:
+    """A hash of every body, the player and the tick, to check a replay ended up in the same place"""
+    bodies = [physics_object.body for physics_object in game.physics_engine.sprites.values()]
+    values = array('d')
+    for body in bodies:
+        values.extend((body.position.x, body.position.y, body.velocity.x, body.velocity.y, body.angle))
+    player = game.player_sprite
+    digest = hashlib.blake2b(values.tobytes(), digest_size=8)
+    digest.update(struct.pack("<Iddd", game.tick, player.health, player.experience, player.level))
+    return int.from_bytes(digest.digest(), "little")
+
+
+class InputRecorder:
+    """Writes the level's set up and then a frame per tick to path
+
+    Made by TestGame.start_recording() before it sets up the level.
+    """
+    def __init__(self, path: str, game: TestGame) -> None:
+        self.path = path
+        self.ticks = 0
+        self.file: BinaryIO = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, game.seed, 0, 0))
+        self.file.write(LEVEL.pack(game.enemy_count, game.rock_count, game.physics_substeps, game.ai_tick_interval, len(game.swarm_layout)))
+        for x, y, level, size in game.swarm_layout:
+            self.file.write(SWARM.pack(x, y, level, size))
+
+    def write(self, frame: InputFrame) -> None:
+        self.file.write(frame.pack())
+        self.ticks += 1
+
+    def close(self, checksum: int) -> None:
+        """Finish the file, with checksum being world_checksum() after the last tick"""
+        self.file.seek(RESULT_OFFSET)
+        self.file.write(RESULT.pack(self.ticks, checksum))
+        self.file.close()
+
+
+class InputReplay:
+    """A recording read back from path, to hand to TestGame.start_replay()"""
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, self.seed, self.ticks, self.checksum = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a recording")
+        if version != VERSION:
+            raise ValueError(f"{path} is version {version}, only version {VERSION} can be played")
+        offset = HEADER.size
+        self.enemy_count, self.rock_count, self.physics_substeps, self.ai_tick_interval, swarm_count = LEVEL.unpack_from(data, offset)
+        offset += LEVEL.size
+        self.swarm_layout: List[Tuple[float, float, int, int]] = []
+        for _ in range(swarm_count):
+            self.swarm_layout.append(SWARM.unpack_from(data, offset))
+            offset += SWARM.size
+        # a recording cut off part way through a frame loses that frame
+        end = len(data) - (len(data) - offset) % FRAME.size
+        self.frames = [InputFrame(*values) for values in FRAME.iter_unpack(data[offset:end])]
+        if self.ticks and self.ticks != len(self.frames):
+            raise ValueError(f"{path} should have {self.ticks} ticks but has {len(self.frames)}")
+        self.position = 0
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    @property
+    def finished(self) -> bool:
+        return self.position >= len(self.frames)
+
+    def configure(self, game: TestGame) -> None:
+        """Set game up to build the recorded level"""
+        game.seed = self.seed
+        game.enemy_count = self.enemy_count
+        game.rock_count = self.rock_count
+        game.swarm_layout = list(self.swarm_layout)
+        game.physics_substeps = self.physics_substeps
+        game.ai_tick_interval = self.ai_tick_interval
+        self.position = 0
+
+    def next_frame(self) -> InputFrame:
+        """The next tick's input. No input at all once the recording has run out"""
+        if self.finished:
+            return InputFrame()
+        frame = self.frames[self.position]
+        self.position += 1
+        return frame
+
+    def verify(self, game: TestGame) -> bool:
+        """Did game end up where the recording did. Call after playing every frame"""
+        return self.ticks == 0 or (self.finished and world_checksum(game) == self.checksum)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import arcade
+import PIL.Image
+import PIL.ImageDraw
+import PIL.ImageFont
+from constants import DAMAGE_NUMBER_FONT_SIZE, ROCK_CHOICES
+
+# Everything the game draws during play. Loaded by preload() before
+# the level is set up so nothing is read from disk mid-fight
+STARTUP_TEXTURES = [f":resources:images/space_shooter/{rock}" for rock in ROCK_CHOICES] + [
+    ":resources:images/space_shooter/playerShip1_blue.png",
+    ":resources:images/space_shooter/playerShip1_orange.png",
+    ":resources:images/space_shooter/laserRed01.png",
+    ":resources:images/space_shooter/laserBlue01.png",
+    ":resources:images/enemies/saw.png",
+    ":resources:images/items/star.png",
+    "assets/images/player/player-off.png",
+    "assets/images/player/player-on.png",
+]
+
+# (radius, colour) of the obstacle detectors in AvoidObstaclesActivity
+STARTUP_CIRCLES = [(20, (0, 0, 255)), (20, (255, 0, 0)), (20, (0, 255, 0))]
+
+# (characters, font size) of the glyphs DamageNumbers draws with
+STARTUP_GLYPHS = [("0123456789", DAMAGE_NUMBER_FONT_SIZE)]
+
+
+class TextureRegistry:
+    """Loads each texture and works out its hit box once, then shares it
+
+    Sprites made with texture=textures.load(filename) all point at the same
+    Texture, so they share its hit box points as well.
+
+    Counts cache hits and misses and the time spent loading so we can check
+    nothing is being loaded while the game is running. When loading on
+    several threads the time is added up across them.
+    """
+    def __init__(self) -> None:
+        self.textures: Dict[Tuple, arcade.Texture] = {}
+        # preload() can load on several threads at once
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.load_time = 0.0
+
+    def _get(self, key: Tuple):
+        texture = self.textures.get(key)
+        if texture is not None:
+            self.hits += 1
+        return texture
+
+    def _add(self, key: Tuple, texture: arcade.Texture, start: float) -> arcade.Texture:
+        # the hit box is worked out the first time it is asked for, do it now
+        texture.hit_box_points
+        with self.lock:
+            # if two threads loaded it keep the first, so it is still shared
+            texture = self.textures.setdefault(key, texture)
+            self.misses += 1
+            self.load_time += perf_counter() - start
+        return texture
+
+    def load(self, filename: str) -> arcade.Texture:
+        """The texture for an image file"""
+        key = ("file", filename)
+        texture = self._get(key)
+        if texture is None:
+            start = perf_counter()
+            texture = self._add(key, arcade.load_texture(filename), start)
+        return texture
+
+    def circle(self, radius: int, color: Tuple[int, int, int]) -> arcade.Texture:
+        """The same texture arcade.SpriteCircle would make"""
+        key = ("circle", radius, tuple(color))
+        texture = self._get(key)
+        if texture is None:
+            start = perf_counter()
+            texture = self._add(key, arcade.make_circle_texture(radius * 2, color), start)
+        return texture
+
+    def solid(self, width: int, height: int, color: Tuple[int, int, int]) -> arcade.Texture:
+        """A plain rectangle of colour, like arcade.SpriteSolidColor uses"""
+        key = ("solid", width, height, tuple(color))
+        texture = self._get(key)
+        if texture is None:
+            start = perf_counter()
+            image = PIL.Image.new("RGBA", (width, height), tuple(color))
+            texture = self._add(key, arcade.Texture(f"solid-{width}-{height}-{color}", image), start)
+        return texture
+
+    def glyph(self, character: str, font_size: int) -> arcade.Texture:
+        """One white character in a cell font_size high, to tint and put together into text with sprites
+
+        Every character of a font size is in a cell of the same size, so
+        glyphs can be swapped on a sprite without moving it.
+        """
+        key = ("glyph", character, font_size)
+        texture = self._get(key)
+        if texture is None:
+            start = perf_counter()
+            try:
+                font = PIL.ImageFont.load_default(font_size)
+            except TypeError:
+                # older Pillow only has the one small bitmap font
+                font = PIL.ImageFont.load_default()
+            width = (font_size * 3 + 4) // 5
+            image = PIL.Image.new("RGBA", (width, font_size), (0, 0, 0, 0))
+            draw = PIL.ImageDraw.Draw(image)
+            # centre the character in the cell
+            left, top, right, bottom = draw.textbbox((0, 0), character, font=font)
+            position = ((width - (right - left)) / 2 - left, (font_size - (bottom - top)) / 2 - top)
+            draw.text(position, character, fill=(255, 255, 255, 255), font=font)
+            texture = self._add(key, arcade.Texture(f"glyph-{character}-{font_size}", image), start)
+        return texture
+
+    def preload_jobs(
+        self,
+        filenames: Iterable[str] = STARTUP_TEXTURES,
+        circles: Iterable[Tuple[int, Tuple[int, int, int]]] = STARTUP_CIRCLES,
+        glyphs: Iterable[Tuple[str, int]] = STARTUP_GLYPHS,
+    ) -> List[Callable[[], arcade.Texture]]:
+        """A call for each texture preload() loads. They can be run in any order, on any thread"""
+        return (
+            [partial(self.load, filename) for filename in filenames]
+            + [partial(self.circle, radius, color) for radius, color in circles]
+            + [partial(self.glyph, character, font_size) for characters, font_size in glyphs for character in characters]
+        )
+
+    def preload(
+        self,
+        filenames: Iterable[str] = STARTUP_TEXTURES,
+        circles: Iterable[Tuple[int, Tuple[int, int, int]]] = STARTUP_CIRCLES,
+        glyphs: Iterable[Tuple[str, int]] = STARTUP_GLYPHS,
+        workers: int = 0,
+    ) -> None:
+        """Load everything the game needs up front, on workers threads if there are any
+
+        Most of loading an image is PIL decoding it, which lets other threads
+        run, so the files load side by side.
+        """
+        jobs = self.preload_jobs(filenames, circles, glyphs)
+        if workers <= 0:
+            for job in jobs:
+                job()
+            return
+        with ThreadPoolExecutor(workers) as pool:
+            # wait for every result so an error loading is raised here
+            for future in [pool.submit(job) for job in jobs]:
+                future.result()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "textures": len(self.textures),
+            "hits": self.hits,
+            "misses": self.misses,
+            "load_ms": self.load_time * 1000,
+        }
+
+
+# The game's textures. Use this rather than arcade.load_texture or a filename
+textures = TextureRegistry()
@@ -0,0 +1,55 @@
+import random
+from typing import List, Tuple
+
+# the streams, in the order getstate() lists them
+NAMES = ("world", "enemies", "player", "combat", "loot", "ai")
+
+
+class RandomStreams:
+    """One random.Random per part of the game, all seeded from one number
+
+    Everything random in the game draws from one of these rather than the
+    random module, so a run can be repeated exactly from its seed (see
+    replay.py). Each part having its own stream means a change to how often
+    one part draws, e.g. a new AI state, doesn't move the rocks about.
+
+    world: where fighters spawn and bee starting positions
+    enemies: enemy stats
+    player: player stats and level ups
+    combat: damage rolls
+    loot: experience orbs
+    ai: decisions made by states
+
+    chunk() gives a stream of its own to each part of something made a
+    piece at a time, such as the asteroid field.
+    """
+    def __init__(self, seed: int = 0) -> None:
+        self.seed(seed)
+
+    def seed(self, seed: int) -> None:
+        self.current_seed = seed
+        # seeding with a string is the same on every platform and python run
+        self.world = random.Random(f"{seed}/world")
+        self.enemies = random.Random(f"{seed}/enemies")
+        self.player = random.Random(f"{seed}/player")
+        self.combat = random.Random(f"{seed}/combat")
+        self.loot = random.Random(f"{seed}/loot")
+        self.ai = random.Random(f"{seed}/ai")
+
+    def getstate(self) -> List[Tuple]:
+        """Where every stream is up to, in NAMES order. See setstate()"""
+        return [getattr(self, name).getstate() for name in NAMES]
+
+    def setstate(self, seed: int, states: List[Tuple]) -> None:
+        """Put every stream back where getstate() found it, for a game started from seed"""
+        self.current_seed = seed
+        for name, state in zip(NAMES, states):
+            getattr(self, name).setstate(state)
+
+    def chunk(self, name: str, index: int) -> random.Random:
+        """A new stream for piece index of name, the same every time it is asked for"""
+        return random.Random(f"{self.current_seed}/{name}/{index}")
+
+
+# The game's random streams. TestGame.setup() seeds them
+streams = RandomStreams()
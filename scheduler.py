@@ -0,0 +1,170 @@
+from __future__ import annotations
+import math
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+import arcade
+from registry import entities
+
+if TYPE_CHECKING:
+    from spatial import SpatialIndex
+    from state_machines import StateMachine
+
+# What can make a transition worth checking. Decisions list the events
+# that can change their answer in Decision.events, as a mask of these
+POLLED = 0
+TIMER = 1
+HEALTH = 2
+PROXIMITY = 4
+SWARM = 8
+# the state machine has just entered its state, check everything once
+ENTERED = TIMER | HEALTH | PROXIMITY | SWARM
+
+
+class TimerWheel:
+    """Timers due a whole number of ticks from now, kept in a ring of slots
+
+    A timer goes in the slot for the tick it is due, so advancing only looks
+    at one slot. Timers more than a lap of the wheel away wait in their slot
+    until the lap they are due in.
+
+    Args:
+        slots: how many ticks one lap of the wheel covers
+    """
+    def __init__(self, slots: int = 512) -> None:
+        self.slots: List[List[Tuple[int, StateMachine, int]]] = [[] for _ in range(slots)]
+        self.tick = 0
+
+    def schedule(self, ticks: int, state_machine: StateMachine, generation: int) -> None:
+        due = self.tick + max(1, ticks)
+        self.slots[due % len(self.slots)].append((due, state_machine, generation))
+
+    def advance(self) -> List[Tuple[StateMachine, int]]:
+        """Move on one tick and return the (state machine, generation) of the timers now due"""
+        self.tick += 1
+        slot = self.slots[self.tick % len(self.slots)]
+        if not slot:
+            return []
+        due = [(state_machine, generation) for tick, state_machine, generation in slot if tick <= self.tick]
+        if len(due) == len(slot):
+            slot.clear()
+        else:
+            slot[:] = [timer for timer in slot if timer[0] > self.tick]
+        return due
+
+    def __len__(self) -> int:
+        return sum(len(slot) for slot in self.slots)
+
+
+class ProximityTrigger:
+    """Which enemies are between inner and outer of a target, as of the last update()
+
+    Found with a spatial index query around the target rather than every
+    enemy working out its own distance.
+    """
+    def __init__(self, target: arcade.Sprite, outer: float, inner: float, categories: Tuple[str, ...]) -> None:
+        self.target = target
+        self.outer = outer
+        self.inner_squared = inner * inner
+        self.categories = categories
+        # a dict rather than a set so the order is the same every run, see replay.py
+        self.inside: Dict[arcade.Sprite, None] = {}
+
+    def update(self, spatial_index: SpatialIndex) -> List[arcade.Sprite]:
+        """Return the sprites that came in or went out since the last update"""
+        x = self.target.center_x
+        y = self.target.center_y
+        inside: Dict[arcade.Sprite, None] = {}
+        for category in self.categories:
+            for sprite in spatial_index.neighbours(category, x, y, self.outer):
+                dx = sprite.center_x - x
+                dy = sprite.center_y - y
+                if dx * dx + dy * dy > self.inner_squared:
+                    inside[sprite] = None
+        changed = [sprite for sprite in inside if sprite not in self.inside]
+        changed.extend(sprite for sprite in self.inside if sprite not in inside)
+        self.inside = inside
+        return changed
+
+
+class Scheduler:
+    """Runs transitions when something happens rather than checking them every tick
+
+    Keeps simulation time, which only moves when advance() is called once
+    per fixed tick, so pausing or running headless doesn't change when
+    timers go off.
+
+    State machines post events here with notify(): timers from a TimerWheel,
+    health changes from take_damage() and HealActivity, and enemies crossing
+    in or out of a ProximityTrigger. dispatch() then gives each state machine
+    that had something happen the combined events, and only the transitions
+    listening for one of them are checked.
+
+    Args:
+        timestep: seconds of simulation time per tick
+
+        spatial_index: the index proximity triggers query, rebuilt by the game each AI tick
+
+        categories: the spatial index categories the enemies are in
+    """
+    def __init__(self, timestep: float, spatial_index: SpatialIndex, categories: Tuple[str, ...] = ('fighters', 'bees')) -> None:
+        self.timestep = timestep
+        self.spatial_index = spatial_index
+        self.categories = categories
+        self.wheel = TimerWheel()
+        # state machine -> events since the last dispatch()
+        self.pending: Dict[StateMachine, int] = {}
+        # (target, outer, inner) -> trigger
+        self.triggers: Dict[Tuple[int, float, float], ProximityTrigger] = {}
+        self.dispatched = 0
+
+    @property
+    def now(self) -> float:
+        """Simulation time in seconds"""
+        return self.wheel.tick * self.timestep
+
+    def notify(self, state_machine: StateMachine, events: int) -> None:
+        self.pending[state_machine] = self.pending.get(state_machine, 0) | events
+
+    def after(self, seconds: float, state_machine: StateMachine) -> None:
+        """Send state_machine a TIMER event seconds from now, unless it changes state first"""
+        ticks = math.ceil(seconds / self.timestep - 1e-9)
+        self.wheel.schedule(ticks, state_machine, state_machine.blackboard.generation)
+
+    def watch(self, target: arcade.Sprite, outer: float, inner: float = 0) -> None:
+        """Send PROXIMITY events to enemies as they cross in or out of the band around target"""
+        key = (id(target), outer, inner)
+        if key not in self.triggers:
+            self.triggers[key] = ProximityTrigger(target, outer, inner, self.categories)
+
+    def reset(self, tick: int = 0) -> None:
+        """Forget every timer, event and trigger and set the time to tick, e.g. after a world is restored"""
+        self.wheel = TimerWheel(len(self.wheel.slots))
+        self.wheel.tick = tick
+        self.pending.clear()
+        self.triggers.clear()
+
+    def advance(self) -> None:
+        """Move simulation time on one tick and collect the timers that are due"""
+        for state_machine, generation in self.wheel.advance():
+            # a timer from a state that has since been left
+            if state_machine.blackboard.generation == generation:
+                self.notify(state_machine, TIMER)
+
+    def dispatch(self) -> None:
+        """Check proximity triggers, then run the transitions for every event since the last dispatch"""
+        for trigger in self.triggers.values():
+            for sprite in trigger.update(self.spatial_index):
+                self.notify(sprite.state_machine, PROXIMITY)
+        pending = self.pending
+        # transitions post events of their own, those wait until next time
+        self.pending = {}
+        for state_machine, events in pending.items():
+            # killed since the event, even if it hasn't left its lists yet
+            sprite = state_machine.sprite
+            if entities.get(sprite.handle) is not sprite:
+                continue
+            state_machine.state.handle(state_machine, events)
+        self.dispatched += len(pending)
+
+    def stats(self):
+        return {"timers": len(self.wheel), "triggers": len(self.triggers), "dispatched": self.dispatched}
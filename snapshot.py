@@ -0,0 +1,58 @@
+from __future__ import annotations
+from array import array
+from typing import List, Tuple
+
+import arcade
+
+
+class KinematicSnapshot:
+    """Where every body in the physics engine is, captured once per tick
+
+    capture() reads each body once and stores positions, velocities, angles,
+    health and sprite heights in flat arrays. Every sprite gets an entity_id for this tick
+    that indexes those arrays, and the body itself is kept in bodies so it can
+    be written to without going back through the physics engine.
+
+    The arrays are array('d') so numpy can view them without copying,
+    e.g. numpy.frombuffer(snapshot.x)
+    """
+    def __init__(self) -> None:
+        self.sprites: List[arcade.Sprite] = []
+        self.bodies = []
+        self.x = array('d')
+        self.y = array('d')
+        self.vx = array('d')
+        self.vy = array('d')
+        self.angle = array('d')
+        self.health = array('d')
+        self.height = array('d')
+
+    def __len__(self) -> int:
+        return len(self.sprites)
+
+    def capture(self, physics_engine: arcade.PymunkPhysicsEngine) -> None:
+        self.sprites = list(physics_engine.sprites)
+        self.bodies = [physics_object.body for physics_object in physics_engine.sprites.values()]
+        positions = [body.position for body in self.bodies]
+        velocities = [body.velocity for body in self.bodies]
+        self.x = array('d', [position.x for position in positions])
+        self.y = array('d', [position.y for position in positions])
+        self.vx = array('d', [velocity.x for velocity in velocities])
+        self.vy = array('d', [velocity.y for velocity in velocities])
+        self.angle = array('d', [body.angle for body in self.bodies])
+        self.health = array('d', [getattr(sprite, 'health', 0) for sprite in self.sprites])
+        self.height = array('d', [sprite.height for sprite in self.sprites])
+        for entity_id, sprite in enumerate(self.sprites):
+            sprite.entity_id = entity_id
+
+    def has(self, sprite: arcade.Sprite) -> bool:
+        """Was sprite in the engine when this snapshot was captured"""
+        entity_id = getattr(sprite, 'entity_id', -1)
+        return 0 <= entity_id < len(self.sprites) and self.sprites[entity_id] is sprite
+
+    def velocity(self, sprite: arcade.Sprite) -> Tuple[float, float]:
+        entity_id = sprite.entity_id
+        return self.vx[entity_id], self.vy[entity_id]
+
+    def body(self, sprite: arcade.Sprite):
+        return self.bodies[sprite.entity_id]
@@ -0,0 +1,96 @@
+from __future__ import annotations
+import arcade
+from typing import Dict, Iterable, List, Tuple
+
+from constants import SPATIAL_CELL_SIZE
+
+
+class SpatialIndex:
+    """A uniform grid of sprites used for "what is near me" queries
+
+    The grid is thrown away and rebuilt every frame, which is cheap compared to
+    checking every sprite against every other sprite. Sprites are put in the cell
+    holding their center and each category remembers the biggest sprite it has
+    been given, so a query only needs to look in the cells that sprite could reach.
+
+    Categories are just names, e.g. 'rocks', 'fighters', 'bees'
+
+    Args:
+        cell_size: The width and height of a grid cell in pixels
+    """
+    def __init__(self, cell_size: float = SPATIAL_CELL_SIZE) -> None:
+        self.cell_size = cell_size
+        self.cells: Dict[str, Dict[Tuple[int, int], List[arcade.Sprite]]] = {}
+        self.max_extent: Dict[str, float] = {}
+
+    def clear(self) -> None:
+        self.cells.clear()
+        self.max_extent.clear()
+
+    def insert(self, category: str, sprite: arcade.Sprite) -> None:
+        cells = self.cells.get(category)
+        if cells is None:
+            cells = self.cells[category] = {}
+            self.max_extent[category] = 0
+        key = (int(sprite.center_x // self.cell_size), int(sprite.center_y // self.cell_size))
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = [sprite]
+        else:
+            cell.append(sprite)
+        extent = max(sprite.width, sprite.height) / 2
+        if extent > self.max_extent[category]:
+            self.max_extent[category] = extent
+
+    def insert_all(self, category: str, sprites: Iterable[arcade.Sprite]) -> None:
+        for sprite in sprites:
+            self.insert(category, sprite)
+
+    def _cells_around(self, category: str, x: float, y: float, reach: float) -> List[List[arcade.Sprite]]:
+        cells = self.cells.get(category)
+        if not cells:
+            return []
+        size = self.cell_size
+        found = []
+        for cx in range(int((x - reach) // size), int((x + reach) // size) + 1):
+            for cy in range(int((y - reach) // size), int((y + reach) // size) + 1):
+                cell = cells.get((cx, cy))
+                if cell is not None:
+                    found.append(cell)
+        return found
+
+    def neighbours(self, category: str, x: float, y: float, radius: float) -> List[arcade.Sprite]:
+        """Every sprite in category with its center within radius of (x, y)"""
+        radius_squared = radius * radius
+        found = []
+        for cell in self._cells_around(category, x, y, radius):
+            for sprite in cell:
+                dx = sprite.center_x - x
+                dy = sprite.center_y - y
+                if dx * dx + dy * dy <= radius_squared:
+                    found.append(sprite)
+        return found
+
+    def candidates(self, category: str, x: float, y: float, radius: float) -> List[arcade.Sprite]:
+        """Every sprite in category that might overlap a circle at (x, y).
+
+        This is a cheap broad phase, use overlapping() to get the sprites
+        that really do touch.
+        """
+        reach = radius + self.max_extent.get(category, 0)
+        found = []
+        for cell in self._cells_around(category, x, y, reach):
+            found.extend(cell)
+        return found
+
+    def overlapping(self, category: str, sprite: arcade.Sprite) -> List[arcade.Sprite]:
+        """Every sprite in category that collides with sprite.
+
+        Gives the same answer as arcade.check_for_collision_with_list but
+        only checks the sprites that are close enough to matter.
+        """
+        radius = max(sprite.width, sprite.height) / 2
+        return [
+            other for other in self.candidates(category, sprite.center_x, sprite.center_y, radius)
+            if other is not sprite and arcade.check_for_collision(sprite, other)
+        ]
@@ -0,0 +1,169 @@
+"""Getting from an empty window to a level the player can play
+
+main.py opens the window with TestGame(build=False), which only makes the
+window, and shows a LoadingView. The view draws a progress bar while a
+StartupPipeline does the rest a step per frame:
+
+    textures    every texture in resources.STARTUP_TEXTURES and the rest,
+                decoded side by side on a pool of threads
+    world       the level is set up, once
+
+The pipeline times the first frame drawn and the first frame the player can
+play, from when main.py started, see benchmark.py --startup.
+"""
+from __future__ import annotations
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+
+import arcade
+from constants import HEIGHT, STARTUP_WORKERS, WIDTH
+from resources import textures
+
+LOADING_TEXTURES = "Loading textures"
+BUILDING_WORLD = "Building the world"
+READY = "Ready"
+
+PROGRESS_BAR_WIDTH = 400
+PROGRESS_BAR_HEIGHT = 16
+
+
+class StartupPipeline:
+    """The steps between opening the window and the first tick of the level
+
+    start() hands every texture to a pool of workers threads. Each step()
+    after that checks how many have finished, and once they all have the
+    next step() calls build. Loading happens behind the progress bar rather
+    than before the window has drawn anything.
+
+    Args:
+        build: sets up the level, e.g. TestGame.setup. It is only called once
+
+        started: perf_counter() when the program started, the times are from here
+
+        workers: threads decoding textures
+    """
+    def __init__(self, build: Callable[[], None], started: float, workers: int = STARTUP_WORKERS) -> None:
+        self.build = build
+        self.started = started
+        self.workers = workers
+        self.stage = LOADING_TEXTURES
+        self.pool: Optional[ThreadPoolExecutor] = None
+        self.loading: List[Future] = []
+        # perf_counter() at each point, filled in as they happen
+        self.first_frame: Optional[float] = None
+        self.textures_loaded: Optional[float] = None
+        self.interactive: Optional[float] = None
+
+    def start(self) -> None:
+        self.pool = ThreadPoolExecutor(max(self.workers, 1), thread_name_prefix="textures")
+        self.loading = [self.pool.submit(job) for job in textures.preload_jobs()]
+
+    def progress(self) -> float:
+        """How far along startup is, from 0 to 1. Textures are the first half and the world the second"""
+        if self.stage == LOADING_TEXTURES:
+            if not self.loading:
+                return 0.0
+            return 0.5 * sum(future.done() for future in self.loading) / len(self.loading)
+        if self.stage == BUILDING_WORLD:
+            return 0.5
+        return 1.0
+
+    def step(self) -> bool:
+        """Do the next thing if it can be done yet, True once the level is ready to play"""
+        if self.stage == LOADING_TEXTURES:
+            if self.pool is None:
+                self.start()
+            if not all(future.done() for future in self.loading):
+                return False
+            for future in self.loading:
+                # an error loading is raised here, on the main thread
+                future.result()
+            self.pool.shutdown()
+            self.pool = None
+            self.loading = []
+            self.textures_loaded = perf_counter()
+            # the world is built next frame, after the bar has been drawn saying so
+            self.stage = BUILDING_WORLD
+            return False
+        if self.stage == BUILDING_WORLD:
+            self.build()
+            self.interactive = perf_counter()
+            self.stage = READY
+        return True
+
+    def frame_drawn(self) -> None:
+        if self.first_frame is None:
+            self.first_frame = perf_counter()
+
+    def times(self) -> Dict[str, Optional[float]]:
+        """ms from started to each point, None if it hasn't happened yet"""
+        def since_start(at: Optional[float]) -> Optional[float]:
+            return None if at is None else (at - self.started) * 1000
+        return {
+            "first_frame_ms": since_start(self.first_frame),
+            "textures_ms": since_start(self.textures_loaded),
+            "interactive_ms": since_start(self.interactive),
+        }
+
+    def write_report(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.times(), f, indent=2)
+
+
+class LoadingView(arcade.View):
+    """Draws the pipeline's progress and runs it until the level is ready
+
+    The window's own handlers run after the view's, so every handler here
+    returns True to stop the game's from running on a level that isn't
+    set up yet. When the pipeline is done the view hides itself, handing
+    the window back to the game, and calls on_ready.
+
+    Args:
+        pipeline: what to run
+
+        on_ready: called once the game has the window, e.g. to write the startup report
+    """
+    def __init__(self, pipeline: StartupPipeline, on_ready: Optional[Callable[[], None]] = None) -> None:
+        super().__init__()
+        self.pipeline = pipeline
+        self.on_ready = on_ready
+        self.label = arcade.Text(
+            pipeline.stage, WIDTH / 2, HEIGHT / 2 + PROGRESS_BAR_HEIGHT * 2,
+            arcade.color.WHITE, font_size=20, anchor_x="center",
+        )
+
+    def on_draw(self):
+        self.window.clear()
+        if self.label.text != self.pipeline.stage:
+            self.label.text = self.pipeline.stage
+        self.label.draw()
+        left = (WIDTH - PROGRESS_BAR_WIDTH) / 2
+        bottom = (HEIGHT - PROGRESS_BAR_HEIGHT) / 2
+        done = PROGRESS_BAR_WIDTH * self.pipeline.progress()
+        if done > 0:
+            arcade.draw_lrtb_rectangle_filled(left, left + done, bottom + PROGRESS_BAR_HEIGHT, bottom, arcade.color.WHITE)
+        arcade.draw_lrtb_rectangle_outline(left, left + PROGRESS_BAR_WIDTH, bottom + PROGRESS_BAR_HEIGHT, bottom, arcade.color.WHITE)
+        self.pipeline.frame_drawn()
+        return True
+
+    def on_update(self, delta_time: float):
+        if self.pipeline.step():
+            self.window.hide_view()
+            if self.on_ready is not None:
+                self.on_ready()
+        return True
+
+    # nothing to move or shoot yet
+    def on_key_press(self, symbol: int, modifiers: int):
+        return True
+
+    def on_key_release(self, symbol: int, modifiers: int):
+        return True
+
+    def on_mouse_press(self, x, y, button, modifiers):
+        return True
+
+    def on_mouse_motion(self, x, y, dx, dy):
+        return True
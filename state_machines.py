@@ -1,8 +1,10 @@
 from __future__ import annotations
 import arcade
 from typing import TYPE_CHECKING
-from typing import List
-from states import IdleState, SeekAndFleeState, State, WaitForPull
+from time import time
+from typing import ClassVar, List, Optional, Tuple
+from scheduler import ENTERED
+from states import NO_STATE, BeeStates, FighterStates, State
 
 
 if TYPE_CHECKING:
@@ -10,17 +12,106 @@ if TYPE_CHECKING:
     from fighter import Fighter, Sprite
     from swarm_of_bees import Bee
     from player import Player
+    from spatial import SpatialIndex
+    from steering import SteeringBatch
+    from snapshot import KinematicSnapshot
+    from scheduler import Scheduler
 
 
 
+class Blackboard:
+    """What one state machine remembers about the state it is in
+
+    States are shared between every enemy of a type, so anything that
+    belongs to one enemy lives here instead. change_state() resets it.
+    """
+    __slots__ = ('generation', 'entered_at', 'entry_health', 'once_done', 'destination_x', 'destination_y')
+
+    def __init__(self) -> None:
+        # goes up by one every change of state, so old timers can be told apart
+        self.generation = 0
+        # StateMachine.now() when the state was entered
+        self.entered_at = 0.0
+        # the sprite's health when the state was entered
+        self.entry_health = 0.0
+        # the state's once_activities have run
+        self.once_done = False
+        # where DestinationStates are heading
+        self.destination_x = 0.0
+        self.destination_y = 0.0
+
+
 class StateMachine:
     def __init__(self, sprite: Sprite):
         self.sprite = sprite
-        self.state = State()
+        self.state: State = NO_STATE
+        self.blackboard = Blackboard()
+        # shared per frame index of nearby sprites. Set by the game
+        # before awake(), activities fall back to brute force without it
+        self.spatial_index: Optional[SpatialIndex] = None
+        # batched numpy steering, None when numpy isn't installed
+        self.steering: Optional[SteeringBatch] = None
+        # positions and velocities of every body, captured once per tick
+        self.snapshot: Optional[KinematicSnapshot] = None
+        # runs transitions on events rather than every tick. Without
+        # one every transition is checked every update()
+        self.scheduler: Optional[Scheduler] = None
+
+    def _in_snapshot(self) -> bool:
+        return self.snapshot is not None and self.snapshot.has(self.sprite)
+
+    def position(self) -> Tuple[float, float]:
+        """Where the sprite is, read from the snapshot when there is one"""
+        if self._in_snapshot():
+            entity_id = self.sprite.entity_id
+            return self.snapshot.x[entity_id], self.snapshot.y[entity_id]
+        return self.sprite.center_x, self.sprite.center_y
+
+    def velocity(self) -> Tuple[float, float]:
+        """How fast the sprite is going, read from the snapshot when there is one"""
+        if self._in_snapshot():
+            return self.snapshot.velocity(self.sprite)
+        velocity = self.sprite.physics_body.velocity
+        return velocity.x, velocity.y
+
+    def body(self):
+        """The sprite's pymunk body, for writing to"""
+        if self._in_snapshot():
+            return self.snapshot.body(self.sprite)
+        return self.sprite.physics_body
+
+    def now(self) -> float:
+        """Simulation time from the scheduler, or the wall clock without one"""
+        if self.scheduler is not None:
+            return self.scheduler.now
+        return time()
+
+    def notify(self, events: int) -> None:
+        """Tell the scheduler something happened that transitions may care about"""
+        if self.scheduler is not None:
+            self.scheduler.notify(self, events)
+
+    def change_state(self, state: State) -> None:
+        """Leave the current state and enter state, which may be the same one"""
+        self.state.exit(self)
+        self.state = state
+        blackboard = self.blackboard
+        blackboard.generation += 1
+        blackboard.entered_at = self.now()
+        blackboard.entry_health = self.sprite.health
+        blackboard.once_done = False
+        state.enter(self)
+        # check the new state's transitions once, whatever they listen for
+        self.notify(ENTERED)
 
     def update(self):
         self.state.execute(self)
 
+    @classmethod
+    def state_graph(cls):
+        """The states every machine of this class shares, or None if it has none"""
+        return None
+
     def awake(self):
         pass
 
@@ -28,28 +119,44 @@ class StateMachine:
         pass
 
 class FighterStateMachine(StateMachine):
+    # every fighter shares one set of states, made by the first awake()
+    states: ClassVar[Optional[FighterStates]] = None
+
     def __init__(self, sprite: Fighter, physics_engine: arcade.PymunkPhysicsEngine, bullet_list: arcade.SpriteList, player_sprite: Player, rocks: arcade.SpriteList):
         super().__init__(sprite)
         self.target = player_sprite
-        self.flee_targets = []
+        # entity handles, see EntityRegistry
+        self.flee_targets: List[int] = []
         self.bullet_list = bullet_list
         self.physics_engine = physics_engine
         self.rocks = rocks
 
+    @classmethod
+    def state_graph(cls) -> FighterStates:
+        if FighterStateMachine.states is None:
+            FighterStateMachine.states = FighterStates()
+        return FighterStateMachine.states
+
     def awake(self):
-        self.state = SeekAndFleeState()
-        self.state.enter(self)
+        self.change_state(self.state_graph().initial)
 
 class BeeStateMachine(StateMachine):
+    # every bee shares one set of states, made by the first awake()
+    states: ClassVar[Optional[BeeStates]] = None
+
     def __init__(self, sprite: Bee, physics_engine: arcade.PymunkPhysicsEngine, player_sprite: Player):
         super().__init__(sprite)
         self.target = player_sprite
         self.physics_engine = physics_engine
-        self.other_bees: List[Bee] = []
-        self.state = WaitForPull(player_sprite)
+
+    @classmethod
+    def state_graph(cls) -> BeeStates:
+        if BeeStateMachine.states is None:
+            BeeStateMachine.states = BeeStates()
+        return BeeStateMachine.states
 
     def awake(self):
-        self.state.enter(self)
+        self.change_state(self.state_graph().initial)
 
 # Some of this should live in the enemy class
 # Handle some of the enemy behaviour
@@ -1,22 +1,25 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
-import random
 
 from constants import HEIGHT
+from rng import streams
 
 if TYPE_CHECKING:
-    from state_machines import FighterStateMachine, StateMachine 
+    from state_machines import FighterStateMachine, StateMachine
     from state_machines import BeeStateMachine
 
-import arcade
 from typing import List, Tuple
 from transitions import Transition
-from activities import AvoidObstaclesActivity, BaseActivity, PointInDirectionOfTravelActivity, Seek, Flee, PointTowardsTargetActivity, FireActivity, HealActivity
-from decisions import LowHealthDecision, TakenDamageDecision, TimeElapsedDecision, WithinRangeDecision, FullHealthDecision, SwarmPulledDecision
+from activities import AvoidObstaclesActivity, BaseActivity, PointInDirectionOfTravelActivity, Seek, SeekDestination, FleeNeighbours, PointTowardsTargetActivity, FireActivity, HealActivity, SwarmActivity
+from decisions import LowHealthDecision, TakenDamageDecision, TimeElapsedDecision, WithinRangeDecision, WithinRangeOfDestinationDecision, FullHealthDecision, SwarmPulledDecision
 
 # based on tutorial found here
 # https://pavcreations.com/finite-state-machine-for-ai-enemy-controller-in-2d/2/#BaseState-class
 
+# States are shared by every enemy of a type (see FighterStates and BeeStates),
+# so they must not keep anything about one enemy. Anything an enemy needs
+# to remember while in a state goes in its state machine's blackboard.
+
 class BaseState:
     def execute(self, state_machine: StateMachine): # pyright: ignore
         pass
@@ -30,14 +33,35 @@ class BaseState:
 class State(BaseState):
     def __init__(self):
         self.activities: List[BaseActivity] = []
+        # run once, the first time the state executes after being entered
+        self.once_activities: List[BaseActivity] = []
         self.transitions: List[Transition] = []
 
     def execute(self, state_machine: StateMachine):
+        blackboard = state_machine.blackboard
+        if not blackboard.once_done:
+            blackboard.once_done = True
+            for activity in self.once_activities:
+                activity.execute(state_machine)
+
         for activity in self.activities:
             activity.execute(state_machine)
 
+        # with a scheduler, only transitions that don't say what events
+        # they listen for are checked every tick. The rest wait for handle()
+        polled_only = state_machine.scheduler is not None
         for transition in self.transitions:
-            transition.execute(state_machine)
+            if polled_only and transition.decision.events:
+                continue
+            if transition.execute(state_machine):
+                # the rest of the transitions belong to the state we just left
+                return
+
+    def handle(self, state_machine: StateMachine, events: int):
+        """Check the transitions listening for any of events, see Scheduler"""
+        for transition in self.transitions:
+            if transition.decision.events & events and transition.execute(state_machine):
+                return
 
     def enter(self, state_machine: StateMachine):
         for activity in self.activities:
@@ -52,63 +76,58 @@ class State(BaseState):
             transition.exit(state_machine)
 
 
+# what a state machine is in before awake()
+NO_STATE = State()
+
 
 class IdleState(State):
     def enter(self, state_machine: StateMachine):
         super().enter(state_machine)
-        state_machine.sprite.physics_body.velocity = (0, 0)
+        state_machine.body().velocity = (0, 0)
 
 
 class SeekAndFleeState(State):
-    def enter(self, state_machine: FighterStateMachine):
-        self.activities.append(Seek(state_machine.target))
+    def __init__(self):
+        super().__init__()
+        self.activities.append(Seek())
         self.activities.append(PointInDirectionOfTravelActivity())
-        self.activities.append(AvoidObstaclesActivity(state_machine.rocks))
-
-        for flee_target in state_machine.flee_targets:
-            self.activities.append(Flee(flee_target))
-
-        self.transitions.append(
-            Transition(
-                LowHealthDecision(10), 
-                FleeFromPlayer((state_machine.sprite.center_x + 1500, random.randint(0, HEIGHT))), 
-                None
-            )
-        )
-        self.transitions.append(
-            Transition(
-                WithinRangeDecision(state_machine.target, outer_limit=800), 
-                PointAndShoot(), 
-                None
-            )
-        )
+        self.activities.append(AvoidObstaclesActivity())
+        self.activities.append(FleeNeighbours('fighters'))
 
     def __str__(self) -> str:
         return "Seeking Player"
 
-class NavigateToPointState(State):
-    def __init__(self, target: Tuple[float, float]):
+
+class DestinationState(State):
+    """Head for a point worked out from where the sprite is when it enters the state
+
+    Args:
+        dx: how far along x from the sprite the point is
+
+        random_y: pick a random y for the point rather than keeping the sprite's
+    """
+    def __init__(self, dx: float, random_y: bool = True):
         super().__init__()
-        self.target = arcade.Sprite(center_x=target[0], center_y=target[1])
-    
-    def enter(self, state_machine: StateMachine):
-        self.activities.append(
-            Seek(target=self.target)
-        )
+        self.dx = dx
+        self.random_y = random_y
+        self.activities.append(SeekDestination())
         self.activities.append(PointInDirectionOfTravelActivity())
-        self.activities.append(AvoidObstaclesActivity(state_machine.rocks))
+        self.activities.append(AvoidObstaclesActivity())
+
+    def enter(self, state_machine: StateMachine):
+        blackboard = state_machine.blackboard
+        blackboard.destination_x = state_machine.sprite.center_x + self.dx
+        if self.random_y:
+            blackboard.destination_y = streams.ai.randint(0, HEIGHT)
+        else:
+            blackboard.destination_y = state_machine.sprite.center_y
+        super().enter(state_machine)
 
-        self.transitions.append(
-            Transition(
-                WithinRangeDecision(self.target, 300),
-                SeekAndFleeState(),
-                None 
-            )
-        )
 
+class NavigateToPointState(DestinationState):
     def __str__(self) -> str:
         return "Run away!!"
-                    
+
 class PatrolState(State):
     def __init__(self, patrol_points: List[Tuple[int, int]], speed=1):
         super().__init__()
@@ -117,137 +136,113 @@ class PatrolState(State):
         # self.activities.append(PatrolToPointActivity())
 
 
-class FleeFromPlayer(State):
-    def __init__(self, target: Tuple[float, float]):
-        super().__init__()
-        self.target = arcade.Sprite(center_x=target[0], center_y=target[1])
-    
-    def enter(self, state_machine: StateMachine):
-        self.activities.append(
-            Seek(target=self.target)
-        )
-        self.activities.append(PointInDirectionOfTravelActivity())
-        self.activities.append(AvoidObstaclesActivity(state_machine.rocks))
-
-        self.transitions.append(
-            Transition(
-                WithinRangeDecision(self.target, 400),
-                Heal(),
-                None 
-            )
-        )
-
+class FleeFromPlayer(DestinationState):
     def __str__(self) -> str:
         return "Fleeing!!"
 
 
 class PointAndShoot(State):
-    """Constantly point towards the target and fire when possible"""
-    def enter(self, state_machine: FighterStateMachine):
-        self.activities.append(FireActivity())
-        self.activities.append(PointTowardsTargetActivity(state_machine.target))
-        self.transitions.append(
-            Transition(
-                TimeElapsedDecision(1.8),
-                PointAndShoot(),
-                None
-            )
-        )
-        self.transitions.append(
-            Transition(
-                LowHealthDecision(10), 
-                FleeFromPlayer((state_machine.sprite.center_x + 2000, state_machine.sprite.center_y)), 
-                None
-            )
-        )
-        self.transitions.append(
-            Transition(
-                TakenDamageDecision(state_machine.sprite.health), 
-                NavigateToPointState((state_machine.sprite.center_x + 750, random.randint(0, HEIGHT))), 
-                None
-            )
-        )
+    """Constantly point towards the target and fire once each time the state is entered"""
+    def __init__(self):
+        super().__init__()
+        self.once_activities.append(FireActivity())
+        self.activities.append(PointTowardsTargetActivity())
 
     def execute(self, state_machine: StateMachine):
         super().execute(state_machine)
-        for activity in self.activities:
-            if type(activity) == FireActivity:
-                self.activities.remove(activity)
-        state_machine.sprite.physics_body.velocity *= 0.99
+        state_machine.body().velocity *= 0.99
 
     def __str__(self) -> str:
         return "Firing!"
 
 
 class Heal(State):
-    def enter(self, state_machine: FighterStateMachine):
-        self.activities.append(HealActivity())
-        self.transitions.append(
-            Transition(
-                TimeElapsedDecision(1.2),
-                Heal(), 
-                None
-            )
-        )
-        self.transitions.append(
-            Transition(
-                TakenDamageDecision(state_machine.sprite.health), 
-                NavigateToPointState((state_machine.sprite.center_x + 750, random.randint(0, HEIGHT))), 
-                None
-            )
-        )
-        self.transitions.append(
-            Transition(
-                FullHealthDecision(), 
-                SeekAndFleeState(), 
-                None
-            )
-        )
+    def __init__(self):
+        super().__init__()
+        self.once_activities.append(HealActivity())
 
     def execute(self, state_machine: StateMachine):
         super().execute(state_machine)
-        for activity in self.activities:
-            if type(activity) == HealActivity:
-                self.activities.remove(activity)
-        state_machine.sprite.physics_body.velocity *= 0.99
+        state_machine.body().velocity *= 0.99
 
     def __str__(self) -> str:
         return "healing"
 
 class SwarmState(State):
-    def enter(self, state_machine: BeeStateMachine):
-        state_machine.sprite.swarm.pulled = True
-        self.activities.append(Seek(state_machine.target)) # TODO add distance, strength
+    def __init__(self):
+        super().__init__()
+        self.activities.append(Seek()) # TODO add distance, strength
         self.activities.append(PointInDirectionOfTravelActivity())
+        # cohesion and separation for the whole swarm, see Swarm.update()
+        self.activities.append(SwarmActivity())
 
-        for flee_target in state_machine.other_bees: # TODO add distance, strength
-            self.activities.append(Flee(flee_target))
-
-        for other_bee in state_machine.other_bees: # TODO add distance, strength
-            self.activities.append(Seek(other_bee))
+    def enter(self, state_machine: BeeStateMachine):
+        state_machine.sprite.swarm.pull()
+        super().enter(state_machine)
 
     def __str__(self) -> str:
         return "Seeking Player"
 
 class WaitForPull(IdleState):
-    def __init__(self, target):
-        super().__init__()
-        self.target = target
-
-    def enter(self, state_machine):
-        super().enter(state_machine)
-        self.transitions.append(
-            Transition(
-                WithinRangeDecision(self.target, 500), 
-                SwarmState(),
-                None
-            )
+    pass
+
+
+def graph_states(graph) -> List[State]:
+    """Every state in a state graph such as FighterStates, always in the same order
+
+    A state's place in this list is its id in saved worlds, see world_state.py
+    """
+    states: List[State] = []
+    for value in vars(graph).values():
+        if isinstance(value, State) and value not in states:
+            states.append(value)
+    return states
+
+
+class FighterStates:
+    """The state graph every fighter shares. Built once, see FighterStateMachine.awake"""
+    def __init__(self) -> None:
+        self.seek_and_flee = SeekAndFleeState()
+        self.point_and_shoot = PointAndShoot()
+        self.heal = Heal()
+        self.navigate = NavigateToPointState(dx=750)
+        # running from the player while seeking goes further, and to a random height
+        self.flee_while_seeking = FleeFromPlayer(dx=1500)
+        self.flee_while_shooting = FleeFromPlayer(dx=2000, random_y=False)
+
+        self.seek_and_flee.transitions.extend((
+            Transition(LowHealthDecision(10), self.flee_while_seeking, None),
+            Transition(WithinRangeDecision(outer_limit=800), self.point_and_shoot, None),
+        ))
+        self.navigate.transitions.append(
+            Transition(WithinRangeOfDestinationDecision(300), self.seek_and_flee, None)
         )
-        self.transitions.append(
-            Transition(
-                SwarmPulledDecision(state_machine.sprite.swarm), 
-                SwarmState(),
-                None
+        for flee in (self.flee_while_seeking, self.flee_while_shooting):
+            flee.transitions.append(
+                Transition(WithinRangeOfDestinationDecision(400), self.heal, None)
             )
-        )
-
+        self.point_and_shoot.transitions.extend((
+            # enter again to fire again
+            Transition(TimeElapsedDecision(1.8), self.point_and_shoot, None),
+            Transition(LowHealthDecision(10), self.flee_while_shooting, None),
+            Transition(TakenDamageDecision(), self.navigate, None),
+        ))
+        self.heal.transitions.extend((
+            # enter again to heal again
+            Transition(TimeElapsedDecision(1.2), self.heal, None),
+            Transition(TakenDamageDecision(), self.navigate, None),
+            Transition(FullHealthDecision(), self.seek_and_flee, None),
+        ))
+        self.initial = self.seek_and_flee
+
+
+class BeeStates:
+    """The state graph every bee shares. Built once, see BeeStateMachine.awake"""
+    def __init__(self) -> None:
+        self.wait_for_pull = WaitForPull()
+        self.swarm = SwarmState()
+        self.wait_for_pull.transitions.extend((
+            Transition(WithinRangeDecision(outer_limit=500), self.swarm, None),
+            Transition(SwarmPulledDecision(), self.swarm, None),
+        ))
+        self.initial = self.wait_for_pull
@@ -0,0 +1,231 @@
+from __future__ import annotations
+import math
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy is optional. Without it the game makes no SteeringBatch and
+    # the activities fall back to doing their own Vec2 maths
+    np = None
+
+if TYPE_CHECKING:
+    from fighter import Enemy
+    from snapshot import KinematicSnapshot
+
+
+def steering_available() -> bool:
+    return np is not None
+
+
+class SteeringBatch:
+    """Collects seek and flee requests from every enemy and solves them in one go
+
+    Seek, Flee, FleeNeighbours and AvoidObstaclesActivity call seek() or flee()
+    here instead of building Vec2 forces when the state machine has a batch.
+    solve() then works out every force with numpy, sums them per enemy and
+    applies the totals to the pymunk bodies. Call it once per frame after the
+    state machines have run.
+
+    The maths is the same as the activities, including the arrive scaling in Seek.
+    Note the Vec2 path calls force.limit() without keeping the result, so forces
+    there are never actually limited. The batch does the same unless limit_forces
+    is set, in which case each force and each total is limited to max_force.
+
+    With hold_forces set, each sprite's last net force is applied again every
+    solve() until the sprite asks for something new or forget() is called.
+    This is for sprites whose AI doesn't run every tick, see AILevelOfDetail.
+
+    Forces worked out somewhere else, e.g. by ParallelSwarmAI, are handed
+    over with add_solved() and applied and held the same way.
+
+    Args:
+        limit_forces: limit forces to the sprite's max_force
+
+        hold_forces: keep applying each sprite's last force between its updates
+    """
+    def __init__(self, limit_forces: bool = False, hold_forces: bool = False) -> None:
+        self.limit_forces = limit_forces
+        self.hold_forces = hold_forces
+        # sprite -> the last net force it was given
+        self.held: Dict[Enemy, Tuple[float, float]] = {}
+        # when set, positions, velocities and bodies are read from here
+        self.snapshot: Optional[KinematicSnapshot] = None
+        self.clear()
+
+    def clear(self) -> None:
+        # one row per enemy that asked for something this frame
+        self.rows: Dict[Enemy, int] = {}
+        self.sprites: List[Enemy] = []
+        self.bodies = []
+        self.position: List[float] = []
+        self.velocity: List[float] = []
+        self.max_speed: List[float] = []
+        self.max_force: List[float] = []
+        # sprite -> (body, net force) from add_solved()
+        self.solved: Dict[Enemy, Tuple[object, Tuple[float, float]]] = {}
+
+        # one entry per request
+        self.owner: List[int] = []
+        self.target: List[float] = []
+        self.is_flee: List[bool] = []
+        # 0 means don't arrive
+        self.slow_radius: List[float] = []
+        # flee only inside this distance
+        self.flee_range: List[float] = []
+        # nan means use the sprite's max_speed
+        self.speed: List[float] = []
+
+    def kinematics(self, sprite: Enemy):
+        """The body, position and velocity seek() and flee() work from, as (body, x, y, vx, vy)"""
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.has(sprite):
+            entity_id = sprite.entity_id
+            return snapshot.bodies[entity_id], snapshot.x[entity_id], snapshot.y[entity_id], snapshot.vx[entity_id], snapshot.vy[entity_id]
+        body = sprite.physics_body
+        return body, sprite.center_x, sprite.center_y, body.velocity.x, body.velocity.y
+
+    def _row(self, sprite: Enemy) -> int:
+        row = self.rows.get(sprite)
+        if row is None:
+            row = self.rows[sprite] = len(self.sprites)
+            self.sprites.append(sprite)
+            body, x, y, vx, vy = self.kinematics(sprite)
+            self.bodies.append(body)
+            self.position.extend((x, y))
+            self.velocity.extend((vx, vy))
+            self.max_speed.append(sprite.max_speed)
+            self.max_force.append(sprite.max_force)
+        return row
+
+    def seek(self, sprite: Enemy, x: float, y: float, arrive: bool = True, slow_radius: float = 400) -> None:
+        """Same as Seek.execute for a target at (x, y)"""
+        self.owner.append(self._row(sprite))
+        self.target.extend((x, y))
+        self.is_flee.append(False)
+        self.slow_radius.append(slow_radius if arrive else 0)
+        self.flee_range.append(math.inf)
+        self.speed.append(math.nan)
+
+    def flee(self, sprite: Enemy, x: float, y: float, _range: float = math.inf, speed: float = math.nan) -> None:
+        """Same as Flee.execute for a target at (x, y)
+
+        Args:
+            _range: only flee if the target is at most this far away
+
+            speed: the desired speed, defaults to the sprite's max_speed
+        """
+        self.owner.append(self._row(sprite))
+        self.target.extend((x, y))
+        self.is_flee.append(True)
+        self.slow_radius.append(0)
+        self.flee_range.append(_range)
+        self.speed.append(speed)
+
+    def add_solved(self, sprite: Enemy, body, fx: float, fy: float) -> None:
+        """Apply a net force for sprite worked out elsewhere at the next solve(), as if it had been asked for here"""
+        self.solved[sprite] = (body, (fx, fy))
+
+    def forget(self, sprite: Enemy) -> None:
+        """Stop holding sprite's last force, e.g. because its AI is about to run again"""
+        self.held.pop(sprite, None)
+
+    def solve(self) -> None:
+        """Work out every requested force and apply the totals to the bodies"""
+        if self.owner:
+            forces = self.compute()
+            for sprite, body, (fx, fy) in zip(self.sprites, self.bodies, forces.tolist()):
+                self._apply(sprite, body, fx, fy)
+        for sprite, (body, (fx, fy)) in self.solved.items():
+            self._apply(sprite, body, fx, fy)
+        if self.held:
+            self.apply_held()
+        self.clear()
+
+    def _apply(self, sprite: Enemy, body, fx: float, fy: float) -> None:
+        # the enemy may have been killed since it asked
+        if sprite.physics_engines:
+            body.apply_force_at_world_point((fx, fy), (sprite.center_x, sprite.center_y))
+            if self.hold_forces:
+                self.held[sprite] = (fx, fy)
+
+    def apply_held(self) -> None:
+        """Push every sprite that didn't ask for anything this tick with its last force"""
+        dead = []
+        for sprite, force in self.held.items():
+            if sprite in self.rows or sprite in self.solved:
+                continue
+            if not sprite.physics_engines:
+                dead.append(sprite)
+                continue
+            sprite.physics_body.apply_force_at_world_point(force, (sprite.center_x, sprite.center_y))
+        for sprite in dead:
+            del self.held[sprite]
+
+    def compute(self):
+        """The net force on each row as an (n, 2) array"""
+        return steering_forces(
+            np.array(self.owner, dtype=np.intp),
+            np.array(self.position).reshape(-1, 2),
+            np.array(self.velocity).reshape(-1, 2),
+            np.array(self.max_speed),
+            np.array(self.max_force),
+            np.array(self.target).reshape(-1, 2),
+            np.array(self.is_flee),
+            np.array(self.slow_radius),
+            np.array(self.flee_range),
+            np.array(self.speed),
+            self.limit_forces,
+        )
+
+
+def steering_forces(owner, position, velocity, max_speed, max_force, target, is_flee, slow_radius, flee_range, speed, limit_forces: bool = False):
+    """The net force on each row as an (n, 2) array, see SteeringBatch
+
+    Row arrays (position, velocity, max_speed, max_force) have one entry per
+    sprite and the rest one per request, with owner giving each request's row.
+    A row's forces are added up in the order they were requested, so the same
+    requests give exactly the same total wherever this is run.
+    """
+    n = len(max_speed)
+    position = position[owner]
+    velocity = velocity[owner]
+    row_max_speed = max_speed[owner]
+
+    offset = target - position
+    offset[is_flee] *= -1
+    distance = np.hypot(offset[:, 0], offset[:, 1])
+
+    # Seek slows down (well, speeds up) inside the slow radius
+    with np.errstate(divide='ignore', invalid='ignore'):
+        arriving = (distance < slow_radius) & (distance > 0)
+        desired = np.where(arriving, row_max_speed * slow_radius / distance, row_max_speed)
+        desired = np.where(np.isnan(speed), desired, speed)
+        # Vec2.from_magnitude leaves a zero vector alone
+        direction = np.where(distance[:, None] > 0, offset / distance[:, None], 0.0)
+    force = direction * desired[:, None] - velocity
+
+    # a sprite already on its seek target gets no seek force
+    force[~is_flee & (distance == 0)] = 0.0
+
+    # flee only counts when the target is in range
+    out_of_range = is_flee & (distance > flee_range)
+    force[out_of_range] = 0.0
+
+    if limit_forces:
+        force = _limit(force, max_force[owner])
+
+    net = np.empty((n, 2))
+    net[:, 0] = np.bincount(owner, weights=force[:, 0], minlength=n)
+    net[:, 1] = np.bincount(owner, weights=force[:, 1], minlength=n)
+
+    if limit_forces:
+        net = _limit(net, max_force)
+    return net
+
+
+def _limit(force, maximum):
+    magnitude = np.hypot(force[:, 0], force[:, 1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.where(magnitude > maximum, maximum / magnitude, 1.0)
+    return force * scale[:, None]
@@ -1,44 +1,88 @@
 from state_machines import BeeStateMachine
-from random import randint
+from typing import List, Tuple
 import arcade
+from constants import BEE_SEPARATION_RANGE
 from fighter import Enemy
 from player import Player
+from scheduler import SWARM
+from registry import entities
+from rng import streams
+from spatial import SpatialIndex
 
 class Swarm:
-    """A container for bees to keep them attracted to 
+    """A container for bees to keep them attracted to
     each other
-    
+
     Assits in the initialisation for scene, physics engine etc.
+
+    Once pulled, update() works out the centre of the swarm and a small grid
+    of where each bee is. Each bee's SwarmActivity then seeks the centre and
+    flees from the bees in the next cells over, so the cost grows with the
+    number of bees rather than with the number of pairs of bees.
     """
-    def __init__(self, x: float, y: float, level: int, size: int, physics_engine: arcade.PymunkPhysicsEngine, player: Player, scene) -> None:
+    def __init__(self, x: float, y: float, level: int, size: int, physics_engine: arcade.PymunkPhysicsEngine, player: Player, scene, separation_range: float = BEE_SEPARATION_RANGE) -> None:
         # make lots of bees
-        self.bees = []
+        self.bees: List[Bee] = []
         self.pulled = False
+        self.separation_range = separation_range
+        self.centre: Tuple[float, float] = (x, y)
+        # cells are as big as the separation range, so neighbours are
+        # always in the 3x3 block of cells around a bee
+        self.grid = SpatialIndex(cell_size=separation_range)
         for _ in range(size):
-            bee = Bee(x + randint(-90, 90), y + randint(-90, 90), level, self)
-            self.bees.append(bee)
-            bee.state_machine = BeeStateMachine(bee, physics_engine, player)
-            physics_engine.add_sprite(
-                bee, 
-                mass=bee.mass, 
-                collision_type='bee', 
-                max_velocity=bee.max_velocity, # TODO All of these litterals SHOULD be constants...
-                moment_of_inertia=100, 
-                damping=0.9
-            )
-            bee.state_machine.awake()
-
-        # add other bees in swarm to each bee
+            self.add_bee(x + streams.world.randint(-90, 90), y + streams.world.randint(-90, 90), level, physics_engine, player, scene)
+
+    def add_bee(self, x: float, y: float, level: int, physics_engine: arcade.PymunkPhysicsEngine, player: Player, scene) -> 'Bee':
+        """Make a bee in this swarm and add it to the physics engine. It joins the scene at the next entities.flush()"""
+        bee = Bee(x, y, level, self)
+        self.bees.append(bee)
+        bee.state_machine = BeeStateMachine(bee, physics_engine, player)
+        physics_engine.add_sprite(
+            bee,
+            mass=bee.mass,
+            collision_type='bee',
+            max_velocity=bee.max_velocity, # TODO All of these litterals SHOULD be constants...
+            moment_of_inertia=100,
+            damping=0.9
+        )
+        entities.spawn(bee, scene['enemies'])
+        return bee
+
+    def update(self) -> None:
+        """Work out the centre and neighbour grid for this AI tick. Run once per AI tick"""
+        if not self.pulled:
+            return
+        # forget bees that have been killed
+        self.bees = [bee for bee in self.bees if entities.get(bee.handle) is bee]
+        if not self.bees:
+            return
+        total_x = 0.0
+        total_y = 0.0
+        self.grid.clear()
         for bee in self.bees:
-            for other_bee in self.bees:
-                if other_bee is not bee:
-                    bee.other_bees.append(other_bee)
+            total_x += bee.center_x
+            total_y += bee.center_y
+            self.grid.insert('bees', bee)
+        self.centre = (total_x / len(self.bees), total_y / len(self.bees))
+
+    def pull(self) -> None:
+        """Set the whole swarm on the player and let every bee know"""
+        if self.pulled:
+            return
+        self.pulled = True
         for bee in self.bees:
-            scene['enemies'].append(bee)
+            bee.state_machine.notify(SWARM)
+
+    def neighbours(self, bee: 'Bee') -> List['Bee']:
+        """The other bees within separation_range of bee"""
+        return [
+            other for other in self.grid.neighbours('bees', bee.center_x, bee.center_y, self.separation_range)
+            if other is not bee
+        ]
 
     def kill(self):
         for bee in self.bees:
-            bee.kill()
+            entities.despawn(bee)
 
 
 class Bee(Enemy):
@@ -51,6 +95,5 @@ class Bee(Enemy):
              level=level,
         )
         self.swarm = swarm
-        self.other_bees = []
         self.mass = 0.1
         self.max_velocity = 200
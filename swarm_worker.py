@@ -0,0 +1,159 @@
+"""The worker side of ParallelSwarmAI, see parallel_ai.py
+
+Only needs numpy and steering.py, so worker processes never import arcade.
+"""
+from __future__ import annotations
+import math
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from steering import steering_forces
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if TYPE_CHECKING:
+    from multiprocessing import shared_memory
+
+# Layout of the shared block, all float64:
+#   header  swarm count, grid count, due count, player x, player y, limit forces
+#   swarms  centre x, centre y, separation range, first grid row, grid rows
+#   grid    x, y of every bee in a swarm's grid, swarm by swarm
+#   due     x, y, vx, vy, max speed, max force, grid row, swarm
+#   forces  fx, fy for each due bee, written by whoever solves it
+HEADER_SIZE = 6
+SWARM_COLUMNS = 5
+GRID_COLUMNS = 2
+DUE_COLUMNS = 8
+FORCE_COLUMNS = 2
+
+# Seek() and SwarmActivity's seek_towards() defaults
+SLOW_RADIUS = 400.0
+
+
+def tables(buffer, swarm_count: int, grid_count: int, due_count: int):
+    """numpy views of each table in buffer"""
+    sizes = (HEADER_SIZE, swarm_count * SWARM_COLUMNS, grid_count * GRID_COLUMNS, due_count * DUE_COLUMNS, due_count * FORCE_COLUMNS)
+    views = []
+    offset = 0
+    for size in sizes:
+        views.append(np.ndarray((size,), dtype=np.float64, buffer=buffer, offset=offset * 8))
+        offset += size
+    header, swarms, grid, due, forces = views
+    return (
+        header,
+        swarms.reshape(-1, SWARM_COLUMNS),
+        grid.reshape(-1, GRID_COLUMNS),
+        due.reshape(-1, DUE_COLUMNS),
+        forces.reshape(-1, FORCE_COLUMNS),
+    )
+
+
+def block_size(swarm_count: int, grid_count: int, due_count: int) -> int:
+    return 8 * (HEADER_SIZE + swarm_count * SWARM_COLUMNS + grid_count * GRID_COLUMNS + due_count * (DUE_COLUMNS + FORCE_COLUMNS))
+
+
+def _neighbours(cells: Dict[Tuple[int, int], List[int]], xs: List[float], ys: List[float], x: float, y: float, radius: float) -> List[int]:
+    """Grid rows within radius of (x, y), in the same order as SpatialIndex.neighbours"""
+    radius_squared = radius * radius
+    found = []
+    for cx in range(int((x - radius) // radius), int((x + radius) // radius) + 1):
+        for cy in range(int((y - radius) // radius), int((y + radius) // radius) + 1):
+            cell = cells.get((cx, cy))
+            if cell is None:
+                continue
+            for row in cell:
+                dx = xs[row] - x
+                dy = ys[row] - y
+                if dx * dx + dy * dy <= radius_squared:
+                    found.append(row)
+    return found
+
+
+def solve_rows(buffer, start: int, stop: int) -> None:
+    """Work out the forces for due rows start to stop of the block in buffer
+
+    Asks for exactly what SwarmState asks the SteeringBatch for, in the same
+    order, so the forces come out the same to the last bit.
+    """
+    header = np.ndarray((HEADER_SIZE,), dtype=np.float64, buffer=buffer)
+    swarm_count, grid_count, due_count = (int(value) for value in header[:3])
+    header, swarms, grid, due, forces = tables(buffer, swarm_count, grid_count, due_count)
+    player_x, player_y = float(header[3]), float(header[4])
+    limit_forces = bool(header[5])
+    xs = grid[:, 0].tolist()
+    ys = grid[:, 1].tolist()
+    swarm_rows = swarms.tolist()
+    rows = due[start:stop].tolist()
+    if not rows:
+        return
+
+    # each swarm's grid, made the same way as Swarm.update() makes it
+    cells_by_swarm: Dict[int, Dict[Tuple[int, int], List[int]]] = {}
+    owner: List[int] = []
+    target: List[float] = []
+    is_flee: List[bool] = []
+    slow_radius: List[float] = []
+    flee_range: List[float] = []
+    speed: List[float] = []
+    for row, (_, _, _, _, _, _, grid_row, swarm) in enumerate(rows):
+        swarm = int(swarm)
+        centre_x, centre_y, separation, first, count = swarm_rows[swarm]
+        cells = cells_by_swarm.get(swarm)
+        if cells is None:
+            cells = cells_by_swarm[swarm] = {}
+            for other in range(int(first), int(first + count)):
+                key = (int(xs[other] // separation), int(ys[other] // separation))
+                cell = cells.get(key)
+                if cell is None:
+                    cells[key] = [other]
+                else:
+                    cell.append(other)
+        # Seek() towards the player, then SwarmActivity
+        owner.extend((row, row))
+        target.extend((player_x, player_y, centre_x, centre_y))
+        is_flee.extend((False, False))
+        slow_radius.extend((SLOW_RADIUS, SLOW_RADIUS))
+        flee_range.extend((math.inf, math.inf))
+        speed.extend((math.nan, math.nan))
+        grid_row = int(grid_row)
+        for other in _neighbours(cells, xs, ys, xs[grid_row], ys[grid_row], separation):
+            if other == grid_row:
+                continue
+            owner.append(row)
+            target.extend((xs[other], ys[other]))
+            is_flee.append(True)
+            slow_radius.append(0)
+            flee_range.append(math.inf)
+            speed.append(math.nan)
+
+    due_rows = np.array(rows)
+    forces[start:stop] = steering_forces(
+        np.array(owner, dtype=np.intp),
+        due_rows[:, 0:2].copy(),
+        due_rows[:, 2:4].copy(),
+        due_rows[:, 4].copy(),
+        due_rows[:, 5].copy(),
+        np.array(target).reshape(-1, 2),
+        np.array(is_flee),
+        np.array(slow_radius),
+        np.array(flee_range),
+        np.array(speed),
+        limit_forces,
+    )
+
+
+# the block a worker last attached to, kept open between ticks
+_attached: Optional[shared_memory.SharedMemory] = None
+
+
+def solve_in_worker(job: Tuple[str, int, int]) -> None:
+    global _attached
+    name, start, stop = job
+    if _attached is None or _attached.name != name:
+        from multiprocessing import shared_memory
+        if _attached is not None:
+            _attached.close()
+        _attached = shared_memory.SharedMemory(name=name)
+    solve_rows(_attached.buf, start, stop)
@@ -0,0 +1,165 @@
+"""The batched steering forces should match what the Vec2 activities work out
+
+Run with python -m pytest. Needs numpy and arcade, skipped without them.
+"""
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("arcade")
+
+from pyglet.math import Vec2
+
+from activities import Flee, flee_from, seek_towards
+from constants import BEE_SEPARATION_RANGE
+from steering import SteeringBatch
+from swarm_worker import SLOW_RADIUS, block_size, solve_rows, tables
+
+
+class Velocity:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class Body:
+    def __init__(self, vx, vy):
+        self.velocity = Velocity(vx, vy)
+
+
+class Sprite:
+    """Just enough of an Enemy for the activities and SteeringBatch"""
+    def __init__(self, x, y, vx=0.0, vy=0.0, max_speed=300.0, max_force=1000.0):
+        self.center_x = x
+        self.center_y = y
+        self.max_speed = max_speed
+        self.max_force = max_force
+        self.physics_body = Body(vx, vy)
+        self.physics_engines = [None]
+        self.forces = []
+
+
+class StateMachine:
+    def __init__(self, sprite, steering=None):
+        self.sprite = sprite
+        self.steering = steering
+
+    def position(self):
+        return self.sprite.center_x, self.sprite.center_y
+
+    def velocity(self):
+        velocity = self.sprite.physics_body.velocity
+        return velocity.x, velocity.y
+
+
+class Target:
+    def __init__(self, x, y):
+        self.center_x = x
+        self.center_y = y
+
+
+def net_force(sprite):
+    """Add up a sprite's Vec2 forces the way Enemy.pymunk_moved does"""
+    net = Vec2()
+    for force in sprite.forces:
+        net += force
+    return net.x, net.y
+
+
+def make_enemies():
+    return [
+        Sprite(100, 100, 10, -5),
+        Sprite(400, 250, -40, 30, max_speed=200),
+        # sitting right on the seek target
+        Sprite(600, 500, 3, 4),
+        Sprite(900, 120),
+    ]
+
+
+def behave(state_machine, player, rocks):
+    """A mix of seeking and fleeing, as the states ask for it"""
+    seek_towards(state_machine, player.center_x, player.center_y)
+    seek_towards(state_machine, player.center_x, player.center_y, arrive=False)
+    for rock in rocks:
+        Flee(rock, 200).execute(state_machine)
+    flee_from(state_machine, player)
+
+
+def test_batch_matches_vec2():
+    player = Target(600, 500)
+    rocks = [Target(150, 80), Target(420, 420), Target(2000, 2000)]
+
+    enemies = make_enemies()
+    for enemy in enemies:
+        behave(StateMachine(enemy), player, rocks)
+    expected = [net_force(enemy) for enemy in enemies]
+
+    batch = SteeringBatch()
+    enemies = make_enemies()
+    for enemy in enemies:
+        behave(StateMachine(enemy, batch), player, rocks)
+    forces = batch.compute().tolist()
+
+    assert batch.sprites == enemies
+    for (fx, fy), (ex, ey) in zip(forces, expected):
+        assert fx == pytest.approx(ex, abs=1e-6)
+        assert fy == pytest.approx(ey, abs=1e-6)
+
+
+def test_seek_on_target_gives_no_force():
+    sprite = Sprite(50, 50, 7, 7)
+    seek_towards(StateMachine(sprite), 50, 50)
+    assert sprite.forces == []
+
+    batch = SteeringBatch()
+    seek_towards(StateMachine(Sprite(50, 50, 7, 7), batch), 50, 50)
+    assert batch.compute().tolist() == [[0.0, 0.0]]
+
+
+def swarm_forces_vec2(bees, player, centre):
+    """What SwarmState's Seek and SwarmActivity ask each bee for"""
+    expected = []
+    for bee in bees:
+        state_machine = StateMachine(bee)
+        seek_towards(state_machine, player.center_x, player.center_y, True, SLOW_RADIUS)
+        seek_towards(state_machine, centre[0], centre[1])
+        for other in bees:
+            if other is not bee and math.dist((bee.center_x, bee.center_y), (other.center_x, other.center_y)) <= BEE_SEPARATION_RANGE:
+                flee_from(state_machine, other)
+        expected.append(net_force(bee))
+    return expected
+
+
+def swarm_forces_worker(bees, player, centre):
+    """The same forces through the worker's solve_rows()"""
+    count = len(bees)
+    buffer = bytearray(block_size(1, count, count))
+    header, swarms, grid, due, forces = tables(buffer, 1, count, count)
+    header[:] = (1, count, count, player.center_x, player.center_y, 0)
+    swarms[0] = (centre[0], centre[1], BEE_SEPARATION_RANGE, 0, count)
+    for row, bee in enumerate(bees):
+        velocity = bee.physics_body.velocity
+        grid[row] = (bee.center_x, bee.center_y)
+        due[row] = (bee.center_x, bee.center_y, velocity.x, velocity.y, bee.max_speed, bee.max_force, row, 0)
+    solve_rows(buffer, 0, count)
+    return forces.tolist()
+
+
+@pytest.mark.parametrize("positions", [
+    [(1000, 300), (1030, 310), (1010, 350), (1200, 320), (990, 290)],
+    # the last bee left, sitting on the swarm's centre
+    [(1000, 300)],
+])
+def test_solve_rows_matches_vec2(positions):
+    player = Target(500, 400)
+    bees = [Sprite(x, y, 5 * row, -3 * row) for row, (x, y) in enumerate(positions)]
+    centre = (
+        sum(bee.center_x for bee in bees) / len(bees),
+        sum(bee.center_y for bee in bees) / len(bees),
+    )
+
+    expected = swarm_forces_vec2(bees, player, centre)
+    for (fx, fy), (ex, ey) in zip(swarm_forces_worker(bees, player, centre), expected):
+        assert fx == pytest.approx(ex, abs=1e-6)
+        assert fy == pytest.approx(ey, abs=1e-6)
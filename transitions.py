@@ -11,19 +11,19 @@ class Transition:
         self.true_state = true_state
         self.false_state = false_state
 
-    def execute(self, state_machine: StateMachine):
+    def execute(self, state_machine: StateMachine) -> bool:
+        """Change state if the decision says so. Returns True if the state changed"""
         if self.decision.decide(state_machine) and self.true_state:
-            state_machine.state.exit(state_machine)
-            state_machine.state = self.true_state
-            state_machine.state.enter(state_machine)
+            state_machine.change_state(self.true_state)
+            return True
 
         elif self.false_state:
-            state_machine.state.exit(state_machine)
-            state_machine.state = self.false_state
-            state_machine.state.enter(state_machine)
+            state_machine.change_state(self.false_state)
+            return True
+        return False
 
     def enter(self, state_machine: StateMachine):
-        pass
+        self.decision.enter(state_machine)
     
     def exit(self, state_machine: StateMachine):
         pass
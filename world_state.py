@@ -0,0 +1,418 @@
+"""Saving the whole world in a flat, packed form and putting it back
+
+A WorldState holds one row per body in the physics engine, stored as
+columns (array('d') and friends) rather than as objects. to_bytes() lays
+the columns end to end after a small header, each starting on an 8 byte
+boundary, so load() can memory map a saved file and read the columns in
+place with memoryview.cast() rather than parsing it.
+
+restore() puts a world back into a running TestGame. It reuses the sprites
+and bodies already there where it can. The ones left over go first, rocks
+back to the AsteroidField and projectiles back to their pool, so that the
+rows still missing a sprite can be given them before anything new is made.
+The random streams are put back before any state is entered again, so
+the same saved world always carries on the same way. Restoring a level's
+start mostly comes down to writing a few hundred bodies, far less than a
+setup() that makes every sprite, shape and collision handler again.
+
+File layout, little endian:
+    header  magic, version, tick, rows, swarms, seed (HEADER)
+    player  level, experience, next level at, attack, defence, max health (PLAYER)
+    streams the state of each of rng.streams in rng.NAMES order (STREAM)
+    swarms  one byte per swarm, 1 if it has been pulled
+    columns COLUMNS in order, rows items each
+"""
+from __future__ import annotations
+import math
+import mmap
+import struct
+from array import array
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Sequence, Tuple
+
+import arcade
+from bullets import BlueLaser, Orb, RedLaser, Saw
+from fighter import Fighter
+from hit_handlers import hit_queue
+from player import Player
+from pools import projectile_pool
+from registry import entities
+from rng import NAMES, streams
+from states import NO_STATE, graph_states
+from swarm_of_bees import Bee
+from utils import get_physics_body
+
+if TYPE_CHECKING:
+    from game_view import TestGame
+
+MAGIC = b"SPWS"
+VERSION = 2
+HEADER = struct.Struct("<4sHIIIQ6x")
+PLAYER_STATS = struct.Struct("<Iddddd4x")
+# a random.Random's state: its 625 words and next gaussian, nan for none
+STREAM = struct.Struct("<625I4xd")
+
+# what each row is
+PLAYER = 0
+ROCK = 1
+FIGHTER = 2
+BEE = 3
+BLUE_LASER = 4
+RED_LASER = 5
+SAW = 6
+ORB = 7
+KINDS = {Player: PLAYER, Fighter: FIGHTER, Bee: BEE, BlueLaser: BLUE_LASER, RedLaser: RED_LASER, Saw: SAW, Orb: ORB}
+PROJECTILES = {BLUE_LASER: BlueLaser, RED_LASER: RedLaser, SAW: Saw, ORB: Orb}
+# the scene lists a projectile's group can point at
+LIST_NAMES = ("player", "rocks", "enemies", "enemy_bullets", "player_bullets", "orbs")
+
+# bits of the flags column
+PARKED = 1
+
+# name, array typecode. Widest first so every column stays aligned
+COLUMNS = (
+    ("x", "d"),
+    ("y", "d"),
+    ("vx", "d"),
+    ("vy", "d"),
+    ("angle", "d"),
+    ("spin", "d"),
+    ("scale", "d"),
+    ("health", "d"),
+    ("max_health", "d"),
+    ("attack", "d"),
+    ("defence", "d"),
+    # bullet damage or orb experience
+    ("value", "d"),
+    ("lifespan", "i"),
+    # the rock's texture, the bee's swarm or the projectile's list
+    ("group", "h"),
+    # the state machine's state in graph_states() order, -1 for none
+    ("state", "h"),
+    ("level", "H"),
+    ("kind", "B"),
+    ("flags", "B"),
+)
+
+
+def _padding(size: int) -> int:
+    return -size % 8
+
+
+def kind_of(sprite: arcade.Sprite) -> Optional[int]:
+    """The kind of row sprite is saved as, None for sprites that aren't saved"""
+    kind = KINDS.get(type(sprite))
+    if kind is None and getattr(sprite, 'texture_index', None) is not None:
+        return ROCK
+    return kind
+
+
+def _group(sprite: arcade.Sprite, kind: int, swarm_index: Dict[int, int], list_index: Dict[int, int]) -> int:
+    if kind == ROCK:
+        return sprite.texture_index
+    if kind == BEE:
+        return swarm_index.get(id(sprite.swarm), -1)
+    if kind in PROJECTILES:
+        # it can be in other lists too, e.g. VisibilityCuller's
+        for sprite_list in sprite.sprite_lists:
+            index = list_index.get(id(sprite_list))
+            if index is not None:
+                return index
+    return -1
+
+
+class WorldState:
+    """Every body in a TestGame at one tick, see the module docstring"""
+    def __init__(self) -> None:
+        self.tick = 0
+        self.seed = 0
+        self.rows = 0
+        # level, experience, next_level_at, attack, defence, max_health
+        self.player: Tuple[int, float, float, float, float, float] = (1, 0.0, 0.0, 0.0, 0.0, 0.0)
+        self.swarms_pulled: Sequence[int] = b""
+        # rng.streams.getstate()
+        self.streams: List[Tuple] = streams.getstate()
+        self.columns: Dict[str, Sequence] = {name: array(typecode) for name, typecode in COLUMNS}
+        self._mmap: Optional[mmap.mmap] = None
+
+    @classmethod
+    def capture(cls, game: TestGame) -> WorldState:
+        """Save game as it is now. Call between ticks"""
+        entities.flush()
+        state = cls()
+        state.tick = game.tick
+        state.seed = game.seed
+        player = game.player_sprite
+        state.player = (player.level, player.experience, player.next_level_at, player.attack, player.defence, player.max_health)
+        state.swarms_pulled = bytes(swarm.pulled for swarm in game.swarms)
+        state.streams = streams.getstate()
+
+        swarm_index = {id(swarm): index for index, swarm in enumerate(game.swarms)}
+        list_index = {id(game.scene[name]): index for index, name in enumerate(LIST_NAMES)}
+        parked = game.regions.parked
+        # graph_states() of each state graph, by id
+        state_ids: Dict[int, Dict[int, int]] = {}
+        rows: Dict[str, list] = {name: [] for name, _ in COLUMNS}
+        for sprite, physics_object in game.physics_engine.sprites.items():
+            kind = kind_of(sprite)
+            if kind is None:
+                continue
+            body = physics_object.body
+            rows["kind"].append(kind)
+            rows["flags"].append(PARKED if sprite in parked else 0)
+            rows["x"].append(body.position.x)
+            rows["y"].append(body.position.y)
+            rows["vx"].append(body.velocity.x)
+            rows["vy"].append(body.velocity.y)
+            rows["angle"].append(body.angle)
+            rows["spin"].append(body.angular_velocity)
+            rows["scale"].append(sprite.scale)
+            rows["health"].append(getattr(sprite, 'health', 0.0))
+            rows["max_health"].append(getattr(sprite, 'max_health', 0.0))
+            enemy = kind in (FIGHTER, BEE)
+            rows["attack"].append(sprite.attack if enemy else 0.0)
+            rows["defence"].append(sprite.defence if enemy else 0.0)
+            if kind == ORB:
+                rows["value"].append(sprite.exp)
+            elif kind in PROJECTILES:
+                rows["value"].append(sprite.damage)
+            else:
+                rows["value"].append(0.0)
+            rows["lifespan"].append(sprite.lifespan if kind in PROJECTILES else 0)
+            rows["level"].append(0 if kind == ROCK else sprite.level)
+            rows["group"].append(_group(sprite, kind, swarm_index, list_index))
+            state_machine = getattr(sprite, 'state_machine', None)
+            graph = None if state_machine is None else state_machine.state_graph()
+            if graph is None or state_machine.state is NO_STATE:
+                rows["state"].append(-1)
+                continue
+            ids = state_ids.get(id(graph))
+            if ids is None:
+                ids = state_ids[id(graph)] = {id(graph_state): index for index, graph_state in enumerate(graph_states(graph))}
+            rows["state"].append(ids[id(state_machine.state)])
+        state.rows = len(rows["kind"])
+        state.columns = {name: array(typecode, rows[name]) for name, typecode in COLUMNS}
+        return state
+
+    def to_bytes(self) -> bytes:
+        parts = [
+            HEADER.pack(MAGIC, VERSION, self.tick, self.rows, len(self.swarms_pulled), self.seed),
+            PLAYER_STATS.pack(*self.player),
+            *(_pack_stream(stream) for stream in self.streams),
+            bytes(self.swarms_pulled),
+            bytes(_padding(len(self.swarms_pulled))),
+        ]
+        for name, typecode in COLUMNS:
+            column = self.columns[name]
+            data = column.tobytes() if isinstance(column, array) else bytes(column)
+            parts.append(data)
+            parts.append(bytes(_padding(len(data))))
+        return b"".join(parts)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def from_buffer(cls, buffer) -> WorldState:
+        """A world reading its columns straight out of buffer, without copying them"""
+        view = memoryview(buffer)
+        magic, version, tick, rows, swarm_count, seed = HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError("not a saved world")
+        if version != VERSION:
+            raise ValueError(f"saved world is version {version}, only version {VERSION} can be loaded")
+        state = cls()
+        state.tick = tick
+        state.seed = seed
+        state.rows = rows
+        offset = HEADER.size
+        state.player = PLAYER_STATS.unpack_from(view, offset)
+        offset += PLAYER_STATS.size
+        state.streams = []
+        for _ in NAMES:
+            state.streams.append(_unpack_stream(view, offset))
+            offset += STREAM.size
+        state.swarms_pulled = view[offset:offset + swarm_count]
+        offset += swarm_count + _padding(swarm_count)
+        for name, typecode in COLUMNS:
+            size = rows * struct.calcsize(typecode)
+            state.columns[name] = view[offset:offset + size].cast(typecode)
+            offset += size + _padding(size)
+        return state
+
+    @classmethod
+    def load(cls, path: str) -> WorldState:
+        """Memory map a saved world. close() it once it has been restored"""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        state = cls.from_buffer(mapped)
+        state._mmap = mapped
+        return state
+
+    def close(self) -> None:
+        if self._mmap is None:
+            return
+        # the views have to go before the map can be closed
+        for column in self.columns.values():
+            if isinstance(column, memoryview):
+                column.release()
+        if isinstance(self.swarms_pulled, memoryview):
+            self.swarms_pulled.release()
+        self.columns = {}
+        self._mmap.close()
+        self._mmap = None
+
+
+def restore(game: TestGame, state: WorldState) -> None:
+    """Make game's world match state, reusing the sprites and bodies it already has"""
+    entities.flush()
+    hit_queue.clear()
+    regions = game.regions
+    engine = game.physics_engine
+    swarm_index = {id(swarm): index for index, swarm in enumerate(game.swarms)}
+    list_index = {id(game.scene[name]): index for index, name in enumerate(LIST_NAMES)}
+
+    # what there is now, by the rows it could be reused for
+    available: Dict[Tuple[int, int, float], Deque[arcade.Sprite]] = {}
+    for sprite in engine.sprites:
+        kind = kind_of(sprite)
+        if kind is None:
+            continue
+        group = _group(sprite, kind, swarm_index, list_index)
+        available.setdefault((kind, group, sprite.scale), deque()).append(sprite)
+
+    for swarm, pulled in zip(game.swarms, state.swarms_pulled):
+        swarm.pulled = bool(pulled)
+
+    columns = state.columns
+    kinds, groups, scales, flags = columns["kind"], columns["group"], columns["scale"], columns["flags"]
+    xs, ys, vxs, vys = columns["x"], columns["y"], columns["vx"], columns["vy"]
+    angles, spins = columns["angle"], columns["spin"]
+    levels, healths, max_healths = columns["level"], columns["health"], columns["max_health"]
+    sprites: List[Optional[arcade.Sprite]] = [None] * state.rows
+    missing: List[int] = []
+    for row in range(state.rows):
+        kind = kinds[row]
+        reusable = available.get((kind, groups[row], scales[row]))
+        if reusable:
+            sprites[row] = reusable.popleft()
+        elif kind != PLAYER:
+            # there is only ever the one player
+            missing.append(row)
+
+    # whatever wasn't needed goes first, so the missing rows can have it
+    for (kind, _, _), leftovers in available.items():
+        for sprite in leftovers:
+            if sprite is game.player_sprite:
+                continue
+            if kind == ROCK:
+                game.asteroid_field.release(sprite)
+                continue
+            if sprite in regions.sprites:
+                regions.forget(sprite)
+            if getattr(sprite, 'pool', None) is not None:
+                sprite.kill()
+            else:
+                entities.despawn(sprite)
+    entities.flush()
+    for row in missing:
+        sprites[row] = _make(game, kinds[row], groups[row], scales[row], xs[row], ys[row], levels[row])
+    entities.flush()
+
+    thinking: List[Tuple[arcade.Sprite, int]] = []
+    for row, sprite in enumerate(sprites):
+        if sprite is None:
+            continue
+        kind = kinds[row]
+        x = xs[row]
+        y = ys[row]
+        body = get_physics_body(engine, sprite)
+        body.position = (x, y)
+        body.velocity = (vxs[row], vys[row])
+        body.angle = angles[row]
+        body.angular_velocity = spins[row]
+        body.force = (0, 0)
+        body.torque = 0
+        sprite.position = (x, y)
+        sprite.angle = math.degrees(angles[row])
+        parked = bool(flags[row] & PARKED)
+        if sprite in regions.parked:
+            if parked:
+                regions.parked[sprite] = ((vxs[row], vys[row]), spins[row])
+            else:
+                regions.wake(sprite)
+                # wake() puts back the velocity from when it was parked
+                body.velocity = (vxs[row], vys[row])
+                body.angular_velocity = spins[row]
+        elif parked:
+            regions.park(sprite)
+
+        if kind in (FIGHTER, BEE):
+            sprite.level = levels[row]
+            sprite.health = healths[row]
+            sprite.max_health = max_healths[row]
+            sprite.attack = columns["attack"][row]
+            sprite.defence = columns["defence"][row]
+            sprite.held_force = None
+            thinking.append((sprite, columns["state"][row]))
+        elif kind in PROJECTILES:
+            sprite.lifespan = columns["lifespan"][row]
+            sprite.level = levels[row]
+            if kind == ORB:
+                sprite.exp = columns["value"][row]
+            else:
+                sprite.damage = columns["value"][row]
+        elif kind == PLAYER:
+            sprite.health = healths[row]
+
+    player = game.player_sprite
+    player.level, player.experience, player.next_level_at, player.attack, player.defence, player.max_health = state.player
+    game.tick = state.tick
+    game.accumulator = 0.0
+    game.previous_positions = []
+    if game.steering is not None:
+        game.steering.held.clear()
+        game.steering.clear()
+    # timers and triggers belong to the states being left, entering the
+    # restored states sets up their own
+    game.scheduler.reset(state.tick)
+    # entering states draws from streams.ai, so the streams go back first
+    game.seed = state.seed
+    streams.setstate(state.seed, state.streams)
+    for sprite, state_id in thinking:
+        if state_id >= 0 and isinstance(sprite, Fighter) and sprite.state_machine.state_graph() is None:
+            game.give_fighter_ai(sprite)
+        state_machine = sprite.state_machine
+        if game.steering is not None:
+            game.steering.forget(sprite)
+        graph = state_machine.state_graph()
+        if graph is None:
+            continue
+        state_machine.change_state(NO_STATE if state_id < 0 else graph_states(graph)[state_id])
+
+
+def _pack_stream(stream: Tuple) -> bytes:
+    _, words, gauss_next = stream
+    return STREAM.pack(*words, math.nan if gauss_next is None else gauss_next)
+
+
+def _unpack_stream(buffer, offset: int) -> Tuple:
+    *words, gauss_next = STREAM.unpack_from(buffer, offset)
+    # version 3 is the only one random.Random.setstate() takes
+    return (3, tuple(words), None if math.isnan(gauss_next) else gauss_next)
+
+
+def _make(game: TestGame, kind: int, group: int, scale: float, x: float, y: float, level: int) -> arcade.Sprite:
+    """A new sprite for a row nothing could be reused for"""
+    if kind == ROCK:
+        return game.add_rock(group, scale, x, y)
+    if kind == FIGHTER:
+        return game.add_fighter(x, y, level)
+    if kind == BEE:
+        return game.add_bee(game.swarms[group], x, y, level)
+    projectile = projectile_pool.acquire(PROJECTILES[kind], x, y, 0)
+    # a projectile saved outside any list goes where its kind is usually fired to
+    name = LIST_NAMES[group] if group >= 0 else "orbs" if kind == ORB else "player_bullets" if kind == BLUE_LASER else "enemy_bullets"
+    projectile_pool.launch(projectile, game.scene[name], game.physics_engine)
+    return projectile
@@ -0,0 +1,101 @@
+from __future__ import annotations
+import math
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+import arcade
+from constants import HEIGHT
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy is optional, update() falls back to a plain loop over the snapshot
+    np = None
+
+if TYPE_CHECKING:
+    from snapshot import KinematicSnapshot
+
+
+class WrapSystem:
+    """Wraps bodies that drift off the top or bottom of the level to the other side
+
+    Register each sprite list that should wrap with register(). Once per tick
+    update() goes over the kinematic snapshot in one pass, with numpy when it
+    is installed, to find the bodies that are more than their own height past
+    an edge. Only those bodies are looked at again and moved, so the bodies in
+    the middle of the level cost nothing but a compare.
+
+    Args:
+        bottom: the y below which bodies wrap to the top
+
+        top: the y above which bodies wrap to the bottom
+    """
+    def __init__(self, bottom: float = 0, top: float = HEIGHT) -> None:
+        if bottom >= top:
+            raise ValueError('bottom must be below top')
+        self.bottom = bottom
+        self.top = top
+        # category -> (sprite list, bottom, top)
+        self.categories: Dict[str, Tuple[arcade.SpriteList, float, float]] = {}
+        # id(sprite list) -> (bottom, top), to find a body's bounds from its sprite lists
+        self.bounds: Dict[int, Tuple[float, float]] = {}
+        self.wrapped = 0
+
+    def register(self, category: str, sprites: arcade.SpriteList, bottom: float = math.nan, top: float = math.nan) -> None:
+        """Wrap every body in sprites. bottom and top default to the system's own"""
+        bottom = self.bottom if math.isnan(bottom) else bottom
+        top = self.top if math.isnan(top) else top
+        if bottom >= top:
+            raise ValueError('bottom must be below top')
+        if category in self.categories:
+            self.unregister(category)
+        self.categories[category] = (sprites, bottom, top)
+        self.bounds[id(sprites)] = (bottom, top)
+
+    def unregister(self, category: str) -> None:
+        sprites, _, _ = self.categories.pop(category)
+        del self.bounds[id(sprites)]
+
+    def update(self, snapshot: KinematicSnapshot) -> None:
+        """Wrap the registered bodies that are past an edge, using this tick's snapshot"""
+        if not self.categories or not len(snapshot):
+            return
+        # anything outside the narrowest bounds might need wrapping
+        bottom = max(bounds[0] for bounds in self.bounds.values())
+        top = min(bounds[1] for bounds in self.bounds.values())
+        for entity_id in self.candidates(snapshot, bottom, top):
+            sprite = snapshot.sprites[entity_id]
+            for sprite_list in sprite.sprite_lists:
+                bounds = self.bounds.get(id(sprite_list))
+                if bounds is not None:
+                    self.wrap(snapshot, entity_id, *bounds)
+                    break
+
+    @staticmethod
+    def candidates(snapshot: KinematicSnapshot, bottom: float, top: float) -> List[int]:
+        """The entity ids of the bodies more than their height outside bottom and top"""
+        if np is not None:
+            y = np.frombuffer(snapshot.y)
+            margin = np.frombuffer(snapshot.height)
+            return np.flatnonzero((y < bottom - margin) | (y > top + margin)).tolist()
+        return [
+            entity_id
+            for entity_id, (y, margin) in enumerate(zip(snapshot.y, snapshot.height))
+            if y < bottom - margin or y > top + margin
+        ]
+
+    def wrap(self, snapshot: KinematicSnapshot, entity_id: int, bottom: float, top: float) -> None:
+        y = snapshot.y[entity_id]
+        margin = snapshot.height[entity_id]
+        if y < bottom - margin:
+            y = top + margin
+        elif y > top + margin:
+            y = bottom - margin
+        else:
+            return
+        body = snapshot.bodies[entity_id]
+        body.position = (body.position.x, y)
+        snapshot.y[entity_id] = y
+        self.wrapped += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"categories": len(self.categories), "wrapped": self.wrapped}